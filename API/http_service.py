@@ -0,0 +1,252 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-23
+
+import cv2
+import json
+import time
+import base64
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from SQL.face_gallery import Face_Gallery
+from face_process.model_pool import Model_Pool
+from face_process.micro_batch import Micro_Batcher
+from face_process.face_recognize import recognize_faces_batch
+from face_process.faces_enroll import enroll_face
+from SQL.database_operate import load_face_image_bytes
+
+'''
+    无界面的 HTTP 识别 / 录入服务（API 模式）：
+    不经过 Gradio，没有网页、临时文件，直接接收编码后的图像（JPEG / PNG 等），返回 JSON 格式的目标框、姓名和相似度；
+    模型副本池和人脸库在启动时加载一次后常驻内存，每个请求在自己的线程中处理，推理时从模型副本池取一份空闲的模型；
+    开启微批处理（micro_batch.Micro_Batcher）时，不同请求中同一时间到达的图像会合并成一个批次识别；
+    使用 HTTP/1.1 长连接，客户端可以在同一个连接上连续发送请求，不用每次都重新建立 TCP 连接
+
+    接口：
+    1.POST /recognize：识别图像中的人脸
+      请求体为一张编码后的图像（Content-Type 为 image/* 或 application/octet-stream，阈值可通过 ?threshold= 指定），
+      或者 JSON：{"images": [base64 编码的图像, ...], "threshold": 0.5}（也可以用 "image" 只传一张），一个请求中的多张图像批量识别
+      返回：{"results": [{"faces": [{"bbox": [x1, y1, x2, y2], "name": 姓名, "similarity": 相似度}, ...]}, ...], "time_ms": 处理耗时}
+    2.POST /enroll：录入图像中的人脸（和 Web 模式、本地模式使用同一个人脸库，录入只支持一个图像一个人脸）
+      请求体为一张编码后的图像（姓名通过 ?name= 指定），或者 JSON：{"name": 姓名, "image": base64 编码的图像}
+      返回：{"id": 人脸的 id, "name": 姓名, "bbox": [x1, y1, x2, y2]}，没有检测到人脸或检测到多个人脸时返回 422
+    3.GET /face_image?id=人脸的 id：录入时保存的人脸图像（直接返回数据库中压缩后的图像，不重新编码）
+    4.GET /health：服务状态和人脸库中的人脸数
+    5.GET /stats：模型副本池的使用情况（排队的请求数、等待时间等），开启微批处理时还包括批大小和延迟的直方图
+'''
+
+
+# 人脸图像的存储格式对应的 Content-Type
+IMAGE_CONTENT_TYPES = {'.jpg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+
+
+# 请求出错时抛出，由请求处理函数转换为对应状态码的 JSON 错误信息
+class API_Error(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# 把编码后的图像解码为 BGR 图像
+def decode_image(data: bytes):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if image is None:
+        raise API_Error(400, '无法解码图像')
+    return image
+
+
+# 解码 JSON 中 base64 编码的图像
+def decode_base64_image(data: str):
+    try:
+        return decode_image(base64.b64decode(data, validate=True))
+    except (TypeError, ValueError):
+        raise API_Error(400, '图像不是合法的 base64 编码')
+
+
+class Face_API_Server(ThreadingHTTPServer):
+    # 处理请求的线程随主线程退出
+    daemon_threads = True
+
+    def __init__(self,
+                 model_pool: Model_Pool,
+                 gallery: Face_Gallery,
+                 host: str='127.0.0.1',
+                 port: int=8000,
+                 threshold: float=0.5,
+                 max_images: int=32,
+                 max_body_size: int=32 * 1024 * 1024,
+                 access_log: bool=False,
+                 micro_batcher: Micro_Batcher=None):
+        self.model_pool = model_pool
+        self.micro_batcher = micro_batcher
+        self.gallery = gallery
+        self.threshold = threshold
+        self.max_images = max_images
+        self.max_body_size = max_body_size
+        self.access_log = access_log
+        super().__init__((host, port), Face_API_Handler)
+
+
+class Face_API_Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 默认使用长连接（所有响应都带有 Content-Length），关闭 Nagle 算法，小的响应不会被延迟发送
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle({'/health': self._health, '/stats': self._stats, '/face_image': self._face_image})
+
+    def do_POST(self):
+        self._handle({'/recognize': self._recognize, '/enroll': self._enroll})
+
+    # 按路径分发请求，并把返回值或错误信息以 JSON 格式返回（返回值为 None 的接口已经自己发送了响应）
+    def _handle(self, routes: dict):
+        url = urlparse(self.path)
+        try:
+            route = routes.get(url.path)
+            if route is None:
+                # 没有读取的请求体会被当成下一个请求，所以丢弃请求体后再返回错误
+                self._read_body()
+                raise API_Error(404, f'不支持的接口：{self.command} {url.path}')
+            status, result = 200, route(parse_qs(url.query))
+        except API_Error as e:
+            status, result = e.status, {'error': e.message}
+        except Exception as e:
+            status, result = 500, {'error': f'处理请求时发生错误：{str(e)}'}
+
+        if result is not None:
+            self._send_json(status, result)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.server.max_body_size:
+            # 请求体太大时不再读取，处理完这个请求后关闭连接
+            self.close_connection = True
+            raise API_Error(413, f'请求体超过 {self.server.max_body_size} 字节')
+        return self.rfile.read(length) if length > 0 else b''
+
+    # 读取请求中的图像和参数：JSON 请求体中的图像为 base64 编码，其他请求体直接作为一张编码后的图像
+    def _read_request(self, query: dict):
+        body = self._read_body()
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                params = json.loads(body)
+            except ValueError:
+                raise API_Error(400, '请求体不是合法的 JSON')
+            if not isinstance(params, dict):
+                raise API_Error(400, '请求体必须是 JSON 对象')
+
+            images = params.get('images', [params['image']] if 'image' in params else [])
+            if not isinstance(images, list):
+                raise API_Error(400, 'images 必须是列表')
+            if len(images) > self.server.max_images:
+                raise API_Error(413, f'一个请求最多 {self.server.max_images} 张图像')
+            return [decode_base64_image(image) for image in images], params
+
+        params = {key: values[-1] for key, values in query.items()}
+        return [decode_image(body)], params
+
+    def _recognize(self, query: dict):
+        start = time.perf_counter()
+        images, params = self._read_request(query)
+        if len(images) <= 0:
+            raise API_Error(400, '请求中没有图像')
+        try:
+            threshold = float(params.get('threshold', self.server.threshold))
+        except (TypeError, ValueError):
+            raise API_Error(400, 'threshold 必须是数字')
+
+        # 开启了微批处理时，每张图像都交给批处理线程，和其他请求的图像一起识别
+        if self.server.micro_batcher is not None:
+            futures = [self.server.micro_batcher.submit(image, threshold) for image in images]
+            results = [future.result() for future in futures]
+        else:
+            # 一个请求中的多张图像批量检测、批量提取特征向量
+            with self.server.model_pool.acquire() as app:
+                results = recognize_faces_batch(app, images, self.server.gallery, threshold)
+
+        return {'results': [{'faces': [{'bbox': [round(float(v), 1) for v in bbox],
+                                        'name': name,
+                                        'similarity': round(float(similarity), 6)}
+                                       for (bbox, name), similarity in zip(face_names, similarities)]}
+                            for face_names, similarities in results],
+                'time_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+    def _enroll(self, query: dict):
+        images, params = self._read_request(query)
+        name = str(params.get('name', '')).strip()
+        if name == '':
+            raise API_Error(400, '姓名不能为空')
+        if len(images) != 1:
+            raise API_Error(400, '录入只支持一张图像')
+
+        with self.server.model_pool.acquire() as app:
+            status, face = enroll_face(app, name, images[0], self.server.gallery)
+        if status == 'multiple_faces':
+            raise API_Error(422, '检测到多个人脸，录入只支持一张图像一个人脸')
+        if face is None:
+            raise API_Error(422, '未检测到人脸')
+
+        return {'id': face.face_id, 'name': name, 'bbox': [round(float(v), 1) for v in face.bbox]}
+
+    def _health(self, query: dict):
+        return {'status': 'ok', 'faces': len(self.server.gallery)}
+
+    def _stats(self, query: dict):
+        stats = {'model_pool': self.server.model_pool.stats()}
+        if self.server.micro_batcher is not None:
+            stats['micro_batch'] = self.server.micro_batcher.stats()
+        return stats
+
+    # 返回录入时保存的人脸图像，只在有人查看时才从数据库读取
+    def _face_image(self, query: dict):
+        try:
+            face_id = int(query.get('id', [''])[-1])
+        except ValueError:
+            raise API_Error(400, 'id 必须是整数')
+
+        row = load_face_image_bytes(face_id, self.server.gallery.database_path)
+        if row is None:
+            raise API_Error(404, f'没有 id 为 {face_id} 的人脸图像')
+        image_format, data = row
+        content_type = IMAGE_CONTENT_TYPES.get(image_format, 'application/octet-stream')
+
+        self._send_body(200, content_type, data)
+
+    def _send_json(self, status: int, result: dict):
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self._send_body(status, 'application/json; charset=utf-8', body)
+
+    def _send_body(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    # 默认每个请求都会输出一行访问日志，压测时开销很大，只在 access_log 为 True 时输出
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+# 启动 HTTP 服务，直到按 Ctrl+C 退出
+def serve_api(model_pool: Model_Pool,
+              gallery: Face_Gallery,
+              host: str='127.0.0.1',
+              port: int=8000,
+              threshold: float=0.5,
+              micro_batcher: Micro_Batcher=None):
+    server = Face_API_Server(model_pool, gallery, host, port, threshold, micro_batcher=micro_batcher)
+    print(f"\nFaceMind API 服务已启动：http://{host}:{port}（POST /recognize、POST /enroll、GET /health、GET /stats，按 Ctrl+C 退出）\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n{model_pool.report()}\n")
+        if micro_batcher is not None:
+            print(f"{micro_batcher.report()}\n")
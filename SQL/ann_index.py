@@ -0,0 +1,197 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-5
+
+import os
+import threading
+import numpy as np
+from SQL.embedding_quantize import score_candidates
+
+'''
+    已知人脸库的近似最近邻（ANN）索引：
+    基于 NumPy 实现的 IVF（倒排文件）索引，先用球面 k-means 把已知人脸聚成 nlist 个簇，
+    查询时只在和查询向量最相似的 nprobe 个簇里找候选人脸，计算候选人脸的cos相似度后返回最相似的 top_k 个
+    （紧凑格式的人脸库算出的是近似相似度，由人脸库再用 float32 原始特征向量精确重排序），
+    nprobe 越大召回率越高、速度越慢，nprobe 等于 nlist 时等价于暴力搜索；
+    索引以 .npz 文件的形式保存在数据库文件旁边，下次启动直接加载，不用重新聚类；
+    新录入的人脸只需要分配到最近的簇，倒排表和各个数组都按容量倍增的方式扩容，逐个录入时也不用每次复制整个数组
+'''
+
+
+# 根据数据库文件路径，获取索引文件的路径（和数据库文件放在一起）
+def get_index_path(database_path: str):
+    return os.path.splitext(database_path)[0] + '_ivf.npz'
+
+
+# 把 values 追加到 buffer 的 size 位置之后，容量不够时按倍增的方式扩容，返回（可能是新的）缓冲区
+def append_to_buffer(buffer, size: int, values):
+    needed = size + len(values)
+    if len(buffer) < needed:
+        new_buffer = np.empty(max(needed, 2 * len(buffer), 16), dtype=buffer.dtype)
+        new_buffer[:size] = buffer[:size]
+        buffer = new_buffer
+    buffer[size:needed] = values
+    return buffer
+
+
+# 分批计算每个向量最相似的聚类中心，避免 (向量数 × 聚类数) 的相似度矩阵占用过多内存
+def assign_to_centroids(encodings, centroids, batch_size: int=65536):
+    assignments = np.empty(len(encodings), dtype=np.int32)
+    for start_idx in range(0, len(encodings), batch_size):
+        similarities = encodings[start_idx:start_idx + batch_size] @ centroids.T
+        assignments[start_idx:start_idx + batch_size] = np.argmax(similarities, axis=1)
+    return assignments
+
+
+class IVF_Index:
+    def __init__(self, nlist: int, nprobe: int=16):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        # 每个人脸所属的簇和 rowid，以及每个簇的倒排表，都是按容量倍增的缓冲区，有效部分由 _size 和 list_sizes 记录
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._rowids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self.lists = []
+        self.list_sizes = np.zeros(0, dtype=np.int64)
+        # 训练聚类中心时的人脸数，人脸库增长太多后需要重新训练，否则各个簇会越来越不均衡
+        self.trained_size = 0
+
+    # 索引中每个人脸所属的簇
+    @property
+    def assignments(self):
+        return self._assignments[:self._size]
+
+    # 索引中每个人脸在数据库中的 rowid
+    @property
+    def rowids(self):
+        return self._rowids[:self._size]
+
+    # 根据人脸库大小选择聚类数（经验值：约为人脸数的平方根的 4 倍）
+    @staticmethod
+    def suggest_nlist(size: int):
+        return int(max(1, min(65536, 4 * np.sqrt(size))))
+
+    # 用已知人脸库（已L2归一化）训练聚类中心并建立倒排表
+    def build(self, encodings, rowids, iterations: int=10, max_train_size: int=262144, seed: int=0):
+        rng = np.random.default_rng(seed)
+        encodings = np.asarray(encodings, dtype=np.float32)
+        self.nlist = max(1, min(self.nlist, len(encodings)))
+
+        # 只用一部分样本训练，人脸库很大时也能快速完成
+        train = encodings
+        if len(encodings) > max_train_size:
+            train = encodings[rng.choice(len(encodings), max_train_size, replace=False)]
+
+        # 球面 k-means：中心取簇内向量的均值再归一化，用点积（即cos相似度）度量距离
+        centroids = train[rng.choice(len(train), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = assign_to_centroids(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空簇保留原来的中心
+            non_empty = norms[:, 0] > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty]
+
+        self.centroids = centroids
+        self.trained_size = len(encodings)
+        self._set_members(assign_to_centroids(encodings, centroids), rowids)
+
+    # 设置索引中的人脸（每个人脸所属的簇和 rowid），并建立倒排表
+    def _set_members(self, assignments, rowids):
+        self._assignments = np.asarray(assignments, dtype=np.int32)
+        self._rowids = np.asarray(rowids, dtype=np.int64)
+        self._size = len(self._assignments)
+        self._build_lists()
+
+    # 根据每个人脸所属的簇建立倒排表：lists[c][:list_sizes[c]] 为第 c 个簇中的人脸在人脸库中的下标
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind='stable')
+        self.list_sizes = np.bincount(self.assignments, minlength=self.nlist).astype(np.int64)
+        self.lists = np.split(order, np.cumsum(self.list_sizes)[:-1])
+
+    # 把新录入的人脸加入索引（新人脸在人脸库中的下标接在已有人脸之后）
+    # 新人脸按所属的簇分组后，每个簇只追加一次；各个缓冲区都按容量倍增的方式扩容，均摊下来每个人脸的开销是常数
+    def add(self, encodings, rowids):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(len(rowids), -1)
+        start = self._size
+        assignments = assign_to_centroids(encodings, self.centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        clusters, first = np.unique(assignments[order], return_index=True)
+        for cluster, members in zip(clusters, np.split(start + order, first[1:])):
+            self.lists[cluster] = append_to_buffer(self.lists[cluster], self.list_sizes[cluster], members)
+            self.list_sizes[cluster] += len(members)
+
+        # 先写入数据再更新人脸数，其他线程按人脸数取到的前缀总是完整的
+        self._assignments = append_to_buffer(self._assignments, start, assignments)
+        self._rowids = append_to_buffer(self._rowids, start, np.asarray(rowids, dtype=np.int64))
+        self._size = start + len(assignments)
+
+    # 在索引中为每个查询向量（已L2归一化）找到最相似的 top_k 个人脸，返回 (查询向量数 × top_k) 的人脸下标和cos相似度
+    # （按相似度从高到低排列，相似度相同时下标小的在前，候选人脸不足 top_k 个时下标为 -1、相似度为 -inf）
+    # 已知人脸库可以是紧凑格式（float16 / int8），此时需要同时传入每个人脸的缩放系数，返回的是近似相似度
+    def search(self, query_embeddings, known_face_encodings, known_face_scales=None, nprobe: int=None, top_k: int=1):
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        num_queries = len(query_embeddings)
+
+        best_indices = np.full((num_queries, top_k), -1, dtype=np.int64)
+        best_similarities = np.full((num_queries, top_k), -np.inf, dtype=np.float32)
+
+        # 先找到每个查询向量最相似的 nprobe 个簇
+        centroid_similarities = query_embeddings @ self.centroids.T
+        if nprobe < self.nlist:
+            probes = np.argpartition(-centroid_similarities, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), (num_queries, self.nlist))
+
+        for i in range(num_queries):
+            candidates = np.concatenate([self.lists[cluster][:self.list_sizes[cluster]] for cluster in probes[i]])
+            # 索引可能比调用方拿到的人脸库快照更新（其他线程正在录入时，倒排表扩容前后的数据也可能混在一起），超出快照范围的候选要去掉
+            candidates = candidates[(candidates >= 0) & (candidates < len(known_face_encodings))]
+            if len(candidates) <= 0:
+                continue
+
+            # 相同相似度时取下标最小的人脸（与暴力搜索一致）
+            candidates.sort()
+            similarities = score_candidates(query_embeddings[i], known_face_encodings, known_face_scales, candidates)
+            best = np.argsort(-similarities, kind='stable')[:top_k]
+            best_indices[i, :len(best)] = candidates[best]
+            best_similarities[i, :len(best)] = similarities[best]
+
+        return best_indices, best_similarities
+
+    def __len__(self):
+        return self._size
+
+    # 把索引保存到磁盘（先写临时文件再替换，避免其他进程读到写了一半的文件）
+    # 人脸只会追加到末尾，所以先取得人脸数，保存的就是一个完整的前缀，可以在其他线程继续录入时保存
+    def save(self, index_path: str):
+        size = self._size
+        # 临时文件名带上进程号和线程号，多个进程或线程同时保存时不会互相覆盖
+        temp_path = f'{index_path}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+        np.savez(temp_path,
+                 centroids=self.centroids,
+                 assignments=self._assignments[:size],
+                 rowids=self._rowids[:size],
+                 nprobe=self.nprobe,
+                 trained_size=self.trained_size)
+        os.replace(temp_path, index_path)
+
+    # 从磁盘加载索引，文件不存在或已损坏时返回 None
+    @classmethod
+    def load(cls, index_path: str):
+        if not os.path.exists(index_path):
+            return None
+
+        try:
+            with np.load(index_path) as data:
+                index = cls(len(data['centroids']), int(data['nprobe']))
+                index.centroids = data['centroids']
+                index.trained_size = int(data['trained_size'])
+                index._set_members(data['assignments'], data['rowids'])
+        except Exception as e:
+            print(f"Warning: 索引文件 {index_path} 无法加载，将重新构建：{str(e)}")
+            return None
+
+        return index
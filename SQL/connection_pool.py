@@ -0,0 +1,87 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-26
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+'''
+    SQLite 数据库连接池：
+    每个数据库文件一个连接池，用完的连接放回池中给下一次操作复用，不再每次操作都重新打开、关闭数据库文件；
+    连接打开时切换到 WAL 日志模式（写入只追加到 -wal 文件，读取不会被正在进行的写事务阻塞，录入人脸时识别照常进行），
+    并把同步级别设为 NORMAL（WAL 模式下仍然不会损坏数据库，只是断电时可能丢失最后几次提交）
+'''
+
+
+class Connection_Pool:
+    def __init__(self, database_path: str, max_idle: int=4, timeout: float=30.0):
+        self.database_path = database_path
+        self.max_idle = max_idle
+        # 等待其他连接释放写锁的最长时间（秒）
+        self.timeout = timeout
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+    # 打开一个新的连接（也可以用于需要单独持有的连接，如查询 data_version 的常驻连接）
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.database_path, timeout=self.timeout, check_same_thread=False)
+        try:
+            # 日志模式保存在数据库文件中，切换一次之后所有连接都是 WAL 模式；其他连接持有锁时切换失败，下次再切换即可
+            connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            pass
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # 从池中取出一个连接，用完（离开 with 语句）后放回：正常结束时提交未提交的修改，出现异常时回滚
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self.connect()
+
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            if connection.in_transaction:
+                connection.commit()
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+
+    # 关闭池中所有空闲的连接
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+# 每个数据库文件一个连接池（按绝对路径区分）
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_path: str) -> Connection_Pool:
+    assert database_path is not None, 'Error: 请指定数据库文件路径！'
+    key = os.path.abspath(database_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = Connection_Pool(key)
+        return pool
+
+
+# 从数据库文件对应的连接池中取出一个连接
+def get_connection(database_path: str):
+    return get_pool(database_path).connection()
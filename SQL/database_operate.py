@@ -1,61 +1,385 @@
 # @Author        : Justin Lee
 # @Time          : 2025-3-27
 
-import sqlite3
 import numpy as np
+from SQL.connection_pool import get_connection
+from SQL.embedding_quantize import encoding_to_bytes, encoding_from_bytes
+from SQL.face_image_codec import encode_face_image, decode_face_image, encode_legacy_face_image
 
 '''
-    数据库操作
+    数据库操作：
+    所有操作都从连接池（connection_pool）中取连接，数据库使用 WAL 日志模式，读取和录入互不阻塞；
+    数据库结构有版本号（PRAGMA user_version），启动时自动把旧版本的数据库迁移到当前版本：
+    faces表以整数 id 为主键（就是原来的 rowid，迁移后保持不变），姓名有索引，特征向量的维度和模型记录在 db_metadata 表中；
+    人脸图像压缩后单独存放在 face_images 表中（face_image_codec），加载特征向量时不会读取图像，只在查看时才按 id 读取；
+    录入时特征向量一律以 float32 原样存储，紧凑格式（float16 / int8）只用于内存中的人脸库和旁路文件，
+    匹配时用 float32 原始特征向量对候选人脸精确重排序
 '''
 
 
+# 当前的数据库结构版本：0 为没有主键和索引的旧版本，1 为带整数主键、姓名索引和元数据表的版本，
+# 2 为人脸图像压缩后单独存放在 face_images 表中的版本，3 为增加了 float32 原始特征向量表（face_encodings_original）的版本
+SCHEMA_VERSION = 3
+
+
 # 创建数据库
 def create_database(database_path: str=None):
     
     # 连接到指定路径的SQLite数据库（如果本来没有这个数据库文件，则会自动创建）
-    connection = sqlite3.connect(database_path)
-    cursor = connection.cursor()
-    
-    # 创建faces表，存储人脸图像、姓名和特征向量
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
+
+        create_faces_table(cursor)
+        create_face_images_table(cursor)
+        create_original_encodings_table(cursor)
+        create_version_table(cursor)
+        create_templates_table(cursor)
+        create_checkpoint_table(cursor)
+        create_metadata_table(cursor)
+
+        connection.commit()
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# 创建faces表，存储姓名和特征向量（以及特征向量的存储格式和 int8 量化的缩放系数），并为姓名建立索引
+# id 为整数主键（即 rowid 的别名），VACUUM 之后也不会改变
+def create_faces_table(cursor):
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS faces (
-        image BLOB NOT NULL,
+        id INTEGER PRIMARY KEY,
         name TEXT NOT NULL,
+        encoding BLOB NOT NULL,
+        encoding_dtype TEXT NOT NULL DEFAULT 'float32',
+        encoding_scale REAL NOT NULL DEFAULT 1.0
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS faces_name_index ON faces (name)")
+
+
+# 创建人脸图像表：face_id 对应faces表的 id，存储压缩后的人脸图像及其格式和形状；
+# faces表中的人脸被删除时，触发器同时删除对应的图像
+def create_face_images_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS face_images (
+        face_id INTEGER PRIMARY KEY,
+        format TEXT NOT NULL,
+        height INTEGER NOT NULL,
+        width INTEGER NOT NULL,
+        channels INTEGER NOT NULL,
+        data BLOB NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS faces_delete_image AFTER DELETE ON faces BEGIN
+        DELETE FROM face_images WHERE face_id = OLD.id;
+    END
+    ''')
+
+
+# 创建原始特征向量表：faces表中的特征向量被显式转换为紧凑格式（encoding_convert）时，转换前的 float32 特征向量保存在这里，
+# 匹配时用来对候选人脸精确重排序，也可以据此无损地转换回 float32；faces表中的人脸被删除时，触发器同时删除对应的原始特征向量
+def create_original_encodings_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS face_encodings_original (
+        face_id INTEGER PRIMARY KEY,
         encoding BLOB NOT NULL
     )
     ''')
-        
-    connection.commit()
-    connection.close()
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS faces_delete_original AFTER DELETE ON faces BEGIN
+        DELETE FROM face_encodings_original WHERE face_id = OLD.id;
+    END
+    ''')
 
 
-# 把人脸特征向量和名字添加到数据库
-def add_face_to_database(image, name, encoding, database_path: str=None):
-    connection = sqlite3.connect(database_path)
-    cursor = connection.cursor()
-    
-    cursor.execute("INSERT INTO faces (image, name, encoding) VALUES (?, ?, ?)",
-                   (image, name, encoding.tobytes()))
-    connection.commit()
-    connection.close()
+# 创建元数据表：记录特征向量的维度（embedding_dim）和生成特征向量的模型（embedding_model）等信息
+def create_metadata_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS db_metadata (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+
+
+# 创建faces表的版本号表和触发器：
+# version 在faces表每次插入、删除、修改后加 1，rewrite_version 只在删除、修改后加 1，
+# 这样只需查询一行就能知道faces表是否变化，以及变化能否通过增量加载新行来同步
+def create_version_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS faces_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL,
+        rewrite_version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO faces_version (id, version, rewrite_version) VALUES (0, 0, 0)")
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS faces_after_insert AFTER INSERT ON faces BEGIN
+        UPDATE faces_version SET version = version + 1 WHERE id = 0;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS faces_after_delete AFTER DELETE ON faces BEGIN
+        UPDATE faces_version SET version = version + 1, rewrite_version = rewrite_version + 1 WHERE id = 0;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS faces_after_update AFTER UPDATE ON faces BEGIN
+        UPDATE faces_version SET version = version + 1, rewrite_version = rewrite_version + 1 WHERE id = 0;
+    END
+    ''')
+
+
+# 创建人脸模板表：由人脸库压缩任务生成，每个人只保留少量代表性的特征向量（原始的faces表保持不变，用于审计）
+# face_templates_meta 记录每次压缩的编号和压缩时faces表的最大 rowid（之后新录入的人脸还没有被压缩）
+def create_templates_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS face_templates (
+        name TEXT NOT NULL,
+        encoding BLOB NOT NULL,
+        encoding_dtype TEXT NOT NULL DEFAULT 'float32',
+        encoding_scale REAL NOT NULL DEFAULT 1.0,
+        source_count INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS face_templates_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        compaction_id INTEGER NOT NULL,
+        compacted_max_rowid INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO face_templates_meta (id, compaction_id, compacted_max_rowid) VALUES (0, 0, 0)")
+
+
+# 创建批量录入的断点表：每个批量录入任务（以图像目录或清单文件的路径作为任务名）已经处理完的条目数，
+# 和录入的人脸在同一个事务中更新，中断后重新运行时从断点继续，不会重复录入或漏掉
+def create_checkpoint_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS enroll_checkpoints (
+        job TEXT PRIMARY KEY,
+        completed INTEGER NOT NULL
+    )
+    ''')
+
+
+# 获取批量录入任务已经处理完的条目数（没有断点时为 0）
+def get_enroll_checkpoint(job: str, database_path: str=None):
+    with get_connection(database_path) as connection:
+        row = connection.execute("SELECT completed FROM enroll_checkpoints WHERE job = ?", (job,)).fetchone()
+
+    return row[0] if row is not None else 0
+
+
+# 读取元数据表中 key 对应的值（没有记录时返回 None）
+def get_metadata(key: str, database_path: str=None):
+    with get_connection(database_path) as connection:
+        row = connection.execute("SELECT value FROM db_metadata WHERE key = ?", (key,)).fetchone()
+
+    return row[0] if row is not None else None
+
+
+# 写入元数据表中 key 对应的值
+def set_metadata(key: str, value, database_path: str=None):
+    with get_connection(database_path) as connection:
+        connection.execute("INSERT OR REPLACE INTO db_metadata (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+# 检查数据库中记录的特征向量维度和模型是否与当前使用的模型一致：没有记录时写入当前的值，不一致时返回警告信息
+# （用不同模型提取的特征向量之间的相似度没有意义，维度不同时甚至无法计算）
+def check_embedding_metadata(embedding_dim: int, embedding_model: str, database_path: str=None):
+    warnings = []
+    for key, value in (('embedding_dim', embedding_dim), ('embedding_model', embedding_model)):
+        if value is None:
+            continue
+        recorded = get_metadata(key, database_path)
+        if recorded is None:
+            set_metadata(key, value, database_path)
+        elif recorded != str(value):
+            warnings.append(f"Warning: 数据库中的 {key} 为 {recorded}，当前模型为 {value}，已录入的人脸可能无法正确识别")
+
+    return warnings
+
+
+# 用新的人脸模板替换原有的模板（在同一个事务中完成，读取方不会看到一半的结果）
+# templates 为 (姓名, 特征向量, 代表的原始人脸数) 的列表，模板和faces表一样以 float32 存储
+def save_face_templates(templates, compacted_max_rowid: int, database_path: str=None):
+    rows = []
+    for name, encoding, source_count in templates:
+        blob, scale = encoding_to_bytes(encoding, 'float32')
+        rows.append((name, blob, 'float32', scale, int(source_count)))
+
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM face_templates")
+        cursor.executemany('''INSERT INTO face_templates (name, encoding, encoding_dtype, encoding_scale, source_count) 
+                              VALUES (?, ?, ?, ?, ?)''', rows)
+        cursor.execute("UPDATE face_templates_meta SET compaction_id = compaction_id + 1, compacted_max_rowid = ? WHERE id = 0",
+                       (compacted_max_rowid,))
+
+
+# 加载所有人脸模板，返回模板 id、姓名、特征向量，以及 (压缩编号, 压缩时faces表的最大 rowid)
+def load_face_templates(database_path: str=None):
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT rowid, name, encoding, encoding_dtype, encoding_scale FROM face_templates ORDER BY rowid")
+        rows = cursor.fetchall()
+        cursor.execute("SELECT compaction_id, compacted_max_rowid FROM face_templates_meta WHERE id = 0")
+        state = cursor.fetchone()
+
+    template_ids = [row[0] for row in rows]
+    names = [row[1] for row in rows]
+    encodings = [encoding_from_bytes(row[2], row[3], row[4]) for row in rows]
+
+    return template_ids, names, encodings, state
+
+
+# 获取人脸模板的状态 (压缩编号, 压缩时faces表的最大 rowid)，压缩编号变化说明重新压缩过
+def get_templates_state(database_path: str=None):
+    with get_connection(database_path) as connection:
+        state = connection.execute("SELECT compaction_id, compacted_max_rowid FROM face_templates_meta WHERE id = 0").fetchone()
+
+    return state
+
+
+# 获取faces表的版本号 (version, rewrite_version)
+def get_faces_version(database_path: str=None):
+    with get_connection(database_path) as connection:
+        version, rewrite_version = connection.execute("SELECT version, rewrite_version FROM faces_version WHERE id = 0").fetchone()
+
+    return version, rewrite_version
+
+
+# 迁移旧版本的数据库到当前的结构版本（SCHEMA_VERSION），已经是当前版本时什么也不做
+# image_format 为迁移时人脸图像压缩后的格式（.jpg / .png / .webp）
+def migrate_database(database_path: str=None, image_format: str='.jpg'):
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
+
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version >= SCHEMA_VERSION:
+            return
+
+        # 先拿到写锁，迁移期间其他进程不能录入人脸
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute("PRAGMA table_info(faces)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        rebuilt = False
+        if len(columns) <= 0:
+            create_faces_table(cursor)
+        elif 'image' in columns:
+            # 最早的faces表没有特征向量存储格式相关的列，先补上这些列（原有的行默认为 float32 格式）
+            if 'encoding_dtype' not in columns:
+                cursor.execute("ALTER TABLE faces ADD COLUMN encoding_dtype TEXT NOT NULL DEFAULT 'float32'")
+            if 'encoding_scale' not in columns:
+                cursor.execute("ALTER TABLE faces ADD COLUMN encoding_scale REAL NOT NULL DEFAULT 1.0")
+
+            # 按新的结构重建faces表：id 沿用原来的 id（最早的faces表没有主键，沿用隐式的 rowid），
+            # 所以人脸库、旁路文件和人脸模板中记录的 rowid 都仍然有效；旧表的索引和触发器随旧表一起删除，下面重新创建
+            id_column = 'id' if 'id' in columns else 'rowid'
+            cursor.execute("DROP INDEX IF EXISTS faces_name_index")
+            cursor.execute("ALTER TABLE faces RENAME TO faces_legacy")
+            create_faces_table(cursor)
+            create_face_images_table(cursor)
+            cursor.execute(f'''INSERT INTO faces (id, name, encoding, encoding_dtype, encoding_scale) 
+                               SELECT {id_column}, name, encoding, encoding_dtype, encoding_scale FROM faces_legacy 
+                               ORDER BY {id_column}''')
+
+            # 原来的人脸图像是未压缩的像素，分批压缩后写入 face_images 表
+            last_rowid = 0
+            while True:
+                rows = cursor.execute(f"SELECT {id_column}, image FROM faces_legacy WHERE {id_column} > ? ORDER BY {id_column} LIMIT 1000",
+                                      (last_rowid,)).fetchall()
+                if len(rows) <= 0:
+                    break
+                cursor.executemany("INSERT INTO face_images (face_id, format, height, width, channels, data) VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(rowid, *encode_legacy_face_image(image, image_format)) for rowid, image in rows])
+                last_rowid = rows[-1][0]
+
+            cursor.execute("DROP TABLE faces_legacy")
+            create_version_table(cursor)
+            # faces表被重写过，已经打开的人脸库需要完整重新加载
+            cursor.execute("UPDATE faces_version SET version = version + 1, rewrite_version = rewrite_version + 1 WHERE id = 0")
+            rebuilt = True
+        else:
+            create_faces_table(cursor)
+
+        # 旧的数据库没有人脸图像表、原始特征向量表、版本号表、人脸模板表、批量录入的断点表和元数据表，补上
+        create_face_images_table(cursor)
+        create_original_encodings_table(cursor)
+        create_version_table(cursor)
+        create_templates_table(cursor)
+        create_checkpoint_table(cursor)
+        create_metadata_table(cursor)
+
+        # 已有人脸时，从第一个特征向量记录特征向量的维度
+        row = cursor.execute("SELECT encoding, encoding_dtype, encoding_scale FROM faces ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            cursor.execute("INSERT OR IGNORE INTO db_metadata (key, value) VALUES ('embedding_dim', ?)",
+                           (str(len(encoding_from_bytes(*row))),))
+
+        connection.commit()
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        # 未压缩的人脸图像占了旧数据库的大部分空间，执行 VACUUM 回收，使数据库文件真正变小
+        if rebuilt:
+            cursor.execute("VACUUM")
+
+
+# 把人脸特征向量和名字添加到数据库，人脸图像压缩后存入 face_images 表，返回新插入行的 rowid
+# 特征向量以 float32 原样存储（用于精确重排序）；image_format 为人脸图像的压缩格式
+def add_face_to_database(image, name, encoding, database_path: str=None, image_format: str='.jpg'):
+    blob, scale = encoding_to_bytes(encoding, 'float32')
+    face_image = encode_face_image(image, image_format)
+    with get_connection(database_path) as connection:
+        cursor = connection.execute("INSERT INTO faces (name, encoding, encoding_dtype, encoding_scale) VALUES (?, ?, ?, ?)",
+                                    (name, blob, 'float32', scale))
+        rowid = cursor.lastrowid
+        cursor.execute("INSERT INTO face_images (face_id, format, height, width, channels, data) VALUES (?, ?, ?, ?, ?, ?)",
+                       (rowid, *face_image))
+
+    return rowid
     
 
-# 检查要插入的姓名是否已存在数据库中
-def check_name_unique(name: str, database_path: str):
-    # 连接到数据库
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
+# 批量把人脸添加到数据库：所有行用 executemany 在一个事务中插入，返回新插入行的 rowid 列表
+# faces 为 (人脸图像, 姓名, 特征向量) 的列表；checkpoint 为 (任务名, 已处理的条目数) 时，断点也在同一个事务中更新
+def add_faces_to_database(faces, database_path: str=None, checkpoint=None, image_format: str='.jpg'):
+    rows, face_images = [], []
+    for image, name, encoding in faces:
+        blob, scale = encoding_to_bytes(encoding, 'float32')
+        rows.append((name, blob, 'float32', scale))
+        face_images.append(encode_face_image(image, image_format))
+
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
 
-    # 执行查询语句，检查 name 是否存在
-    query = "SELECT COUNT(*) FROM faces WHERE name = ?"
-    cursor.execute(query, (name,))
-    result = cursor.fetchone()[0]
+        # 先拿到写锁，这样新插入的行一定是当前最大 id 之后的行
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM faces")
+        last_rowid = cursor.fetchone()[0]
+        cursor.executemany("INSERT INTO faces (name, encoding, encoding_dtype, encoding_scale) VALUES (?, ?, ?, ?)", rows)
+        cursor.execute("SELECT id FROM faces WHERE id > ? ORDER BY id", (last_rowid,))
+        rowids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany("INSERT INTO face_images (face_id, format, height, width, channels, data) VALUES (?, ?, ?, ?, ?, ?)",
+                           [(rowid, *face_image) for rowid, face_image in zip(rowids, face_images)])
 
-    # 关闭数据库连接
-    conn.close()
+        if checkpoint is not None:
+            cursor.execute("INSERT OR REPLACE INTO enroll_checkpoints (job, completed) VALUES (?, ?)", checkpoint)
+
+    return rowids
+
+
+# 检查要插入的姓名是否已存在数据库中（只需查询姓名索引，不会扫描整个表）
+def check_name_unique(name: str, database_path: str):
+    with get_connection(database_path) as connection:
+        exists = connection.execute("SELECT EXISTS (SELECT 1 FROM faces WHERE name = ?)", (name,)).fetchone()[0]
 
-    # 如果查询结果大于 0，说明 name 存在，返回 True；否则返回 False
-    return result > 0
+    # 如果 name 存在，返回 True；否则返回 False
+    return exists == 1
 
 
 # 从SQLite数据库中加载已知人脸的特征向量和姓名
@@ -65,17 +389,13 @@ def load_known_faces(database_path: str=None):
     known_face_encodings = []
     known_face_names = []
 
-    # 连接指定的数据库
-    connection = sqlite3.connect(database_path)
-    cursor = connection.cursor()
-    
-    cursor.execute("SELECT name, encoding FROM faces")
-    rows = cursor.fetchall()
-    connection.close()
+    # 从连接池中取一个连接
+    with get_connection(database_path) as connection:
+        rows = connection.execute("SELECT name, encoding, encoding_dtype, encoding_scale FROM faces ORDER BY id").fetchall()
     
     for row in rows:
         name = row[0]
-        encoding = np.frombuffer(row[1], dtype=np.float32)
+        encoding = encoding_from_bytes(row[1], row[2], row[3])
         known_face_names.append(name)
         known_face_encodings.append(encoding)
 
@@ -83,3 +403,72 @@ def load_known_faces(database_path: str=None):
     known_face_encodings = np.array(known_face_encodings)
 
     return known_face_encodings, known_face_names
+
+
+# 加载 rowid（即 id）大于 last_rowid 的人脸（即增量加载新录入的人脸），返回 rowid、姓名和特征向量
+def load_faces_since(last_rowid: int=0, database_path: str=None):
+    assert database_path is not None, 'Error: 请指定数据库文件路径！'
+
+    with get_connection(database_path) as connection:
+        rows = connection.execute('''SELECT id, name, encoding, encoding_dtype, encoding_scale FROM faces 
+                                     WHERE id > ? ORDER BY id''', (last_rowid,)).fetchall()
+
+    rowids = [row[0] for row in rows]
+    names = [row[1] for row in rows]
+    encodings = [encoding_from_bytes(row[2], row[3], row[4]) for row in rows]
+
+    return rowids, names, encodings
+
+
+# 获取faces表当前的行数和最大 rowid，用于判断内存中的人脸库是否和数据库一致
+# （COUNT(*) 会选择更小的姓名索引来计数，MAX(id) 直接读取主键的最后一项）
+def get_faces_state(database_path: str=None):
+    with get_connection(database_path) as connection:
+        count, max_rowid = connection.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM faces").fetchone()
+
+    return count, max_rowid
+
+
+# 加载指定人脸的 float32 原始特征向量，返回 rowid -> 特征向量 的字典（用于对候选人脸精确重排序）
+# 负的 rowid 为人脸模板；特征向量已被转换为紧凑格式、又没有保留原始特征向量的人脸（以及已经被删除的人脸）不在字典中
+def load_original_encodings(rowids, database_path: str=None, batch_size: int=500):
+    rowids = [int(rowid) for rowid in rowids]
+    face_ids = [rowid for rowid in rowids if rowid > 0]
+    template_ids = [-rowid for rowid in rowids if rowid < 0]
+
+    originals = {}
+    with get_connection(database_path) as connection:
+        for start_idx in range(0, len(face_ids), batch_size):
+            batch = face_ids[start_idx:start_idx + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            rows = connection.execute(f'''SELECT f.id, COALESCE(o.encoding, f.encoding) FROM faces f 
+                                          LEFT JOIN face_encodings_original o ON o.face_id = f.id 
+                                          WHERE f.id IN ({placeholders}) AND (o.encoding IS NOT NULL OR f.encoding_dtype = 'float32')''',
+                                      batch).fetchall()
+            originals.update((rowid, np.frombuffer(blob, dtype=np.float32)) for rowid, blob in rows)
+
+        for start_idx in range(0, len(template_ids), batch_size):
+            batch = template_ids[start_idx:start_idx + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            rows = connection.execute(f'''SELECT rowid, encoding FROM face_templates 
+                                          WHERE rowid IN ({placeholders}) AND encoding_dtype = 'float32' ''', batch).fetchall()
+            originals.update((-rowid, np.frombuffer(blob, dtype=np.float32)) for rowid, blob in rows)
+
+    return originals
+
+
+# 读取某个人脸压缩后的图像，返回 (格式, 字节串)，没有图像时返回 None（用于直接把图像发送给查看的用户，不用解码）
+def load_face_image_bytes(face_id: int, database_path: str=None):
+    with get_connection(database_path) as connection:
+        row = connection.execute("SELECT format, data FROM face_images WHERE face_id = ?", (face_id,)).fetchone()
+
+    return row
+
+
+# 读取并解码某个人脸的图像（BGR），没有图像或无法解码时返回 None
+def load_face_image(face_id: int, database_path: str=None):
+    with get_connection(database_path) as connection:
+        row = connection.execute("SELECT format, height, width, channels, data FROM face_images WHERE face_id = ?",
+                                 (face_id,)).fetchone()
+
+    return decode_face_image(*row) if row is not None else None
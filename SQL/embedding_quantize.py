@@ -0,0 +1,67 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-7
+
+import numpy as np
+
+'''
+    人脸特征向量的紧凑存储（量化）：
+    1.float16：直接转为半精度浮点数，体积为 float32 的一半
+    2.int8：每个向量单独计算缩放系数（scale = 最大绝对值 / 127），体积约为 float32 的四分之一
+    常驻内存的人脸库和旁路文件可以使用紧凑格式，匹配时先用紧凑格式粗筛出相似度最高的几个候选人脸，
+    再用数据库中的 float32 原始特征向量精确计算cos相似度进行重排序（见 face_gallery）
+'''
+
+
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+
+
+# 量化特征向量（按行），返回量化后的编码和每个向量的缩放系数（只有 int8 才需要缩放系数，其余为 1）
+def quantize_embeddings(embeddings, dtype: str='float32'):
+    assert dtype in SUPPORTED_DTYPES, f'Error: 不支持的特征向量存储格式 {dtype}，可选 {SUPPORTED_DTYPES}'
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.ones(embeddings.shape[:-1], dtype=np.float32)
+
+    if dtype == 'float32':
+        return embeddings, scales
+    if dtype == 'float16':
+        return embeddings.astype(np.float16), scales
+
+    # int8：最大绝对值映射到 127，全零向量的缩放系数取 1
+    max_abs = np.max(np.abs(embeddings), axis=-1)
+    scales = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+    codes = np.clip(np.rint(embeddings / scales[..., None]), -127, 127).astype(np.int8)
+
+    return codes, scales
+
+
+# 把量化后的编码反量化为 float32
+def dequantize_embeddings(codes, scales=None):
+    embeddings = np.asarray(codes).astype(np.float32)
+    if scales is not None and codes.dtype == np.int8:
+        embeddings *= np.asarray(scales, dtype=np.float32)[..., None]
+    return embeddings
+
+
+# 把单个特征向量编码为数据库中存储的字节串，返回字节串和缩放系数
+def encoding_to_bytes(encoding, dtype: str='float32'):
+    codes, scale = quantize_embeddings(np.asarray(encoding).reshape(-1), dtype)
+    return codes.tobytes(), float(scale)
+
+
+# 把数据库中存储的字节串解码为 float32 特征向量
+def encoding_from_bytes(blob, dtype: str='float32', scale: float=1.0):
+    codes = np.frombuffer(blob, dtype=np.dtype(dtype))
+    return dequantize_embeddings(codes, np.float32(scale))
+
+
+# 计算查询向量（已L2归一化）和部分已知人脸的cos相似度：
+# float32 格式的人脸直接做点积（精确值），紧凑格式的人脸先反量化并重新归一化再计算（近似值，只用于粗筛）
+def score_candidates(query_embedding, known_face_encodings, known_face_scales, candidates):
+    candidate_encodings = known_face_encodings[candidates]
+    if candidate_encodings.dtype == np.float32:
+        return candidate_encodings @ query_embedding
+
+    candidate_encodings = dequantize_embeddings(candidate_encodings, known_face_scales[candidates])
+    norms = np.linalg.norm(candidate_encodings, axis=1)
+    return (candidate_encodings @ query_embedding) / np.maximum(norms, np.finfo(np.float32).tiny)
@@ -0,0 +1,176 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-9
+
+import os
+import json
+import numpy as np
+from SQL.database_operate import load_faces_since, get_faces_state, get_faces_version
+from SQL.embedding_quantize import quantize_embeddings
+
+'''
+    特征向量的内存映射旁路文件（sidecar）：
+    在数据库文件旁边维护一份连续存储的特征向量矩阵（已L2归一化，按人脸库的存储格式量化）以及姓名、rowid 表，
+    加载人脸库时直接用 np.memmap 零拷贝映射，启动几乎不耗时，多个工作进程还能共享同一份页缓存；
+    meta.json 记录旁路文件对应的faces表版本号，版本号不一致时增量追加新行，检测到删除或修改时整体重建
+'''
+
+
+# 旁路文件中的姓名序列：所有姓名的 UTF-8 编码连续存储，按偏移量取出，用法和列表一样
+class Sidecar_Names:
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __getitem__(self, index):
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class Embedding_Sidecar:
+    def __init__(self, database_path: str, encoding_dtype: str='float32'):
+        self.database_path = database_path
+        self.encoding_dtype = encoding_dtype
+        self.directory = os.path.splitext(database_path)[0] + '_sidecar'
+        self.meta_path = os.path.join(self.directory, 'meta.json')
+        os.makedirs(self.directory, exist_ok=True)
+
+    # 旁路文件的路径（每次整体重建都换一个 generation，避免覆盖其他进程正在映射的文件）
+    def _file_path(self, name: str, generation: int):
+        return os.path.join(self.directory, f'{name}.{generation}.bin')
+
+    # 读取旁路文件的元数据，不存在或已损坏时返回 None
+    def read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # 写入元数据（先写临时文件再替换，其他进程不会读到写了一半的元数据）
+    def _write_meta(self, meta: dict):
+        temp_path = self.meta_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.meta_path)
+
+    # 从元数据记录的末尾开始写入数据（元数据之外残留的数据会被覆盖，不会错位）
+    def _write_at(self, name: str, generation: int, offset: int, data: bytes):
+        path = self._file_path(name, generation)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(offset)
+            f.write(data)
+
+    # 把人脸追加到旁路文件，返回更新后的元数据
+    def _append(self, meta: dict, rowids, names, encodings):
+        if len(names) <= 0:
+            return meta
+
+        # 旁路文件中存的是已L2归一化、再按存储格式量化后的特征向量
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+        norms = np.linalg.norm(encodings, axis=1, keepdims=True)
+        codes, scales = quantize_embeddings(encodings / np.maximum(norms, np.finfo(np.float32).tiny),
+                                            self.encoding_dtype)
+
+        count, generation = meta['count'], meta['generation']
+        dim = meta['dim'] or codes.shape[1]
+        assert codes.shape[1] == dim, f'Error: 特征向量维度 {codes.shape[1]} 和人脸库的维度 {dim} 不一致！'
+
+        encoded_names = [name.encode('utf-8') for name in names]
+        offsets = meta['names_bytes'] + np.cumsum([len(name) for name in encoded_names], dtype=np.int64)
+        if count == 0:
+            offsets = np.concatenate([[0], offsets]).astype(np.int64)
+
+        item_size = np.dtype(self.encoding_dtype).itemsize
+        self._write_at('encodings', generation, count * dim * item_size, codes.tobytes())
+        self._write_at('scales', generation, count * 4, scales.astype(np.float32).tobytes())
+        self._write_at('rowids', generation, count * 8, np.asarray(rowids, dtype=np.int64).tobytes())
+        self._write_at('names', generation, meta['names_bytes'], b''.join(encoded_names))
+        self._write_at('name_offsets', generation, (count + 1 if count > 0 else 0) * 8, offsets.tobytes())
+
+        return dict(meta,
+                    dim=dim,
+                    count=count + len(names),
+                    max_rowid=int(max(meta['max_rowid'], rowids[-1])),
+                    names_bytes=int(offsets[-1]))
+
+    # 从数据库整体重建旁路文件（写到新的 generation 中，完成后再切换元数据）
+    def _rebuild(self, meta, version):
+        old_generation = meta['generation'] if meta else None
+        new_meta = {'dtype': self.encoding_dtype,
+                    'generation': (old_generation or 0) + 1,
+                    'dim': 0,
+                    'count': 0,
+                    'max_rowid': 0,
+                    'names_bytes': 0}
+
+        rowids, names, encodings = load_faces_since(0, self.database_path)
+        new_meta = self._append(new_meta, rowids, names, encodings)
+        new_meta['version'], new_meta['rewrite_version'] = version
+        self._write_meta(new_meta)
+
+        # 删除旧的文件（Windows 下其他进程仍在映射的文件会删除失败，忽略即可）
+        if old_generation is not None:
+            for name in ('encodings', 'scales', 'rowids', 'names', 'name_offsets'):
+                try:
+                    os.remove(self._file_path(name, old_generation))
+                except OSError:
+                    pass
+
+        return new_meta
+
+    # 让旁路文件和数据库的faces表保持一致，返回最新的元数据
+    # connection 为调用方持有的数据库连接，同步期间用它持有写锁，保证同一时间只有一个进程在修改旁路文件
+    def sync(self, connection):
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self.read_meta()
+            version = list(get_faces_version(self.database_path))
+
+            # 元数据和数据库的版本号一致，旁路文件就是最新的
+            if meta is not None and meta['dtype'] == self.encoding_dtype and \
+                    [meta['version'], meta['rewrite_version']] == version:
+                return meta
+
+            # 没有旁路文件、存储格式变了，或者有行被删除或修改过，只能整体重建
+            if meta is None or meta['dtype'] != self.encoding_dtype or meta['rewrite_version'] != version[1]:
+                return self._rebuild(meta, version)
+
+            # 只有新插入的行，增量追加
+            rowids, names, encodings = load_faces_since(meta['max_rowid'], self.database_path)
+            meta = self._append(meta, rowids, names, encodings)
+
+            # 行数对不上说明旁路文件已经和数据库不一致了，整体重建
+            count, _ = get_faces_state(self.database_path)
+            if count != meta['count']:
+                return self._rebuild(meta, version)
+
+            meta['version'], meta['rewrite_version'] = version
+            self._write_meta(meta)
+            return meta
+        finally:
+            connection.rollback()
+
+    # 按元数据零拷贝映射旁路文件，返回特征向量矩阵、缩放系数、rowid 和姓名序列
+    def map(self, meta: dict):
+        count, dim, generation = meta['count'], meta['dim'], meta['generation']
+        if count <= 0:
+            return (np.empty((0, 0), dtype=np.dtype(self.encoding_dtype)),
+                    np.empty(0, dtype=np.float32),
+                    np.empty(0, dtype=np.int64),
+                    [])
+
+        encodings = np.memmap(self._file_path('encodings', generation), dtype=np.dtype(self.encoding_dtype),
+                              mode='r', shape=(count, dim))
+        scales = np.memmap(self._file_path('scales', generation), dtype=np.float32, mode='r', shape=(count,))
+        rowids = np.memmap(self._file_path('rowids', generation), dtype=np.int64, mode='r', shape=(count,))
+        offsets = np.memmap(self._file_path('name_offsets', generation), dtype=np.int64, mode='r', shape=(count + 1,))
+        data = np.memmap(self._file_path('names', generation), dtype=np.uint8, mode='r', shape=(meta['names_bytes'],)) \
+            if meta['names_bytes'] > 0 else np.empty(0, dtype=np.uint8)
+
+        return encodings, scales, rowids, Sidecar_Names(data, offsets)
@@ -0,0 +1,76 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+from SQL.connection_pool import get_connection
+from SQL.database_operate import migrate_database
+from SQL.embedding_quantize import SUPPORTED_DTYPES, encoding_to_bytes, encoding_from_bytes
+
+'''
+    数据库中特征向量存储格式的转换（一次性的离线任务，需要手动运行，启动时不会自动转换）：
+    录入的特征向量默认以 float32 存储，人脸库的紧凑格式（encoding_dtype）只影响内存和旁路文件，不需要转换数据库；
+    只有想让启动时加载的faces表变小时，才用这个任务把faces表中的特征向量转换为 float16 / int8；
+    默认把转换前的 float32 特征向量保存到 face_encodings_original 表，匹配时的精确重排序仍然使用原始特征向量，
+    之后转换回 float32 也是无损的；keep_originals=False 时不保留原始特征向量（数据库文件才会真正变小），
+    这些人脸的重排序只能用反量化的特征向量近似计算，且转换不可逆
+'''
+
+
+# 把faces表中所有特征向量转换为指定的存储格式（float32 / float16 / int8），返回转换的行数
+# 转换后会执行 VACUUM 回收空间（id 是整数主键，VACUUM 不会改变）；转换会使已经打开的人脸库完整重新加载
+def convert_encodings(encoding_dtype: str='float32',
+                      database_path: str=None,
+                      keep_originals: bool=True,
+                      batch_size: int=10000):
+    assert encoding_dtype in SUPPORTED_DTYPES, f'Error: 不支持的特征向量存储格式 {encoding_dtype}，可选 {SUPPORTED_DTYPES}'
+
+    with get_connection(database_path) as connection:
+        cursor = connection.cursor()
+
+        converted = 0
+        last_rowid = 0
+        while True:
+            cursor.execute('''SELECT f.id, f.encoding, f.encoding_dtype, f.encoding_scale, o.encoding FROM faces f
+                              LEFT JOIN face_encodings_original o ON o.face_id = f.id
+                              WHERE f.id > ? AND f.encoding_dtype != ? ORDER BY f.id LIMIT ?''',
+                           (last_rowid, encoding_dtype, batch_size))
+            rows = cursor.fetchall()
+            if len(rows) <= 0:
+                break
+
+            updates, originals = [], []
+            for rowid, blob, dtype, scale, original in rows:
+                # 有原始特征向量时从原始特征向量转换，不会在多次转换中累积误差
+                if original is not None:
+                    blob, dtype, scale = original, 'float32', 1.0
+                elif dtype == 'float32' and keep_originals:
+                    originals.append((rowid, blob))
+
+                encoding = encoding_from_bytes(blob, dtype, scale)
+                updates.append((*encoding_to_bytes(encoding, encoding_dtype), encoding_dtype, rowid))
+
+            cursor.executemany("INSERT OR IGNORE INTO face_encodings_original (face_id, encoding) VALUES (?, ?)", originals)
+            cursor.executemany("UPDATE faces SET encoding = ?, encoding_scale = ?, encoding_dtype = ? WHERE id = ?", updates)
+            # 转换回 float32 后，faces表中的就是原始特征向量，不用再单独保存
+            if encoding_dtype == 'float32':
+                cursor.executemany("DELETE FROM face_encodings_original WHERE face_id = ?", [(rowid,) for *_, rowid in updates])
+            connection.commit()
+
+            converted += len(rows)
+            last_rowid = rows[-1][0]
+
+        if converted > 0:
+            cursor.execute("VACUUM")
+
+    return converted
+
+
+# 在项目根目录下运行：python -m SQL.encoding_convert
+if __name__ == '__main__':
+    # 数据库文件路径、目标存储格式，以及是否保留 float32 原始特征向量
+    database_path = 'databases/known_faces.db'
+    encoding_dtype = 'int8'
+    keep_originals = True
+
+    migrate_database(database_path)
+    converted = convert_encodings(encoding_dtype, database_path, keep_originals)
+    print(f"已将 {converted} 个人脸特征向量转换为 {encoding_dtype} 格式")
@@ -0,0 +1,506 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-2
+
+import time
+import threading
+import numpy as np
+from SQL.database_operate import add_face_to_database, add_faces_to_database, load_faces_since, get_faces_version, load_face_templates, get_templates_state, load_face_image, load_original_encodings
+from SQL.ann_index import IVF_Index, get_index_path
+from SQL.embedding_quantize import quantize_embeddings, dequantize_embeddings
+from SQL.embedding_sidecar import Embedding_Sidecar
+from SQL.connection_pool import get_pool
+
+'''
+    常驻内存的已知人脸库：
+    由主函数创建并在整个运行期间持有，只在启动时完整加载一次数据库，
+    之后本进程的人脸录入直接追加到内存中，其他进程对数据库的修改通过 PRAGMA data_version 低成本地检测，
+    检测到变化时只增量加载新增的行，只有发现行被删除等无法增量同步的情况才会完整重新加载；
+    人脸库中的特征向量在加载和录入时就做好L2归一化，匹配时直接做矩阵乘法即可得到cos相似度；
+    人脸库很大时可以启用 IVF 近似最近邻索引，只在部分簇中搜索候选人脸（聚类和保存索引都在后台线程中进行，不阻塞录入和识别）；
+    还可以选择用 float16 / int8 紧凑格式存储内存中的特征向量，内存占用缩小 2~4 倍，匹配时用紧凑格式粗筛出少量候选人脸，
+    再用数据库中的 float32 原始特征向量精确重排序（int8 的扫描比 float32 更快，float16 只节省内存，扫描反而更慢）；
+    启用旁路文件（sidecar）时，人脸库直接内存映射数据库旁边的特征向量矩阵，启动不用解析整个faces表；
+    模板匹配模式下，人脸库加载的是压缩任务生成的每人少量模板（再加上压缩之后新录入的人脸），而不是faces表的每一行
+'''
+
+
+# 对特征向量按行做L2归一化（零向量保持为零，避免除以0）
+def normalize_embeddings(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+# 暴力搜索：在已知人脸库中为每个查询向量找到最相似的人脸，返回最相似人脸的下标和cos相似度
+# 查询向量和已知人脸库都要求已经L2归一化，所有查询向量和一批已知人脸只需要做一次 (人脸数 × 批大小) 的矩阵乘法
+def search_known_faces(query_embeddings,
+                       known_face_encodings,
+                       batch_size: int = 65536):
+    num_queries = len(query_embeddings)
+
+    best_indices = np.zeros(num_queries, dtype=np.int64)
+    best_similarities = np.full(num_queries, -np.inf, dtype=np.float32)
+    rows = np.arange(num_queries)
+
+    # 已知人脸库特别大时按批计算，避免相似度矩阵占用过多内存
+    for start_idx in range(0, len(known_face_encodings), batch_size):
+        batch_encodings = known_face_encodings[start_idx:start_idx + batch_size]
+
+        similarities = query_embeddings @ batch_encodings.T
+        batch_indices = np.argmax(similarities, axis=1)
+        batch_similarities = similarities[rows, batch_indices]
+
+        # 只有严格大于之前批次的最大值才更新，保证相似度相同时取下标最小的人脸
+        better = batch_similarities > best_similarities
+        best_indices[better] = start_idx + batch_indices[better]
+        best_similarities[better] = batch_similarities[better]
+
+    return best_indices, best_similarities
+
+
+# 按查询向量分组，为每个查询向量保留相似度最高的 top_k 个候选人脸（相似度相同时下标小的优先）
+# query_ids、indices、scores 为候选人脸所属的查询向量、候选人脸的下标和相似度，返回值同样按查询向量分组排好序
+def select_top_k(query_ids, indices, scores, num_queries: int, top_k: int):
+    order = np.lexsort((indices, -scores, query_ids))
+    query_ids, indices, scores = query_ids[order], indices[order], scores[order]
+    ranks = np.arange(len(query_ids)) - np.searchsorted(query_ids, np.arange(num_queries))[query_ids]
+    keep = ranks < top_k
+    return query_ids[keep], indices[keep], scores[keep]
+
+
+# 紧凑格式（float16 / int8）的暴力搜索，为每个查询向量找到近似相似度最高的 top_k 个候选人脸（之后再精确重排序），
+# 返回 (查询向量数 × top_k) 的候选人脸下标和近似相似度（按相似度从高到低排列）
+# 每批只把 batch_size 个已知人脸转换到一块复用的 float32 缓冲区中（留在CPU缓存里），相似度也直接写入复用的缓冲区；
+# 每个查询向量记录当前第 top_k 高的相似度作为门槛，每批只收集超过门槛的少量人脸，而不是每批都做一次排序
+def search_compact_faces(query_embeddings,
+                         known_face_encodings,
+                         known_face_scales,
+                         batch_size: int = 256,
+                         top_k: int = 8):
+    num_queries, num_faces = len(query_embeddings), len(known_face_encodings)
+    top_k = min(top_k, num_faces)
+    batch_size = min(batch_size, num_faces)
+    is_int8 = known_face_encodings.dtype == np.int8
+
+    query_matrix = np.ascontiguousarray(np.asarray(query_embeddings, dtype=np.float32).T)
+    batch_buffer = np.empty((batch_size, known_face_encodings.shape[1]), dtype=np.float32)
+    scores_buffer = np.empty((batch_size, num_queries), dtype=np.float32)
+    thresholds = np.full(num_queries, -np.inf, dtype=np.float32)
+
+    query_ids, indices, scores = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+    num_collected = 0
+    for start_idx in range(0, num_faces, batch_size):
+        batch_encodings = known_face_encodings[start_idx:start_idx + batch_size]
+        batch_len = len(batch_encodings)
+        batch_scores = scores_buffer[:batch_len]
+
+        np.copyto(batch_buffer[:batch_len], batch_encodings, casting='unsafe')
+        np.matmul(batch_buffer[:batch_len], query_matrix, out=batch_scores)
+        if is_int8:
+            batch_scores *= known_face_scales[start_idx:start_idx + batch_len, None]
+
+        rows, cols = np.nonzero(batch_scores >= thresholds)
+        if len(rows) <= 0:
+            continue
+        query_ids.append(cols)
+        indices.append(rows + start_idx)
+        scores.append(batch_scores[rows, cols])
+        num_collected += len(rows)
+
+        # 收集的人脸太多时，只保留每个查询向量的前 top_k 个，并提高门槛
+        if num_collected > 4 * top_k * num_queries:
+            kept = select_top_k(np.concatenate(query_ids), np.concatenate(indices), np.concatenate(scores), num_queries, top_k)
+            query_ids, indices, scores = [kept[0]], [kept[1]], [kept[2]]
+            num_collected = len(kept[0])
+
+            full = np.bincount(kept[0], minlength=num_queries) >= top_k
+            last = np.searchsorted(kept[0], np.arange(num_queries)) + top_k - 1
+            thresholds[full] = kept[2][last[full]]
+
+    _, indices, scores = select_top_k(np.concatenate(query_ids), np.concatenate(indices), np.concatenate(scores), num_queries, top_k)
+
+    # 每个人脸都会在第一次合并前被收集，所以每个查询向量都恰好有 top_k 个候选人脸
+    return indices.reshape(num_queries, top_k), scores.reshape(num_queries, top_k)
+
+
+# 精确重排序：用数据库中的 float32 原始特征向量重新计算每个查询向量和候选人脸的cos相似度，返回最相似人脸的下标和cos相似度
+# candidate_indices 为每个查询向量的候选人脸下标（-1 为空位），candidate_scores 为紧凑格式下的近似相似度，
+# 没有原始特征向量的候选人脸（见 encoding_convert）沿用近似相似度；相似度相同时取下标最小的人脸（与暴力搜索一致）
+def rerank_candidates(query_embeddings, candidate_indices, candidate_scores, rowids, database_path: str):
+    num_queries = len(query_embeddings)
+    unique_indices = np.unique(candidate_indices[candidate_indices >= 0])
+    originals = load_original_encodings([rowids[i] for i in unique_indices], database_path)
+
+    # 所有候选人脸的原始特征向量归一化后和所有查询向量一次算出相似度
+    positions = {}
+    for index in unique_indices:
+        if int(rowids[index]) in originals:
+            positions[index] = len(positions)
+    exact_similarities = np.empty((num_queries, 0), dtype=np.float32)
+    if len(positions) > 0:
+        exact_encodings = normalize_embeddings([originals[int(rowids[index])] for index in positions])
+        exact_similarities = query_embeddings @ exact_encodings.T
+
+    best_indices = np.zeros(num_queries, dtype=np.int64)
+    best_similarities = np.full(num_queries, -np.inf, dtype=np.float32)
+    for i in range(num_queries):
+        valid = candidate_indices[i] >= 0
+        candidates = candidate_indices[i][valid]
+        if len(candidates) <= 0:
+            continue
+
+        similarities = candidate_scores[i][valid].astype(np.float32)
+        for j, index in enumerate(candidates):
+            if index in positions:
+                similarities[j] = exact_similarities[i, positions[index]]
+
+        best = np.lexsort((candidates, -similarities))[0]
+        best_indices[i] = candidates[best]
+        best_similarities[i] = similarities[best]
+
+    return best_indices, best_similarities
+
+
+class Face_Gallery:
+    def __init__(self,
+                 database_path: str,
+                 use_ann_index: bool=False,
+                 nprobe: int=16,
+                 ann_min_size: int=10000,
+                 encoding_dtype: str='float32',
+                 use_sidecar: bool=False,
+                 match_mode: str='faces',
+                 image_format: str='.jpg',
+                 rerank_k: int=8,
+                 index_save_interval: float=60.0):
+        assert database_path is not None, 'Error: 请指定数据库文件路径！'
+        self.database_path = database_path
+
+        # 特征向量在内存（和旁路文件）中的存储格式（float32 / float16 / int8），数据库中始终保存 float32 的原始特征向量；
+        # 紧凑格式下每个查询向量粗筛出 rerank_k 个候选人脸再精确重排序；以及录入的人脸图像的压缩格式（.jpg / .png / .webp）
+        self.encoding_dtype = encoding_dtype
+        self.rerank_k = rerank_k
+        self.image_format = image_format
+
+        # IVF 索引的配置：人脸数少于 ann_min_size 时暴力搜索已经足够快，不使用索引
+        self.use_ann_index = use_ann_index
+        self.nprobe = nprobe
+        self.ann_min_size = ann_min_size
+        self.index_path = get_index_path(database_path)
+        self.index = None
+
+        # 重新聚类和保存索引都在后台线程中进行：新录入的人脸只在内存中加入索引，最多每 index_save_interval 秒保存一次
+        # _generation 在人脸库被完整重新加载时加 1，后台构建完成时据此判断构建用的快照是否已经失效
+        self.index_save_interval = index_save_interval
+        self._index_thread = None
+        self._index_dirty = False
+        self._index_saved_at = time.monotonic()
+        self._generation = 0
+
+        # 匹配模式：'faces' 匹配faces表中的每一次录入，'templates' 匹配压缩后的每人模板
+        assert match_mode in ('faces', 'templates'), f'Error: 不支持的匹配模式 {match_mode}'
+        self.match_mode = match_mode
+        self._templates_state = None
+
+        # 内存映射的旁路文件，启用后人脸库的数据都来自旁路文件，录入和同步也都写到旁路文件中
+        # 旁路文件是faces表的镜像，模板匹配模式下不使用
+        if use_sidecar and match_mode == 'templates':
+            print("Warning: 模板匹配模式不使用特征向量旁路文件")
+        self.sidecar = Embedding_Sidecar(database_path, encoding_dtype) if use_sidecar and match_mode == 'faces' else None
+        self._sidecar_generation = None
+
+        # Gradio 的回调可能在多个线程中同时访问人脸库，所以读写都要加锁
+        self._lock = threading.RLock()
+
+        # 常驻的数据库连接，用于查询 data_version（其他连接提交修改后该值会变化），以及同步旁路文件时持有写锁
+        # data_version 只反映其他连接的修改，所以这个连接不放回连接池，单独持有
+        self._connection = get_pool(database_path).connect()
+        self._data_version = None
+        # faces表的 rewrite_version（有行被删除或修改时加 1），变化时只能完整重新加载
+        self._rewrite_version = None
+
+        self.reload()
+
+    # 查询数据库的版本号，只要有其他连接提交过修改，返回值就会不同
+    def _get_data_version(self):
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    # 完整重新加载数据库中的所有人脸
+    def reload(self):
+        with self._lock:
+            self._generation += 1
+            self._data_version = self._get_data_version()
+            self._rewrite_version = get_faces_version(self.database_path)[1]
+            self._size = 0
+            self._last_rowid = 0
+            self._encodings = np.empty((0, 0), dtype=np.dtype(self.encoding_dtype))
+            self._scales = np.empty(0, dtype=np.float32)
+            self.names = []
+            self.rowids = []
+            self.index = None
+
+            if self.sidecar is not None:
+                self._map_sidecar()
+            elif self.match_mode == 'templates':
+                self._load_templates()
+            else:
+                rowids, names, encodings = load_faces_since(0, self.database_path)
+                self._append(rowids, names, encodings)
+            self._sync_index()
+
+    # 加载人脸模板，以及压缩之后新录入、还没有生成模板的人脸
+    # 模板的 rowid 记为负的模板 id，不会和faces表的 rowid 冲突
+    def _load_templates(self):
+        template_ids, names, encodings, self._templates_state = load_face_templates(self.database_path)
+        self._append([-template_id for template_id in template_ids], names, encodings)
+
+        compacted_max_rowid = self._templates_state[1]
+        self._last_rowid = compacted_max_rowid
+        rowids, names, encodings = load_faces_since(compacted_max_rowid, self.database_path)
+        self._append(rowids, names, encodings)
+
+    # 同步旁路文件，并把人脸库切换为旁路文件的内存映射（只映射，不复制数据）
+    def _map_sidecar(self):
+        meta = self.sidecar.sync(self._connection)
+        # 旁路文件整体重建过（有行被删除或修改），原来的索引已经和人脸库对不上了
+        if self._size > 0 and self._sidecar_generation != meta['generation']:
+            self._generation += 1
+            self.index = None
+        self._sidecar_generation = meta['generation']
+        self._encodings, self._scales, self.rowids, self.names = self.sidecar.map(meta)
+        self._size = meta['count']
+        self._last_rowid = meta['max_rowid']
+
+    # 把人脸追加到内存中的人脸库（按容量倍增的方式扩容，避免每次追加都复制整个矩阵）
+    def _append(self, rowids, names, encodings):
+        if len(names) <= 0:
+            return
+
+        encodings = normalize_embeddings(np.asarray(encodings, dtype=np.float32).reshape(len(names), -1))
+        codes, scales = quantize_embeddings(encodings, self.encoding_dtype)
+        needed = self._size + len(names)
+        dim = encodings.shape[1]
+
+        if self._encodings.shape[0] < needed or self._encodings.shape[1] != dim:
+            capacity = max(needed, 2 * self._encodings.shape[0], 64)
+            buffer = np.empty((capacity, dim), dtype=codes.dtype)
+            scales_buffer = np.empty(capacity, dtype=np.float32)
+            if self._size > 0:
+                buffer[:self._size] = self._encodings[:self._size]
+                scales_buffer[:self._size] = self._scales[:self._size]
+            # 之前返回出去的视图仍然指向旧的缓冲区，不会受到影响
+            self._encodings = buffer
+            self._scales = scales_buffer
+
+        self._encodings[self._size:needed] = codes
+        self._scales[self._size:needed] = scales
+        self._size = needed
+        self.names.extend(names)
+        self.rowids.extend(rowids)
+        self._last_rowid = max(self._last_rowid, rowids[-1])
+
+    # 让 IVF 索引和内存中的人脸库保持一致：新增的人脸直接分配到已有的簇（很快，在锁内完成），
+    # 需要重新聚类（没有可用的索引，或人脸库比训练时增长了 4 倍以上，簇会变得不均衡）时交给后台线程，
+    # 构建完成之前搜索沿用旧的索引（没有索引时暴力搜索，结果只会更准确）；索引也在后台线程中按时间间隔保存
+    def _sync_index(self):
+        if not self.use_ann_index or self._size < self.ann_min_size:
+            self.index = None
+            return
+
+        # 启动（或完整重新加载）时优先加载磁盘上的索引
+        if self.index is None and not self._index_task_running():
+            self._load_index()
+
+        self._sync_index_tail()
+
+        if self.index is None or self._size > 4 * self.index.trained_size or \
+                (self._index_dirty and time.monotonic() - self._index_saved_at >= self.index_save_interval):
+            self._start_index_task()
+
+    # 只把新增的人脸加入索引（分配簇用 float32 计算，紧凑格式只反量化新增的部分）
+    def _sync_index_tail(self):
+        if self.index is not None and len(self.index) < self._size:
+            start = len(self.index)
+            self.index.add(dequantize_embeddings(self._encodings[start:self._size], self._scales[start:self._size]),
+                           self._get_rowids(start, self._size))
+            self._index_dirty = True
+
+    # 加载磁盘上的索引，索引中的人脸必须是当前人脸库的前缀，否则说明已经过期
+    def _load_index(self):
+        index = IVF_Index.load(self.index_path)
+        if index is not None and (len(index) > self._size or
+                                  not np.array_equal(index.rowids, self._get_rowids(0, len(index)))):
+            index = None
+        if index is not None:
+            index.nprobe = self.nprobe
+        self.index = index
+
+    # 取得人脸库中 [start, end) 范围内人脸的 rowid 数组
+    def _get_rowids(self, start: int, end: int):
+        return np.asarray(self.rowids[start:end], dtype=np.int64)
+
+    def _index_task_running(self):
+        return self._index_thread is not None and self._index_thread.is_alive()
+
+    # 启动后台维护索引的线程（同一时间只有一个）
+    def _start_index_task(self):
+        if not self._index_task_running():
+            self._index_thread = threading.Thread(target=self._maintain_index, daemon=True)
+            self._index_thread.start()
+
+    # 后台线程：需要时重新聚类构建索引（构建期间人脸库被完整重新加载过时重来一次），然后保存索引
+    def _maintain_index(self):
+        while True:
+            with self._lock:
+                if not self.use_ann_index or self._size < self.ann_min_size:
+                    break
+                if self.index is None:
+                    self._load_index()
+                    self._sync_index_tail()
+                if self.index is not None and self._size <= 4 * self.index.trained_size:
+                    break
+            if self._rebuild_index():
+                break
+        self._save_index()
+
+    # 用人脸库的快照重新聚类构建索引：最耗时的聚类在锁外进行，
+    # 人脸库只会在末尾追加，快照中的行不会改变，构建完成后再在锁内补上构建期间新增的人脸，替换旧的索引
+    # 快照在构建期间失效时（人脸库被完整重新加载过）返回 False
+    def _rebuild_index(self):
+        with self._lock:
+            generation, size = self._generation, self._size
+            encodings, scales = self._encodings[:size], self._scales[:size]
+            rowids = self._get_rowids(0, size)
+
+        index = IVF_Index(IVF_Index.suggest_nlist(size), self.nprobe)
+        index.build(dequantize_embeddings(encodings, scales), rowids)
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self.index = index
+            self._sync_index_tail()
+            self._index_dirty = True
+
+        return True
+
+    # 把索引保存到数据库文件旁边（保存的是一个完整的前缀，所以在锁外保存，不阻塞录入）
+    def _save_index(self):
+        with self._lock:
+            index = self.index
+            if index is None or not self._index_dirty:
+                return
+            self._index_dirty = False
+            self._index_saved_at = time.monotonic()
+
+        index.save(self.index_path)
+
+    # 检查数据库是否被其他进程修改过，有修改的话增量同步
+    def refresh(self):
+        with self._lock:
+            data_version = self._get_data_version()
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+
+            # 旁路文件会自己检测是增量追加还是整体重建
+            if self.sidecar is not None:
+                self._map_sidecar()
+                self._sync_index()
+                return
+
+            # 模板匹配模式下，重新压缩过就完整重新加载（faces表中被删除的行要等下次压缩才会体现）
+            if self.match_mode == 'templates' and get_templates_state(self.database_path) != self._templates_state:
+                self.reload()
+                return
+
+            # 有行被删除或修改过（行数可能没变，例如删除一行后又录入一行，或者特征向量被转换过），只能完整重新加载
+            if get_faces_version(self.database_path)[1] != self._rewrite_version:
+                self.reload()
+                return
+
+            # 只加载新增的行
+            rowids, names, encodings = load_faces_since(self._last_rowid, self.database_path)
+            self._append(rowids, names, encodings)
+            self._sync_index()
+
+    # 录入人脸：写入数据库的同时直接追加到内存中的人脸库，返回人脸在数据库中的 id
+    def add_face(self, image, name: str, encoding):
+        with self._lock:
+            rowid = add_face_to_database(image, name, encoding, self.database_path, self.image_format)
+            if self.sidecar is not None:
+                self._map_sidecar()
+            else:
+                self._append([rowid], [name], [encoding])
+            self._sync_index()
+
+        return rowid
+
+    # 批量录入人脸：faces 为 (人脸图像, 姓名, 特征向量) 的列表，在一个事务中写入数据库，再一次性追加到内存中的人脸库
+    # checkpoint 为 (任务名, 已处理的条目数) 时，批量录入的断点和人脸一起提交
+    def add_faces(self, faces: list, checkpoint=None):
+        with self._lock:
+            rowids = add_faces_to_database(faces, self.database_path, checkpoint, self.image_format)
+            if self.sidecar is not None:
+                self._map_sidecar()
+            else:
+                self._append(rowids, [name for _, name, _ in faces], [encoding for _, _, encoding in faces])
+            self._sync_index()
+
+    # 获取当前的已知人脸特征向量矩阵（已L2归一化，float32 格式）和姓名（获取前会先检查数据库是否有更新）
+    # 姓名列表只会追加，所以直接返回，按矩阵的行数取用即可，不用每次都复制
+    def get_known_faces(self):
+        with self._lock:
+            self.refresh()
+            encodings = self._encodings[:self._size]
+            if encodings.dtype != np.float32:
+                encodings = normalize_embeddings(dequantize_embeddings(encodings, self._scales[:self._size]))
+            return encodings, self.names
+
+    # 为每个查询向量在人脸库中找到最相似的人脸，返回其姓名和cos相似度（人脸库为空时姓名为 None、相似度为 -inf）
+    # 启用了 IVF 索引时只搜索 nprobe 个簇；使用紧凑格式时先粗筛出候选人脸，再用数据库中的 float32 原始特征向量精确重排序
+    def search(self, query_embeddings, nprobe: int=None):
+        # 在锁内取得一致的快照，搜索本身在锁外进行，不阻塞其他线程
+        with self._lock:
+            self.refresh()
+            known_face_encodings, known_face_scales = self._encodings[:self._size], self._scales[:self._size]
+            known_face_names, known_face_rowids, index = self.names, self.rowids, self.index
+
+        num_queries = len(query_embeddings)
+        if num_queries <= 0 or len(known_face_encodings) <= 0:
+            return [None] * num_queries, np.full(num_queries, -np.inf, dtype=np.float32)
+
+        query_embeddings = normalize_embeddings(query_embeddings)
+        is_compact = known_face_encodings.dtype != np.float32
+        if index is not None:
+            candidate_indices, candidate_scores = index.search(query_embeddings, known_face_encodings, known_face_scales,
+                                                               nprobe, self.rerank_k if is_compact else 1)
+            best_indices, best_similarities = candidate_indices[:, 0], candidate_scores[:, 0]
+        elif is_compact:
+            candidate_indices, candidate_scores = search_compact_faces(query_embeddings, known_face_encodings, known_face_scales,
+                                                                       top_k=self.rerank_k)
+        else:
+            best_indices, best_similarities = search_known_faces(query_embeddings, known_face_encodings)
+
+        if is_compact:
+            best_indices, best_similarities = rerank_candidates(query_embeddings, candidate_indices, candidate_scores,
+                                                                known_face_rowids, self.database_path)
+
+        best_names = [known_face_names[i] if np.isfinite(similarity) else None
+                      for i, similarity in zip(best_indices, best_similarities)]
+
+        return best_names, best_similarities
+
+    # 读取某个人脸录入时的图像（BGR），只在查看时才从数据库读取、解码，不会常驻内存
+    def get_face_image(self, face_id: int):
+        return load_face_image(face_id, self.database_path)
+
+    def __len__(self):
+        return self._size
+
+    # 关闭人脸库：等待后台维护索引的线程结束，并保存还没有保存的索引
+    def close(self):
+        if self._index_thread is not None:
+            self._index_thread.join()
+        self._save_index()
+        self._connection.close()
@@ -0,0 +1,60 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-27
+
+import cv2
+import math
+import numpy as np
+
+'''
+    录入人脸图像的压缩存储：
+    对齐后的人脸图像（norm_crop，默认 112x112x3）原来以未压缩的像素直接存在faces表中，每行约 37 KB，
+    现在压缩为 JPEG（默认）/ PNG / WebP 后单独存放在 face_images 表中，并记录图像的高、宽、通道数，
+    只有需要查看某个人脸图像时才读取、解码，加载特征向量时不会再读取图像数据
+'''
+
+
+SUPPORTED_FORMATS = ('.jpg', '.png', '.webp')
+
+# 旧数据库中无法确定形状的图像原样保存（不压缩），格式记为 'raw'
+RAW_FORMAT = 'raw'
+
+
+# 压缩人脸图像，返回 (格式, 高, 宽, 通道数, 压缩后的字节串)；quality 只对 JPEG / WebP 有效
+def encode_face_image(image, image_format: str='.jpg', quality: int=95):
+    assert image_format in SUPPORTED_FORMATS, f'Error: 不支持的人脸图像存储格式 {image_format}，可选 {SUPPORTED_FORMATS}'
+
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    if image_format == '.jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif image_format == '.webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = []
+
+    success, data = cv2.imencode(image_format, image, params)
+    assert success, f'Error: 人脸图像压缩为 {image_format} 格式失败'
+    channels = image.shape[2] if image.ndim == 3 else 1
+
+    return image_format, image.shape[0], image.shape[1], channels, data.tobytes()
+
+
+# 把压缩后的人脸图像解码为 BGR 图像（无法解码时返回 None）
+def decode_face_image(image_format: str, height: int, width: int, channels: int, data: bytes):
+    if image_format == RAW_FORMAT:
+        if height * width * channels != len(data) or len(data) <= 0:
+            return None
+        return np.frombuffer(data, dtype=np.uint8).reshape((height, width, channels) if channels > 1 else (height, width))
+
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+# 旧数据库中的人脸图像是没有形状信息的原始像素：按正方形的 BGR 图像还原（norm_crop 的输出都是正方形），
+# 能还原时压缩为 image_format 格式，否则原样保存
+def encode_legacy_face_image(blob: bytes, image_format: str='.jpg', quality: int=95):
+    blob = bytes(blob)
+    side = math.isqrt(len(blob) // 3)
+    if side > 0 and side * side * 3 == len(blob):
+        image = np.frombuffer(blob, dtype=np.uint8).reshape(side, side, 3)
+        return encode_face_image(image, image_format, quality)
+
+    return RAW_FORMAT, 0, 0, 0, blob
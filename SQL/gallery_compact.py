@@ -0,0 +1,128 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-11
+
+import numpy as np
+from collections import defaultdict
+from SQL.database_operate import load_faces_since, save_face_templates, get_faces_state
+
+'''
+    人脸库压缩（按身份生成模板）：
+    faces表中同一个人可以录入任意多次，匹配时每一行都要参与计算，
+    压缩任务把每个人的所有特征向量先去掉几乎重复的，再聚成最多 max_templates 个簇，
+    每个簇用一个代表性的模板（簇中心或簇内的中心点 medoid）表示，写入 face_templates 表，
+    原始的faces表保持不变（用于审计），人脸库选择模板匹配模式后，匹配时间只和人数有关，而和录入次数无关
+'''
+
+
+# 去掉几乎重复的特征向量（已L2归一化）：依次检查每个向量，和已保留的向量相似度达到阈值的就合并到该向量上
+# 返回保留的向量下标，以及每个保留的向量合并了多少个原始向量（包括自己）
+def prune_duplicates(encodings, duplicate_threshold: float=0.95):
+    kept = []
+    weights = []
+    for i, encoding in enumerate(encodings):
+        if kept:
+            similarities = encodings[kept] @ encoding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= duplicate_threshold:
+                weights[best] += 1
+                continue
+        kept.append(i)
+        weights.append(1)
+
+    return np.array(kept, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+
+# 带权重的 k-medoids 聚类（用cos相似度度量），返回每个向量所属的簇和每个簇的中心点下标
+def k_medoids(encodings, weights, k: int, iterations: int=10):
+    similarities = encodings @ encodings.T
+
+    # 初始化：先选加权后和所有向量最相似的点，再依次选和已选中心点最不相似的点
+    medoids = [int(np.argmax(similarities @ weights))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmin(np.max(similarities[:, medoids], axis=1))))
+
+    for _ in range(iterations):
+        labels = np.argmax(similarities[:, medoids], axis=1)
+
+        # 每个簇重新选择中心点：簇内和其他成员加权相似度之和最大的点
+        new_medoids = []
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            scores = similarities[np.ix_(members, members)] @ weights[members]
+            new_medoids.append(int(members[np.argmax(scores)]))
+
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+
+    labels = np.argmax(similarities[:, medoids], axis=1)
+    return labels, medoids
+
+
+# 把一个人的所有特征向量压缩成最多 max_templates 个模板，返回 (模板特征向量, 代表的原始人脸数) 的列表
+# method 为 'centroid' 时模板取簇内向量的加权均值（再归一化），为 'medoid' 时取簇内的中心点（即某一次真实录入的向量）
+def compact_identity(encodings,
+                     max_templates: int=3,
+                     duplicate_threshold: float=0.95,
+                     method: str='centroid'):
+    assert method in ('centroid', 'medoid'), f'Error: 不支持的模板生成方式 {method}'
+
+    encodings = np.asarray(encodings, dtype=np.float32)
+    encodings = encodings / np.maximum(np.linalg.norm(encodings, axis=1, keepdims=True), np.finfo(np.float32).tiny)
+
+    kept, weights = prune_duplicates(encodings, duplicate_threshold)
+    encodings = encodings[kept]
+
+    # 去重后已经不多于 max_templates 个，直接作为模板
+    if len(encodings) <= max_templates:
+        return [(encoding, weight) for encoding, weight in zip(encodings, weights)]
+
+    labels, medoids = k_medoids(encodings, weights, max_templates)
+
+    templates = []
+    for cluster, medoid in enumerate(medoids):
+        members = labels == cluster
+        if method == 'medoid':
+            template = encodings[medoid]
+        else:
+            template = weights[members] @ encodings[members]
+            template = template / max(np.linalg.norm(template), np.finfo(np.float32).tiny)
+        templates.append((template, weights[members].sum()))
+
+    return templates
+
+
+# 压缩整个人脸库：按姓名分组生成模板并写入 face_templates 表，返回 (原始人脸数, 人数, 模板数)
+def compact_gallery(database_path: str,
+                    max_templates: int=3,
+                    duplicate_threshold: float=0.95,
+                    method: str='centroid'):
+    # 先记下当前faces表的最大 rowid，之后新录入的人脸不在这次压缩的范围内
+    _, max_rowid = get_faces_state(database_path)
+    rowids, names, encodings = load_faces_since(0, database_path)
+
+    groups = defaultdict(list)
+    for rowid, name, encoding in zip(rowids, names, encodings):
+        if rowid <= max_rowid:
+            groups[name].append(encoding)
+
+    templates = []
+    for name, identity_encodings in groups.items():
+        for template, source_count in compact_identity(identity_encodings, max_templates, duplicate_threshold, method):
+            templates.append((name, template, source_count))
+
+    save_face_templates(templates, max_rowid, database_path)
+
+    num_faces = sum(len(identity_encodings) for identity_encodings in groups.values())
+    print(f"人脸库压缩完成：{num_faces} 个人脸，{len(groups)} 个人，压缩为 {len(templates)} 个模板")
+
+    return num_faces, len(groups), len(templates)
+
+
+# 在项目根目录下运行：python -m SQL.gallery_compact
+if __name__ == '__main__':
+    # 数据库文件路径和每个人最多保留的模板数
+    database_path = 'databases/known_faces.db'
+    max_templates = 3
+
+    compact_gallery(database_path, max_templates)
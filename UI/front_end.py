@@ -4,30 +4,41 @@
 import gradio as gr
 import cv2
 import os
-from insightface.app import FaceAnalysis
-from face_process.face_recognize import process_frame
-from face_process.faces_enroll import enroll_from_image
-from SQL.database_operate import load_known_faces
+from face_process.face_recognize import process_frame, recognize_faces, recognize_analyzed_faces, draw_faces
+from face_process.face_tracker import Face_Tracker
+from face_process.detect_policy import Detection_Policy
+from face_process.faces_enroll import enroll_face
+from face_process.video_parallel import Video_Worker_Pool
+from face_process.video_pipeline import Video_Pipeline
+from face_process.stream_session import Stream_Session
+from face_process.model_pool import Model_Pool
+from face_process.micro_batch import Micro_Batcher
+from face_process.analysis_cache import Face_Analysis_Cache
+from SQL.face_gallery import Face_Gallery
 
 '''
     前端Web界面：
     基于Gradio实现一个前端Web界面，
-    在此界面，用户可以拍摄/上传视频进行人脸识别、拍摄/上传照片进行人脸录入
+    在此界面，用户可以通过摄像头实时识别、拍摄/上传视频进行人脸识别、拍摄/上传照片进行人脸录入；
+    多个用户同时使用时，每次推理从模型副本池（model_pool.Model_Pool）中取一份空闲的模型，
+    Gradio 的请求队列按事件类型分组限制并发数（视频、照片识别、人脸录入、实时识别各自排队），处理长视频时不会挡住照片识别；
+    开启微批处理（micro_batch.Micro_Batcher）时，同一时间的多张照片一起批量识别；
+    开启检测结果缓存（analysis_cache.Face_Analysis_Cache）时，重复提交的同一张照片（识别或录入）不再重新检测和提取特征向量
 '''
  
 
 # 人脸识别界面：调用摄像头实现人脸识别，当gradio通过摄像头拍到的视频流发生变化时，会回调这个函数
 def recognize_faces_from_video(input_path, 
-                               app,
-                               database_path: str,
-                               threshold=0.5):
+                               model_pool: Model_Pool,
+                               gallery: Face_Gallery,
+                               threshold=0.5,
+                               use_tracker: bool=True,
+                               video_pool: Video_Worker_Pool=None,
+                               min_face_size: int=0):
     try:
         # 如果输入地址为None的话，即输入Video的操作是关闭视频，直接输出None，让输出Video的视频也关闭
         if input_path is None:
             return None, None, None
-
-        # 从指定的数据库文件中加载已知人脸的特征向量和姓名
-        known_face_encodings, known_face_names = load_known_faces(database_path)
         
         # 通过输入视频文件的路径，获取输出视频文件的路径
         directory = os.path.dirname(input_path)  # 获取文件所在的目录
@@ -48,30 +59,49 @@ def recognize_faces_from_video(input_path,
         
         fourcc = cv2.VideoWriter_fourcc(*'VP80')  # webm视频文件编码格式
         out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))  # 创建输出视频
-        
-        while cap.isOpened():
-            ret, frame = cap.read()  # 读取一帧
-            
-            # 读完视频则退出
-            if not ret:
-                break
-            
-            try:
-                # 处理当前帧
-                processed_frame, _ , _= process_frame(app, 
-                                                frame, 
-                                                known_face_encodings, 
-                                                known_face_names, 
-                                                threshold)
-            except Exception as e:
-                    raise RuntimeError(f"处理视频帧时发生错误：{str(e)}")
-            
-            # 将处理后的帧写入输出视频
-            out.write(processed_frame)
-            
-        # 释放资源
-        cap.release()
-        out.release()
+
+        # 解码、识别、画框、编码分别在各自的线程中流水线运行，阶段之间用有界队列连接
+        pipeline = Video_Pipeline()
+
+        # 每个视频单独跟踪人脸，已跟踪的人脸不用每帧都提取特征向量（识别阶段只有一个线程，帧的顺序不变）
+        # min_face_size 大于 0 时按视频帧尺寸和最小人脸尺寸选择检测的输入尺寸，并只在人脸周围的区域内检测
+        detection_policy = Detection_Policy(min_face_size) if min_face_size > 0 else None
+        tracker = Face_Tracker(detection_policy=detection_policy) if use_tracker else None
+
+        # 指定了工作进程池时，多进程分段检测人脸并提取特征向量，识别阶段按顺序用同一个跟踪器（或逐帧）匹配，结果和串行处理一致
+        # （只在人脸周围检测依赖上一帧的跟踪结果，无法分段进行，所以设置了 min_face_size 时仍然串行处理）
+        if video_pool is not None and detection_policy is None:
+            def recognize_frame(item):
+                frame, faces = item
+                return frame, recognize_analyzed_faces(faces, gallery, threshold, tracker)[0]
+
+            source_name = "解码 + 多进程检测"
+            source = video_pool.analyze_frames(read_frames(cap))
+        else:
+            # 每一帧单独从模型副本池中取模型，多个视频和照片识别请求可以交替使用同一份模型
+            def recognize_frame(frame):
+                with model_pool.acquire() as app:
+                    return frame, recognize_faces(app, frame, gallery, threshold, tracker)[0]
+
+            source_name = "解码"
+            source = read_frames(cap)
+
+        pipeline.add_stage("识别", recognize_frame)
+
+        pipeline.add_stage("画框", lambda item: draw_faces(*item))
+        # 将处理后的帧写入输出视频
+        pipeline.add_stage("编码", out.write)
+
+        try:
+            pipeline.run(source_name, source)
+        except Exception as e:
+            raise RuntimeError(f"处理视频帧时发生错误：{str(e)}")
+        finally:
+            # 释放资源
+            cap.release()
+            out.release()
+
+        print(f"\n{pipeline.report()}\n")
 
         return output_path, input_path, output_path
 
@@ -80,36 +110,82 @@ def recognize_faces_from_video(input_path,
         return None, None, f"视频处理失败：{str(e)}"
 
 
+# 实时人脸识别：摄像头每隔 stream_every 秒发送一帧，识别后立即返回画好框的帧
+# session 为当前浏览器会话的 Stream_Session（第一次收到帧时创建），服务器处理不过来时跳过这一帧
+def recognize_faces_from_stream(image, 
+                                session: Stream_Session,
+                                model_pool: Model_Pool,
+                                gallery: Face_Gallery,
+                                threshold=0.5,
+                                min_face_size: int=0,
+                                stream_every: float=0.1):
+    # 摄像头关闭时清空跟踪目标和统计信息
+    if image is None:
+        if session is not None:
+            session.reset()
+        return None, session, None
+
+    try:
+        if session is None:
+            session = Stream_Session(min_face_size=min_face_size, stream_every=stream_every)
+
+        # 将图像从 RGB 转换为 BGR，识别并画框后再转回 RGB
+        frame = session.process(model_pool, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), gallery, threshold)
+        if frame is None:
+            return gr.skip(), session, gr.skip()
+
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), session, session.report()
+
+    except Exception as e:
+        return None, session, f"实时识别失败：{str(e)}"
+
+
+# 依次读取视频文件中的每一帧
+def read_frames(cap):
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
+
 # 人脸识别单个图片
 def recognize_faces_from_image(image, 
-                               app, 
-                               database_path: str, 
-                               threshold=0.5):
+                               model_pool: Model_Pool, 
+                               gallery: Face_Gallery, 
+                               threshold=0.5,
+                               micro_batcher: Micro_Batcher=None,
+                               analysis_cache: Face_Analysis_Cache=None):
     # 如果没有上传图片，直接返回
     if image is None:
         return None, None
 
     try:
-        # 从指定的数据库文件中加载已知人脸的特征向量和姓名
-        known_face_encodings, known_face_names = load_known_faces(database_path)
-
         # OpenCV 使用 BGR 顺序，而大多数图像处理库使用 RGB 顺序
         # 将图像从 RGB 转换为 BGR
         image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
 
-        # 调用 process_frame 处理图像
-        processed_frame, have_faces, similarity = process_frame(app, 
-                                                    image_bgr, 
-                                                    known_face_encodings, 
-                                                    known_face_names, 
-                                                    threshold)
+        # 开启了微批处理时，和同一时间的其他照片一起批量识别，否则从模型副本池中取一份模型，调用 process_frame 处理图像
+        # （检测结果缓存只用于后者：微批处理的照片本来就和其他照片一起推理）
+        if micro_batcher is not None:
+            face_names, similarities = micro_batcher.recognize(image_bgr, threshold)
+            have_faces = len(face_names) > 0
+            processed_frame = draw_faces(image_bgr, face_names)
+        else:
+            with model_pool.acquire() as app:
+                processed_frame, have_faces, similarities = process_frame(app, 
+                                                            image_bgr, 
+                                                            gallery, 
+                                                            threshold,
+                                                            cache=analysis_cache)
 
         # 将处理后的图像从 BGR 转换回 RGB
         processed_image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
         
         result_text = "未检测到人脸！"
         if have_faces:
-            result_text = f"人脸识别成功！COS相似度为：{similarity:.6f}"
+            similarity_text = "，".join(f"{similarity:.6f}" for similarity in similarities)
+            result_text = f"人脸识别成功！COS相似度为：{similarity_text}"
 
         return processed_image, result_text
 
@@ -118,28 +194,32 @@ def recognize_faces_from_image(image,
 
 
 # 通过拍摄或上传照片录入人脸
-def enroll_faces_from_image(app: FaceAnalysis, 
+def enroll_faces_from_image(model_pool: Model_Pool, 
                             name: str, 
                             image, 
-                            database_path: str):
+                            gallery: Face_Gallery,
+                            analysis_cache: Face_Analysis_Cache=None):
     if name == "":
         return None, "录入失败：姓名不能为空"
     
     try:
-        image_path = 'temp_image.jpg'
-        
         # OpenCV 使用 BGR 顺序，而大多数图像处理库使用 RGB 顺序
-        # 将图像从 RGB 转换为 BGR
+        # 将图像从 RGB 转换为 BGR（直接录入解码后的图像，不再写入临时文件后重新读取）
         image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(image_path, image_bgr)
         
-        frame, have_face = enroll_from_image(app, name, image_path, database_path)
+        with model_pool.acquire() as app:
+            status, face = enroll_face(app, name, image_bgr, gallery, analysis_cache)
         
-        os.remove(image_path)
+        if face is not None:
+            # 输出检测到的人脸目标框到原始图像
+            x1, y1, x2, y2 = [int(v) for v in face.bbox]
+            cv2.rectangle(image_bgr, (x1, y1), (x2, y2), (0, 0, 255), 2)
         
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
         
-        if not have_face:
+        if status == 'multiple_faces':
+            return frame, "录入失败：检测到多个人脸，请使用只有一个人脸的照片"
+        if face is None:
             return frame, "录入失败：未检测到人脸"
         
         # 将图像从 BGR 转换为 RGB再返回
@@ -150,9 +230,19 @@ def enroll_faces_from_image(app: FaceAnalysis,
 
 
 # 主界面：人脸识别界面
-def web_interface(app: FaceAnalysis,
-                  database_path: str, 
-                  threshold: float=0.5):
+def web_interface(model_pool: Model_Pool,
+                  gallery: Face_Gallery, 
+                  threshold: float=0.5,
+                  video_pool: Video_Worker_Pool=None,
+                  min_face_size: int=0,
+                  stream_every: float=0.1,
+                  video_concurrency: int=1,
+                  queue_size: int=64,
+                  micro_batcher: Micro_Batcher=None,
+                  analysis_cache: Face_Analysis_Cache=None):
+
+    # 照片识别的并发数：开启微批处理时要有足够多的请求同时等待，才能凑成批次
+    image_concurrency = model_pool.num_replicas * (micro_batcher.max_batch_size if micro_batcher is not None else 1)
     
     with gr.Blocks() as demo:
         gr.Markdown("# FaceMind 人脸识别系统")
@@ -160,6 +250,37 @@ def web_interface(app: FaceAnalysis,
         # 实时人脸识别标签页
         with gr.Tab("人脸识别"):
             gr.Markdown("## 选择人脸识别方式")
+
+            with gr.Tab("实时识别"):
+                gr.Markdown("## 打开摄像头实时进行人脸识别")
+
+                with gr.Row():
+                    with gr.Column():
+                        # 负责采集的摄像头，每隔 stream_every 秒把当前帧发送给服务器
+                        webcam_stream = gr.Image(label='摄像头画面', sources="webcam", streaming=True)
+
+                    with gr.Column():
+                        # 逐帧显示处理后的画面
+                        processed_stream = gr.Image(label='实时识别结果', streaming=True)
+                        stream_stats_text = gr.Textbox(label="帧率和延迟")
+
+                # 每个浏览器会话各自的跟踪器和统计信息
+                stream_session = gr.State(None)
+
+                # 摄像头每发送一帧就调用一次 recognize_faces_from_stream，服务器处理不过来时只处理最新的一帧
+                webcam_stream.stream(fn=lambda image, session: recognize_faces_from_stream(image,
+                                                                                          session,
+                                                                                          model_pool,
+                                                                                          gallery,
+                                                                                          threshold,
+                                                                                          min_face_size,
+                                                                                          stream_every),
+                                     inputs=[webcam_stream, stream_session],
+                                     outputs=[processed_stream, stream_session, stream_stats_text],
+                                     stream_every=stream_every,
+                                     time_limit=None,
+                                     concurrency_limit=model_pool.num_replicas,
+                                     concurrency_id="stream")
             
             with gr.Tab("拍摄视频"):
                 gr.Markdown("## 拍摄视频进行人脸识别")
@@ -177,11 +298,14 @@ def web_interface(app: FaceAnalysis,
                 
                 # 当拍摄完视频时调用recognize_faces_from_video函数，将处理后的视频输出到processed_video
                 video_feed.change(fn=lambda video_path: recognize_faces_from_video(video_path, 
-                                                                            app, 
-                                                                            database_path,
-                                                                            threshold), 
+                                                                            model_pool, 
+                                                                            gallery,
+                                                                            threshold,
+                                                                            min_face_size=min_face_size), 
                                 inputs=video_feed, 
-                                outputs=[processed_video, input_path_text, output_path_text])
+                                outputs=[processed_video, input_path_text, output_path_text],
+                                concurrency_limit=video_concurrency,
+                                concurrency_id="video")
 
                 # 刷新当前界面的按钮，以实现再次识别
                 def refresh_recognize_vedio():
@@ -191,7 +315,8 @@ def web_interface(app: FaceAnalysis,
                                             outputs=[video_feed, 
                                                      processed_video, 
                                                      input_path_text, 
-                                                     output_path_text])
+                                                     output_path_text],
+                                            queue=False)
 
             with gr.Tab("上传视频"):
                 gr.Markdown("## 上传视频进行人脸识别")
@@ -209,18 +334,23 @@ def web_interface(app: FaceAnalysis,
                 
                 # 开始识别按钮：点击识别按钮时，调用 recognize_faces_from_video 函数
                 gr.Button("开始人脸识别").click(fn=lambda video_path: recognize_faces_from_video(video_path, 
-                                                                        app, 
-                                                                        database_path,
-                                                                        threshold), 
+                                                                        model_pool, 
+                                                                        gallery,
+                                                                        threshold,
+                                                                        video_pool=video_pool,
+                                                                        min_face_size=min_face_size), 
                             inputs=video_feed, 
-                            outputs=[processed_video, input_path_text, output_path_text])
+                            outputs=[processed_video, input_path_text, output_path_text],
+                            concurrency_limit=video_concurrency,
+                            concurrency_id="video")
 
                 # 刷新当前界面的按钮，以实现再次识别
                 gr.Button("再次识别").click(refresh_recognize_vedio,
                                             outputs=[video_feed, 
                                                      processed_video, 
                                                      input_path_text, 
-                                                     output_path_text])
+                                                     output_path_text],
+                                            queue=False)
 
 
             with gr.Tab("拍摄照片"):
@@ -239,11 +369,15 @@ def web_interface(app: FaceAnalysis,
 
                 # 当拍摄完照片时调用recognize_faces_from_image函数，将处理后的视频输出到processed_image
                 input_image.change(fn=lambda image: recognize_faces_from_image(image,
-                                                                                app,
-                                                                                database_path,
-                                                                                threshold),
+                                                                                model_pool,
+                                                                                gallery,
+                                                                                threshold,
+                                                                                micro_batcher,
+                                                                                analysis_cache),
                                     inputs=input_image,
-                                    outputs=[processed_image, result_text])
+                                    outputs=[processed_image, result_text],
+                                    concurrency_limit=image_concurrency,
+                                    concurrency_id="image")
 
                 # 刷新当前界面的按钮，以实现再次识别
                 def refresh_recognize_image():
@@ -252,7 +386,8 @@ def web_interface(app: FaceAnalysis,
                 gr.Button("再次识别").click(refresh_recognize_image,
                                             outputs=[input_image, 
                                                         processed_image, 
-                                                        result_text])
+                                                        result_text],
+                                            queue=False)
 
             with gr.Tab("上传照片"):
                 gr.Markdown("## 上传照片进行人脸识别")
@@ -270,17 +405,22 @@ def web_interface(app: FaceAnalysis,
 
                 # 开始识别按钮：点击识别按钮时，调用 recognize_faces_from_image 函数
                 gr.Button("开始人脸识别").click(fn=lambda image: recognize_faces_from_image(image,
-                                                                        app,
-                                                                        database_path,
-                                                                        threshold),
+                                                                        model_pool,
+                                                                        gallery,
+                                                                        threshold,
+                                                                        micro_batcher,
+                                                                        analysis_cache),
                             inputs=input_image,
-                            outputs=[processed_image, result_text])
+                            outputs=[processed_image, result_text],
+                            concurrency_limit=image_concurrency,
+                            concurrency_id="image")
 
                 # 刷新当前界面的按钮，以实现再次识别
                 gr.Button("再次识别").click(refresh_recognize_image,
                                             outputs=[input_image, 
                                                         processed_image,
-                                                        result_text])
+                                                        result_text],
+                                            queue=False)
 
             
         # 人脸录入标签页
@@ -302,19 +442,23 @@ def web_interface(app: FaceAnalysis,
                         output_text = gr.Textbox(label="处理结果")
 
                 # 开始录入按钮：点击按钮时，调用 enroll_faces_from_camera 函数
-                gr.Button("开始录入").click(lambda image, name: enroll_faces_from_image(app,
+                gr.Button("开始录入").click(lambda image, name: enroll_faces_from_image(model_pool,
                                                                                        name.strip(),
                                                                                        image,
-                                                                                       database_path),
+                                                                                       gallery,
+                                                                                       analysis_cache),
                                                 inputs=[image_input, name_input],
-                                                outputs=[output_image, output_text])
+                                                outputs=[output_image, output_text],
+                                                concurrency_limit=model_pool.num_replicas,
+                                                concurrency_id="enroll")
                 
                 # 刷新当前界面的按钮，以实现继续录入
                 def refresh_enroll():
                     return gr.update(value=None), gr.update(value=None), gr.update(value=None), gr.update(value=None)
 
                 gr.Button("继续录入").click(refresh_enroll, 
-                                        outputs=[image_input, name_input, output_image, output_text])
+                                        outputs=[image_input, name_input, output_image, output_text],
+                                        queue=False)
 
             with gr.Tab("上传照片"):
                 with gr.Row():
@@ -331,15 +475,40 @@ def web_interface(app: FaceAnalysis,
                         output_text = gr.Textbox(label="处理结果")
 
                 # 上传并录入按钮：点击按钮时，调用 enroll_faces_from_image 函数
-                gr.Button("上传并录入").click(lambda image, name: enroll_faces_from_image(app,
+                gr.Button("上传并录入").click(lambda image, name: enroll_faces_from_image(model_pool,
                                                                                          name.strip(),
                                                                                          image,
-                                                                                         database_path),
+                                                                                         gallery,
+                                                                                         analysis_cache),
                                                 inputs=[image_input, name_input], 
-                                                outputs=[output_image, output_text])
+                                                outputs=[output_image, output_text],
+                                                concurrency_limit=model_pool.num_replicas,
+                                                concurrency_id="enroll")
 
                 # 刷新当前界面的按钮
                 gr.Button("继续录入").click(refresh_enroll, 
-                                        outputs=[image_input, name_input, output_image, output_text])
+                                        outputs=[image_input, name_input, output_image, output_text],
+                                        queue=False)
+
+        # 服务状态标签页：查看模型副本的使用情况、排队的请求数和等待时间
+        with gr.Tab("服务状态"):
+            gr.Markdown("## 模型副本池、微批处理和检测结果缓存的使用情况")
+
+            status_text = gr.Textbox(label="服务状态", lines=7)
+
+            def service_status():
+                reports = [model_pool.report()]
+                if micro_batcher is not None:
+                    reports.append(micro_batcher.report())
+                if analysis_cache is not None:
+                    reports.append(analysis_cache.report())
+                return "\n".join(reports)
+
+            # 不经过请求队列，服务繁忙时也能立即查看
+            gr.Button("刷新").click(service_status, outputs=status_text, queue=False)
+
+    # 请求队列：最多排队 queue_size 个请求（超过时新的请求直接提示繁忙），
+    # 视频、照片识别、人脸录入、实时识别四类事件分别限制并发数、各自排队，其他事件最多同时处理 num_replicas 个
+    demo.queue(max_size=queue_size, default_concurrency_limit=model_pool.num_replicas)
 
     return demo
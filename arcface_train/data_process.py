@@ -8,6 +8,7 @@ from tqdm import tqdm
 from insightface.app import FaceAnalysis
 from insightface.data import get_image as ins_get_image
 from insightface.utils import face_align
+from face_process.batch_detect import detect_batch
 
 '''
     这里的数据处理没有进行norm，要在训练加载数据时实现
@@ -146,104 +147,123 @@ def save_image(output_dir, file_name, image):
     #         break
 
 
-def face_data_process(input_dataset_path: str,
-                      output_dataset_path: str):
-    os.makedirs(output_dataset_path, exist_ok=True)
+# 保存对齐后的人脸图像以及它的各种数据增强结果
+def save_augmented_faces(aligned_face, output_dir: str, base_name: str):
+    # 保存原始处理后的图像
+    save_image(output_dir, base_name, aligned_face)
 
-    # 设置模型的存放位置
-    current_file_path = os.path.abspath(__file__)  # 获取当前文件的绝对路径
-    parent_directory = os.path.dirname(os.path.dirname(current_file_path))  # 获取向上两级目录（到达项目根目录 FaceMind）
-    root = os.path.join(parent_directory, '.insightface')  # 构建.insightface 文件夹的路径
+    '''
+        数据增强
+    '''
 
-    # 初始化insightface的FaceAnalysis对象，用于人脸检测和对齐
-    app = FaceAnalysis(root=root)
-    app.prepare(ctx_id=0, det_size=(640, 640))
+    # # 水平翻转
+    # hflipped_face = hflip_image(aligned_face)
+    # save_image(output_dir, f"{base_name}_hflip", hflipped_face)
 
-    # 遍历输入数据集中的所有图像文件
-    for root, dirs, files in tqdm(os.walk(input_dataset_path)):
-        for file in files:
-            if file.endswith(('.bmp', '.jpg', '.jpeg', '.png')):
-                image_path = os.path.join(root, file)
-                base_name = os.path.splitext(file)[0]  # 获取文件名（不含后缀）
+    # 垂直翻转
+    vflipped_face = vflip_image(aligned_face)
+    save_image(output_dir, f"{base_name}_vflip", vflipped_face)
+
+    # 顺时针旋转45度
+    rotated_clockwise_45_face = rotate(aligned_face, -45)
+    save_image(output_dir, f"{base_name}_left_rotate45", rotated_clockwise_45_face)
+
+    # 逆时针旋转45度
+    rotated_counterclockwise_45_face = rotate(aligned_face, 45)
+    save_image(output_dir, f"{base_name}_right_rotate_45", rotated_counterclockwise_45_face)
 
-                if file.endswith(('.bmp')):  # 修改为判断bmp格式
-                    img = cv2.imread(image_path)  # 使用cv2.imread读取bmp图像
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # 转换为RGB格式，insightface要求RGB输入
-                else:
-                    img = ins_get_image(image_path)
+    # 调大亮度
+    brighter_face = increase_brightness(aligned_face)
+    save_image(output_dir, f"{base_name}_brighter", brighter_face)
 
-                faces = app.get(img)
+    # 调小亮度
+    darker_face = decrease_brightness(aligned_face)
+    save_image(output_dir, f"{base_name}_darker", darker_face)
 
-                if len(faces) > 0:
-                    for face in faces:
-                        # 人脸对齐
-                        # 获取对齐后的人脸图像，并自动裁剪
-                        aligned_face = face_align.norm_crop(img, landmark=face.kps, image_size=112)
+    # 中值模糊
+    blurred_face = median_blur_image(aligned_face)
+    save_image(output_dir, f"{base_name}_blurred", blurred_face)
 
-                        # 获取输出文件夹路径
-                        output_dir = os.path.join(output_dataset_path, os.path.relpath(root, input_dataset_path))
-                        os.makedirs(output_dir, exist_ok=True)
+    # 黑色矩形遮挡双眼，模拟墨镜
+    block_eyes_face = block_eyes(aligned_face)
+    save_image(output_dir, f"{base_name}_block_eyes", block_eyes_face)
 
-                        # 保存原始处理后的图像
-                        save_image(output_dir, base_name, aligned_face)
+    # 白色圆形遮挡嘴巴和鼻子，模拟口罩
+    block_mouth_face = block_nose_mouth(aligned_face)
+    save_image(output_dir, f"{base_name}_block_mouth", block_mouth_face)
 
-                        '''
-                            数据增强
-                        '''
+    # 分别获取 RGB 三个通道单一颜色的图像
+    red_image = get_single_color(aligned_face, 0)
+    save_image(output_dir, f"{base_name}_red", red_image)
 
-                        # # 水平翻转
-                        # hflipped_face = hflip_image(aligned_face)
-                        # save_image(output_dir, f"{base_name}_hflip", hflipped_face)
+    green_image = get_single_color(aligned_face, 1)
+    save_image(output_dir, f"{base_name}_green", green_image)
 
-                        # 垂直翻转
-                        vflipped_face = vflip_image(aligned_face)
-                        save_image(output_dir, f"{base_name}_vflip", vflipped_face)
+    blue_image = get_single_color(aligned_face, 2)
+    save_image(output_dir, f"{base_name}_blue", blue_image)
 
-                        # 顺时针旋转45度
-                        rotated_clockwise_45_face = rotate(aligned_face, -45)
-                        save_image(output_dir, f"{base_name}_left_rotate45", rotated_clockwise_45_face)
+    # 获取灰度图
+    gray_output_path = os.path.join(output_dir, f"{base_name}_gray.jpg")
+    gray_output_image = cv2.cvtColor(aligned_face.astype(np.uint8),
+                                cv2.COLOR_RGB2GRAY)
+    cv2.imwrite(gray_output_path, gray_output_image)
 
-                        # 逆时针旋转45度
-                        rotated_counterclockwise_45_face = rotate(aligned_face, 45)
-                        save_image(output_dir, f"{base_name}_right_rotate_45", rotated_counterclockwise_45_face)
 
-                        # 调大亮度
-                        brighter_face = increase_brightness(aligned_face)
-                        save_image(output_dir, f"{base_name}_brighter", brighter_face)
+# 读取数据集中的图像
+def read_image(image_path: str):
+    if image_path.endswith(('.bmp')):  # 修改为判断bmp格式
+        img = cv2.imread(image_path)  # 使用cv2.imread读取bmp图像
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # 转换为RGB格式，insightface要求RGB输入
+    else:
+        img = ins_get_image(image_path)
+    return img
 
-                        # 调小亮度
-                        darker_face = decrease_brightness(aligned_face)
-                        save_image(output_dir, f"{base_name}_darker", darker_face)
 
-                        # 中值模糊
-                        blurred_face = median_blur_image(aligned_face)
-                        save_image(output_dir, f"{base_name}_blurred", blurred_face)
+# batch_size 为每次批量检测的图像数（检测模型不支持批量推理时自动逐张检测）
+def face_data_process(input_dataset_path: str,
+                      output_dataset_path: str,
+                      batch_size: int=8):
+    os.makedirs(output_dataset_path, exist_ok=True)
 
-                        # 黑色矩形遮挡双眼，模拟墨镜
-                        block_eyes_face = block_eyes(aligned_face)
-                        save_image(output_dir, f"{base_name}_block_eyes", block_eyes_face)
+    # 设置模型的存放位置
+    current_file_path = os.path.abspath(__file__)  # 获取当前文件的绝对路径
+    parent_directory = os.path.dirname(os.path.dirname(current_file_path))  # 获取向上两级目录（到达项目根目录 FaceMind）
+    root = os.path.join(parent_directory, '.insightface')  # 构建.insightface 文件夹的路径
+
+    # 初始化insightface的FaceAnalysis对象，用于人脸检测和对齐（只需要检测模型提供的关键点）
+    app = FaceAnalysis(root=root, allowed_modules=['detection'])
+    app.prepare(ctx_id=0, det_size=(640, 640))
+
+    # 找出输入数据集中的所有图像文件
+    image_files = []
+    for root, dirs, files in os.walk(input_dataset_path):
+        for file in files:
+            if file.endswith(('.bmp', '.jpg', '.jpeg', '.png')):
+                image_files.append((root, file))
 
-                        # 白色圆形遮挡嘴巴和鼻子，模拟口罩
-                        block_mouth_face = block_nose_mouth(aligned_face)
-                        save_image(output_dir, f"{base_name}_block_mouth", block_mouth_face)
+    # 每次读取一批图像，批量检测人脸
+    for start_idx in tqdm(range(0, len(image_files), batch_size)):
+        batch_files = image_files[start_idx:start_idx + batch_size]
+        images = [read_image(os.path.join(root, file)) for root, file in batch_files]
 
-                        # 分别获取 RGB 三个通道单一颜色的图像
-                        red_image = get_single_color(aligned_face, 0)
-                        save_image(output_dir, f"{base_name}_red", red_image)
+        for (root, file), img, (bboxes, kpss) in zip(batch_files, images, detect_batch(app, images, batch_size)):
+            base_name = os.path.splitext(file)[0]  # 获取文件名（不含后缀）
+            if kpss is None:
+                continue
 
-                        green_image = get_single_color(aligned_face, 1)
-                        save_image(output_dir, f"{base_name}_green", green_image)
+            for kps in kpss:
+                # 人脸对齐
+                # 获取对齐后的人脸图像，并自动裁剪
+                aligned_face = face_align.norm_crop(img, landmark=kps, image_size=112)
 
-                        blue_image = get_single_color(aligned_face, 2)
-                        save_image(output_dir, f"{base_name}_blue", blue_image)
+                # 获取输出文件夹路径
+                output_dir = os.path.join(output_dataset_path, os.path.relpath(root, input_dataset_path))
+                os.makedirs(output_dir, exist_ok=True)
 
-                        # 获取灰度图
-                        gray_output_path = os.path.join(output_dir, f"{base_name}_gray.jpg")
-                        gray_output_image = cv2.cvtColor(aligned_face.astype(np.uint8),
-                                                    cv2.COLOR_RGB2GRAY)
-                        cv2.imwrite(gray_output_path, gray_output_image)
+                save_augmented_faces(aligned_face, output_dir, base_name)
 
 
+# 在项目根目录下运行：python -m arcface_train.data_process
 if __name__ == '__main__':
     # 输入数据集路径和输出数据集路径
     input_dataset_path = "./origin_dataset/CASIA_FaceV5"  # 替换为你的输入数据集路径
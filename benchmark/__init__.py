@@ -0,0 +1,3 @@
+__version__ = "0.0.0"
+__author__ = "Justin Lee"
+__url__ = "https://github.com/Justin-ljw/FaceMind"
\ No newline at end of file
@@ -0,0 +1,56 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import time
+import numpy as np
+from SQL.embedding_quantize import quantize_embeddings
+from SQL.face_gallery import normalize_embeddings, search_known_faces, search_compact_faces
+
+'''
+    紧凑格式人脸库扫描的基准测试：
+    用随机生成的人脸库（已L2归一化）比较 float32 暴力搜索和 int8 / float16 紧凑格式粗筛的耗时，
+    并检查 float32 的最相似人脸是否都在紧凑格式粗筛出的候选人脸中（之后的精确重排序只需要在候选人脸里进行）；
+    参考结果（单核，20 万人脸、512 维、30 个查询向量）：float32 约 0.22 秒，int8 约 0.20 秒，float16 约 0.44 秒，
+    查询向量少时 int8 的优势更明显（4 个查询向量：float32 约 0.20 秒，int8 约 0.06 秒）；
+    NumPy 中 float16 转 float32 很慢，所以 float16 只节省内存，扫描比 float32 更慢
+'''
+
+
+# 取多次运行中最快的一次的耗时
+def best_time(function, *args, repeats: int=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# 比较不同存储格式下扫描整个人脸库的耗时，以及粗筛的召回率
+def benchmark_compact_search(num_faces: int=200000, dim: int=512, query_counts=(1, 4, 30), top_k: int=8, seed: int=0):
+    rng = np.random.default_rng(seed)
+    known_face_encodings = normalize_embeddings(rng.standard_normal((num_faces, dim), dtype=np.float32))
+    compact = {dtype: quantize_embeddings(known_face_encodings, dtype) for dtype in ('int8', 'float16')}
+
+    for num_queries in query_counts:
+        # 查询向量取人脸库中的人脸再加上噪声，模拟同一个人的另一张照片
+        noise = 0.5 * rng.standard_normal((num_queries, dim), dtype=np.float32)
+        query_embeddings = normalize_embeddings(known_face_encodings[rng.choice(num_faces, num_queries)] + noise)
+
+        elapsed, (best_indices, _) = best_time(search_known_faces, query_embeddings, known_face_encodings)
+        print(f"{num_queries:3d} 个查询向量  float32：{elapsed:.3f} 秒")
+
+        for dtype, (codes, scales) in compact.items():
+            elapsed, (candidate_indices, _) = best_time(search_compact_faces, query_embeddings, codes, scales, 256, top_k)
+            recall = np.mean([best_indices[i] in candidate_indices[i] for i in range(num_queries)])
+            print(f"{num_queries:3d} 个查询向量  {dtype:>7s}：{elapsed:.3f} 秒，候选人脸召回率 {recall:.1%}")
+
+
+# 在项目根目录下运行：python -m benchmark.compact_search
+if __name__ == '__main__':
+    # 人脸库大小、特征向量维度、每次搜索的查询向量数
+    num_faces = 200000
+    dim = 512
+    query_counts = (1, 4, 30)
+
+    benchmark_compact_search(num_faces, dim, query_counts)
@@ -0,0 +1,68 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-18
+
+import os
+import cv2
+import time
+import numpy as np
+from face_process.init_InsightFace import Init_model
+from face_process.batch_detect import detect_batch, supports_batch
+
+'''
+    多帧批量人脸检测的基准测试：
+    用同一批图像（视频的前若干帧，或图像文件夹中的图像）分别以不同的批大小做检测，
+    比较每秒能检测的图像数，并检查批量检测的结果和逐张检测是否一致
+'''
+
+
+# 读取测试图像：视频文件取前 num_images 帧，文件夹取其中的前 num_images 张图像
+def load_images(input_path: str, num_images: int=64):
+    images = []
+    if os.path.isdir(input_path):
+        for file in sorted(os.listdir(input_path)):
+            if file.lower().endswith(('.bmp', '.jpg', '.jpeg', '.png')):
+                images.append(cv2.imread(os.path.join(input_path, file)))
+            if len(images) >= num_images:
+                break
+    else:
+        cap = cv2.VideoCapture(input_path)
+        while len(images) < num_images:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            images.append(frame)
+        cap.release()
+
+    assert len(images) > 0, f'Error: 无法从 {input_path} 读取测试图像！'
+    return images
+
+
+# 以不同的批大小检测同一批图像，输出每秒检测的图像数
+def benchmark_detect_batch(app, images: list, batch_sizes=(1, 2, 4, 8, 16), repeats: int=3):
+    if not supports_batch(app.det_model):
+        print("Warning: 当前检测模型不支持批量推理，所有批大小都会退回逐张检测")
+
+    # 预热一次，并以逐张检测的结果作为基准
+    reference = detect_batch(app, images, 1)
+
+    for batch_size in batch_sizes:
+        best_time = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = detect_batch(app, images, batch_size)
+            best_time = min(best_time, time.perf_counter() - start)
+
+        same = all(np.allclose(bboxes, ref_bboxes, atol=1e-3) 
+                   for (bboxes, _), (ref_bboxes, _) in zip(results, reference))
+        print(f"批大小 {batch_size:3d}：{len(images) / best_time:8.1f} 张/秒，结果与逐张检测{'一致' if same else '不一致'}")
+
+
+# 在项目根目录下运行：python -m benchmark.detect_batch
+if __name__ == '__main__':
+    # 测试用的视频文件或图像文件夹、测试图像数、检测模型路径（None 为默认模型）
+    input_path = 'gradio_temp/test.mp4'
+    num_images = 64
+    retinaface_model_path = None
+
+    app = Init_model(retinaface_model_path, None)
+    benchmark_detect_batch(app, load_images(input_path, num_images))
@@ -0,0 +1,115 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-23
+
+import os
+import json
+import time
+import base64
+import threading
+import http.client
+import numpy as np
+
+'''
+    API 模式的本地压力测试：
+    多个线程同时向 POST /recognize 发送同一张图像，统计每秒处理的请求数和延迟分布（平均、P50、P95、P99），
+    默认每个线程在一个长连接上连续发送请求，keep_alive 为 False 时每个请求都重新建立连接，可以比较两者的差别
+'''
+
+
+# 一个压测线程：在 duration 秒内连续发送请求，记录每个请求的延迟和出错的次数
+def _load_worker(host: str, port: int, path: str, body: bytes, headers: dict,
+                 keep_alive: bool, deadline: float, latencies: list, errors: list):
+    conn = None
+    while time.perf_counter() < deadline:
+        if conn is None:
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+            conn = None
+            continue
+
+        if not keep_alive or response.will_close:
+            conn.close()
+            conn = None
+
+    if conn is not None:
+        conn.close()
+
+
+# 以 concurrency 个并发连接压测 duration 秒，返回统计结果
+def benchmark_http_load(image_path: str,
+                        host: str='127.0.0.1',
+                        port: int=8000,
+                        concurrency: int=4,
+                        duration: float=10.0,
+                        keep_alive: bool=True,
+                        batch_size: int=1):
+    with open(image_path, 'rb') as f:
+        data = f.read()
+
+    # batch_size 为 1 时直接发送编码后的图像，大于 1 时用 JSON 在一个请求中发送多张图像
+    if batch_size > 1:
+        body = json.dumps({'images': [base64.b64encode(data).decode('ascii')] * batch_size}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+    else:
+        body = data
+        headers = {'Content-Type': 'application/octet-stream'}
+    if not keep_alive:
+        headers['Connection'] = 'close'
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=_load_worker,
+                                args=(host, port, '/recognize', body, headers, keep_alive, deadline, latencies, errors))
+               for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    stats = {'requests': len(latencies),
+             'errors': len(errors),
+             'requests_per_sec': len(latencies) / elapsed,
+             'images_per_sec': len(latencies) * batch_size / elapsed,
+             'mean_ms': float(latencies_ms.mean()),
+             'p50_ms': float(np.percentile(latencies_ms, 50)),
+             'p95_ms': float(np.percentile(latencies_ms, 95)),
+             'p99_ms': float(np.percentile(latencies_ms, 99))}
+
+    print(f"并发 {concurrency}，{'长连接' if keep_alive else '短连接'}，每个请求 {batch_size} 张图像：")
+    print(f"  {stats['requests']} 个请求（出错 {stats['errors']} 个），"
+          f"{stats['requests_per_sec']:.1f} 请求/秒，{stats['images_per_sec']:.1f} 张/秒")
+    print(f"  延迟 平均 {stats['mean_ms']:.1f} ms / P50 {stats['p50_ms']:.1f} ms / "
+          f"P95 {stats['p95_ms']:.1f} ms / P99 {stats['p99_ms']:.1f} ms")
+    if errors:
+        print(f"  出错示例：{errors[0]}")
+
+    return stats
+
+
+# 先以 API 模式启动 FaceMind（client.py 中 mode = User_Mode.API），再在项目根目录下运行：python -m benchmark.http_load
+if __name__ == '__main__':
+    # 测试用的图像、API 服务的地址和端口
+    image_path = os.path.join('README_images', 'sample_origin.jpg')
+    host = '127.0.0.1'
+    port = 8000
+
+    # 依次测试不同的并发连接数，以及长连接和短连接的差别
+    for concurrency in (1, 4, 16):
+        benchmark_http_load(image_path, host, port, concurrency, duration=10.0)
+    benchmark_http_load(image_path, host, port, 4, duration=10.0, keep_alive=False)
@@ -2,39 +2,161 @@
 # @Time          : 2025-3-27
 
 import cv2
+import time
+import threading
 
 '''
-    通过OpenCV调用本地摄像头来实时获取视频帧
+    通过OpenCV调用本地摄像头来实时获取视频帧：
+    1.同步模式：读取一帧、返回一帧，处理速度跟不上摄像头时，视频帧会堆积在驱动的缓冲区中，显示的画面越来越滞后
+    2.最新帧模式：后台线程不停地读取摄像头，只保留最新的一帧，处理循环每次都拿到最新的画面，
+      处理不过来的帧直接丢弃，从拍摄到显示的延迟不会随时间累积，并定期输出采集帧率、处理帧率和丢帧数
 '''
 
 
-def get_video():
+# 后台线程持续采集摄像头画面，只保留最新的一帧
+class Latest_Frame_Capture:
+    def __init__(self, video_capture):
+        self.video_capture = video_capture
+
+        self._condition = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._frame_id = 0
+        self._read_frame_id = 0
+        self._running = False
+        self._thread = None
+
+        # 统计信息：采集的帧数、被处理的帧数、来不及处理被丢弃的帧数
+        self.captured = 0
+        self.consumed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    # 采集线程：不停读取摄像头，新的帧直接覆盖还没被取走的旧帧
+    def _capture_loop(self):
+        while self._running:
+            ret, frame = self.video_capture.read()
+            timestamp = time.perf_counter()
+
+            if not ret:
+                print("Error: 无法读取视频帧！")
+                break
+
+            # 左右翻转图像，因为摄像头捕捉图像的方向和输出图像的方向是相反的
+            frame = cv2.flip(frame, 1)
+
+            with self._condition:
+                if self._frame_id > self._read_frame_id:
+                    self.dropped += 1
+                self._frame = frame
+                self._timestamp = timestamp
+                self._frame_id += 1
+                self.captured += 1
+                self._condition.notify_all()
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    # 取出最新的一帧（等待直到有比上次取走的更新的帧），返回视频帧和采集时间，摄像头已停止时返回 (None, None)
+    def read(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame_id > self._read_frame_id or not self._running)
+            if self._frame_id <= self._read_frame_id:
+                return None, None
+
+            self._read_frame_id = self._frame_id
+            self.consumed += 1
+            return self._frame, self._timestamp
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+
+# 打开并配置摄像头，打开失败时返回 None
+def open_camera(device: int=0):
     # 打开摄像头
-    video_capture = cv2.VideoCapture(0)
+    video_capture = cv2.VideoCapture(device)
 
     if not video_capture.isOpened():
         print("Error: 无法打开摄像设备！")
-        return
+        return None
 
     # 设置视频帧的宽度和高度
     video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 640)
 
-    while True:
-        # 捕捉视频帧（捕捉到的图像是以Matlike类型返回的）
-        # Matlike类型约等于numpy数组，numpy数组可以直接用于OpenCV的处理
-        ret, frame = video_capture.read()
+    return video_capture
+
+
+# latest_only 为 True 时使用最新帧模式，每隔 report_interval 秒输出一次采集帧率、处理帧率、丢帧数和延迟
+def get_video(latest_only: bool=False, report_interval: float=5.0):
+    video_capture = open_camera()
+    if video_capture is None:
+        return
+
+    try:
+        if latest_only:
+            yield from _get_latest_video(video_capture, report_interval)
+        else:
+            while True:
+                # 捕捉视频帧（捕捉到的图像是以Matlike类型返回的）
+                # Matlike类型约等于numpy数组，numpy数组可以直接用于OpenCV的处理
+                ret, frame = video_capture.read()
+
+                if not ret:
+                    print("Error: 无法读取视频帧！")
+                    break
+
+                # 左右翻转图像，因为摄像头捕捉图像的方向和输出图像的方向是相反的
+                frame = cv2.flip(frame, 1)
+
+                # 不停将捕捉到的视频帧返回
+                yield frame
+    finally:
+        # 释放摄像头并关闭所有OpenCV窗口（调用方提前退出循环时也会执行）
+        video_capture.release()
+        cv2.destroyAllWindows()
+
+
+# 最新帧模式：后台线程采集，每次返回最新的一帧
+def _get_latest_video(video_capture, report_interval: float=5.0):
+    # 驱动的缓冲区只保留 1 帧（部分后端不支持该设置，不影响使用）
+    video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    capture = Latest_Frame_Capture(video_capture).start()
+
+    last_report_time = time.perf_counter()
+    last_captured, last_consumed = 0, 0
+    total_latency, latency_count = 0.0, 0
+
+    try:
+        while True:
+            frame, timestamp = capture.read()
+            if frame is None:
+                break
 
-        if not ret:
-            print("Error: 无法读取视频帧！")
-            break
+            yield frame
 
-        # 左右翻转图像，因为摄像头捕捉图像的方向和输出图像的方向是相反的
-        frame = cv2.flip(frame, 1)
-        
-        # 不停将捕捉到的视频帧返回
-        yield frame
+            # 从采集到这一帧处理完成（返回到这里）的延迟
+            total_latency += time.perf_counter() - timestamp
+            latency_count += 1
 
-    # 释放摄像头并关闭所有OpenCV窗口
-    video_capture.release()
-    cv2.destroyAllWindows()
+            now = time.perf_counter()
+            if now - last_report_time >= report_interval:
+                elapsed = now - last_report_time
+                print(f"采集 FPS: {(capture.captured - last_captured) / elapsed:.1f}，"
+                      f"处理 FPS: {(capture.consumed - last_consumed) / elapsed:.1f}，"
+                      f"累计丢弃帧数: {capture.dropped}，"
+                      f"平均延迟: {total_latency / max(latency_count, 1) * 1000:.1f} ms")
+                last_report_time = now
+                last_captured, last_consumed = capture.captured, capture.consumed
+                total_latency, latency_count = 0.0, 0
+    finally:
+        capture.stop()
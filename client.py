@@ -17,13 +17,57 @@ def facemind_client(mode: User_Mode=User_Mode.WEB,
                     arcface_model_path: str='.insightface/models/ArcFace_iResNet50_CASIA_FaceV5.onnx',
                     database_path: str='databases/known_faces.db', 
                     gradio_temp_dir: str='gradio_temp/',
-                    threshold: float=0.5):
+                    threshold: float=0.5,
+                    use_ann_index: bool=False,
+                    ann_nprobe: int=16,
+                    encoding_dtype: str='float32',
+                    use_sidecar: bool=False,
+                    match_mode: str='faces',
+                    video_workers: int=1,
+                    session_options: dict=None,
+                    max_batch_size: int=32,
+                    min_face_size: int=0,
+                    stream_every: float=0.1,
+                    model_replicas: int=1,
+                    video_concurrency: int=1,
+                    queue_size: int=64,
+                    api_host: str='127.0.0.1',
+                    api_port: int=8000,
+                    micro_batch_size: int=0,
+                    micro_batch_wait_ms: float=5.0,
+                    face_image_format: str='.jpg',
+                    analysis_cache_size: int=256,
+                    analysis_cache_ttl: float=300.0,
+                    motion_min_area: float=0.002,
+                    motion_pixel_threshold: int=25):
     main(mode, 
          retinaface_model_path, 
          arcface_model_path, 
          database_path, 
          gradio_temp_dir,
-         threshold)
+         threshold,
+         use_ann_index,
+         ann_nprobe,
+         encoding_dtype,
+         use_sidecar,
+         match_mode,
+         video_workers,
+         session_options,
+         max_batch_size,
+         min_face_size,
+         stream_every,
+         model_replicas,
+         video_concurrency,
+         queue_size,
+         api_host,
+         api_port,
+         micro_batch_size,
+         micro_batch_wait_ms,
+         face_image_format,
+         analysis_cache_size,
+         analysis_cache_ttl,
+         motion_min_area,
+         motion_pixel_threshold)
     
     
 if __name__ == "__main__":
@@ -32,6 +76,7 @@ if __name__ == "__main__":
         1.WEB (Web界面模式)：可进行视频人脸识别和照片人脸录入（注意：请勿使用VPN启动Web模式）
         2.LOCAL_ENROLL (本地录入模式)：可进行本地摄像头的人脸录入
         3.LOCAL_RECOGNIZE (本地识别模式)：可进行本地摄像头实时人脸识别
+        4.API (HTTP 服务模式)：不启动网页界面，通过 HTTP 接口识别和录入人脸，返回 JSON 结果（接口说明见 API/http_service.py）
         （LOCAL_ENROLL 和 LOCAL_RECOGNIZE 按 Esc 键退出）
     '''
     mode: User_Mode = User_Mode.WEB
@@ -70,10 +115,162 @@ if __name__ == "__main__":
         threshold数值越大，对匹配的相识度要求越高，即越容易认为不匹配
     '''
     threshold: float = 0.5
+
+    '''
+        近似最近邻（IVF）索引：
+        已知人脸库很大（数十万以上）时，暴力匹配所有人脸会变慢，开启后只在最相似的 ann_nprobe 个簇中搜索，
+        ann_nprobe 越大召回率越高、速度越慢（人脸数少于 1 万时不会使用索引）；
+        索引在后台线程中构建（构建完成前暴力匹配），之后录入的人脸直接加入索引，索引每分钟最多保存一次
+    '''
+    use_ann_index: bool = False
+    ann_nprobe: int = 16
+
+    '''
+        特征向量的存储格式：
+        float32（默认）、float16 或 int8，float16 / int8 可以让内存中的人脸库（和旁路文件）缩小 2~4 倍，
+        匹配时会对最相似的几个候选人脸用数据库中的 float32 原始特征向量精确重排序；
+        int8 的扫描比 float32 更快，float16 只节省内存、扫描更慢；数据库中的特征向量不会自动转换，
+        需要缩小数据库时手动运行 python -m SQL.encoding_convert
+    '''
+    encoding_dtype: str = 'float32'
+
+    '''
+        特征向量旁路文件：
+        开启后会在数据库文件旁边维护一份连续存储的特征向量矩阵，启动时直接内存映射，
+        人脸库很大时启动几乎不耗时，多个进程也能共享同一份内存
+    '''
+    use_sidecar: bool = False
+
+    '''
+        匹配模式：
+        'faces'（默认）匹配每一次录入的人脸；
+        'templates' 匹配压缩后的每人少量模板（需要先运行 python -m SQL.gallery_compact 压缩人脸库），
+        同一个人录入很多次时，匹配时间只和人数有关
+    '''
+    match_mode: str = 'faces'
+
+    '''
+        上传视频的处理进程数：
+        大于 1 时，Web 模式上传的视频会分段交给多个工作进程并行检测人脸、提取特征向量（每个进程各加载一份模型，注意内存占用），
+        主进程按顺序匹配和跟踪，输出的视频和单进程处理逐帧一致（设置了 min_face_size 时只能单进程处理）
+    '''
+    video_workers: int = 1
+
+    '''
+        ONNX Runtime 会话配置（None 表示全部使用默认值，只需写出要修改的项）：
+        intra_op_num_threads / inter_op_num_threads：算子内 / 算子间的线程数，0 表示自动
+        graph_optimization_level：图优化级别，disable / basic / extended / all
+        execution_mode：sequential / parallel
+        enable_mem_arena：是否使用 CPU 内存池；allow_spinning：空闲线程是否自旋等待
+        cache_optimized_model：是否把图优化后的模型缓存到 .insightface/optimized/，下次启动直接加载
+        （没有指定 intra_op_num_threads 时，CPU 核平均分给所有的模型副本和视频处理工作进程，并关闭 allow_spinning；
+          同一台机器上还运行其他进程时，建议手动限制线程数，避免线程数超过 CPU 核数）
+    '''
+    session_options: dict = None
+    # session_options: dict = {'intra_op_num_threads': 4, 'allow_spinning': False}
+
+    '''
+        ArcFace 批量推理的最大批大小：
+        一帧（多进程处理视频时为一段视频帧）中的所有人脸对齐后拼成批次一次性推理，每批最多 max_batch_size 个人脸，
+        批大小固定的模型按模型的批大小推理
+    '''
+    max_batch_size: int = 32
+
+    '''
+        视频中需要检测的最小人脸尺寸（像素）：
+        0（默认）表示检测时固定把视频帧缩放到 640×640；
+        大于 0 时按视频帧尺寸和最小人脸尺寸自动选择检测的输入尺寸（比最小人脸还小的人脸可能检测不到），
+        并且在两次全图检测之间只在人脸周围的区域内检测，高清视频的检测计算量会大幅降低（需要开启人脸跟踪，照片识别不受影响）
+    '''
+    min_face_size: int = 0
+
+    '''
+        Web 模式实时识别时摄像头发送视频帧的间隔（秒）：
+        服务器处理一帧的时间超过这个间隔时会自动丢帧（只处理最新的一帧），画面延迟不会累积，
+        界面上会显示实际的帧率和延迟
+    '''
+    stream_every: float = 0.1
+
+    '''
+        Web 模式多用户同时使用时的配置：
+        model_replicas：模型副本数，每份副本同一时间只处理一个请求，副本越多能同时处理的请求越多（每份都要占用一份模型的内存，
+                        没有指定线程数时 CPU 核会平均分给每份副本）
+        video_concurrency：同时处理的视频数，视频每一帧单独从副本池取模型，处理长视频时照片识别和实时识别仍然可以使用模型
+        queue_size：最多排队的请求数，超过时新的请求会直接提示服务繁忙
+        （Web 界面的“服务状态”标签页可以查看模型副本的使用情况、排队的请求数和等待时间，用来估计需要的副本数）
+    '''
+    model_replicas: int = 1
+    video_concurrency: int = 1
+    queue_size: int = 64
+
+    '''
+        API 模式 HTTP 服务的地址和端口：
+        默认只允许本机访问，需要其他机器访问时改为 '0.0.0.0'，
+        可以用 python -m benchmark.http_load 测试每秒能处理的请求数（model_replicas 同样适用于 API 模式）
+    '''
+    api_host: str = '127.0.0.1'
+    api_port: int = 8000
+
+    '''
+        识别请求的微批处理（Web 模式的照片识别和 API 模式的识别接口）：
+        micro_batch_size 大于 1 时，收到第一个请求后最多再等待 micro_batch_wait_ms 毫秒（或凑满 micro_batch_size 张图像），
+        把这段时间内到达的图像合并成一个批次识别，请求多时吞吐量更高，代价是每个请求最多多等待 micro_batch_wait_ms 毫秒；
+        0（默认）表示不使用，批大小和延迟的分布可以在“服务状态”标签页或 API 的 GET /stats 中查看
+    '''
+    micro_batch_size: int = 0
+    micro_batch_wait_ms: float = 5.0
+
+    '''
+        录入的人脸图像的压缩格式：
+        '.jpg'（默认）、'.png'（无损，体积较大）或 '.webp'，人脸图像压缩后单独存放，只在查看时才读取（如 API 的 GET /face_image）；
+        旧版本数据库中未压缩的人脸图像会在启动时自动压缩为该格式
+    '''
+    face_image_format: str = '.jpg'
+
+    '''
+        检测结果缓存（Web 模式的照片识别和照片录入）：
+        同一张照片被重复提交时（如自助终端重复拍摄、重试），直接使用缓存的目标框、关键点和特征向量，只重新和人脸库匹配；
+        最多缓存 analysis_cache_size 张照片的结果（0 表示不使用），超过 analysis_cache_ttl 秒的结果视为过期，
+        命中率可以在“服务状态”标签页中查看
+    '''
+    analysis_cache_size: int = 256
+    analysis_cache_ttl: float = 300.0
+
+    '''
+        运动门控（本地识别模式）：
+        推理之前先比较缩小后的画面和上一次推理时的画面，像素值变化超过 motion_pixel_threshold 的像素占比
+        不到 motion_min_area 时认为画面没有变化，直接沿用上一帧的识别结果，摄像头对着空画面时几乎不占用 CPU；
+        画面有变化且设置了 min_face_size 时，只在变化的区域和已有人脸的周围检测；
+        motion_min_area 越小越灵敏，0 表示不使用，跳过的帧数在退出时输出
+    '''
+    motion_min_area: float = 0.002
+    motion_pixel_threshold: int = 25
     
     facemind_client(mode, 
                     retinaface_model_path, 
                     arcface_model_path, 
                     database_path, 
                     gradio_temp_dir,
-                    threshold)
+                    threshold,
+                    use_ann_index,
+                    ann_nprobe,
+                    encoding_dtype,
+                    use_sidecar,
+                    match_mode,
+                    video_workers,
+                    session_options,
+                    max_batch_size,
+                    min_face_size,
+                    stream_every,
+                    model_replicas,
+                    video_concurrency,
+                    queue_size,
+                    api_host,
+                    api_port,
+                    micro_batch_size,
+                    micro_batch_wait_ms,
+                    face_image_format,
+                    analysis_cache_size,
+                    analysis_cache_ttl,
+                    motion_min_area,
+                    motion_pixel_threshold)
@@ -0,0 +1,129 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-28
+
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+
+'''
+    重复图像的检测和特征提取结果缓存：
+    同一张照片被反复提交时（自助终端重复拍摄、客户端重试等），不再重新检测人脸和提取特征向量；
+    缓存的键为解码后图像像素的哈希值（再加上图像的形状和模型的指纹，换了模型之后不会命中旧的结果），
+    缓存的值为每个人脸的目标框、关键点、检测置信度和特征向量，和人脸库的匹配每次都重新进行，录入新的人脸后立即生效；
+    按最近最少使用（LRU）淘汰，同时限制条目数和占用的内存，超过 ttl 秒的条目视为过期；统计命中、未命中、过期和淘汰的次数
+'''
+
+
+# 模型的指纹：检测模型、识别模型的文件名，以及检测的输入尺寸和置信度阈值，其中任何一个不同时检测和特征提取的结果都可能不同
+def model_fingerprint(app: FaceAnalysis) -> str:
+    parts = []
+    for taskname in ('detection', 'recognition'):
+        model = app.models.get(taskname)
+        if model is not None:
+            parts.append(os.path.basename(getattr(model, 'model_file', '') or ''))
+    det_model = app.models.get('detection')
+    if det_model is not None:
+        parts.append(str(getattr(det_model, 'input_size', None)))
+        parts.append(str(getattr(det_model, 'det_thresh', None)))
+
+    return '|'.join(parts)
+
+
+class Face_Analysis_Cache:
+    def __init__(self, max_entries: int=256, max_bytes: int=64 * 1024 * 1024, ttl: float=300.0):
+        assert max_entries >= 1, 'Error: 缓存的条目数至少为 1！'
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 条目的有效期（秒），为 None 时不过期
+        self.ttl = ttl
+
+        # 键 -> (写入时间, 目标框, 关键点, 检测置信度, 特征向量, 占用的字节数)，按最近使用的顺序排列
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    # 计算图像的缓存键：图像像素的 BLAKE2 哈希，加上图像的形状、数据类型和模型的指纹
+    def make_key(self, app: FaceAnalysis, frame) -> str:
+        frame = np.ascontiguousarray(frame)
+        digest = hashlib.blake2b(frame.data, digest_size=16).hexdigest()
+        return f'{digest}|{frame.shape}|{frame.dtype}|{model_fingerprint(app)}'
+
+    # 查找缓存的人脸（每次都返回新的 Face 对象，调用方可以随意修改），没有命中时返回 None
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        _, bboxes, kpss, det_scores, embeddings, _ = entry
+        return [Face(bbox=bboxes[i].copy(),
+                     kps=kpss[i].copy() if kpss is not None else None,
+                     det_score=det_scores[i],
+                     embedding=embeddings[i].copy())
+                for i in range(len(bboxes))]
+
+    # 写入检测和特征提取的结果（faces 中的每个人脸都要已经提取了特征向量）
+    def put(self, key: str, faces: list):
+        bboxes = np.array([face.bbox for face in faces], dtype=np.float32).reshape(len(faces), 4)
+        kpss = np.array([face.kps for face in faces], dtype=np.float32) if faces and faces[0].kps is not None else None
+        det_scores = np.array([face.det_score for face in faces], dtype=np.float32)
+        embeddings = np.array([face.embedding for face in faces], dtype=np.float32)
+        size = bboxes.nbytes + (kpss.nbytes if kpss is not None else 0) + det_scores.nbytes + embeddings.nbytes + len(key)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), bboxes, kpss, det_scores, embeddings, size)
+            self.size_bytes += size
+
+            # 超过条目数或内存上限时，淘汰最久没有使用的条目
+            while len(self._entries) > self.max_entries or (self.size_bytes > self.max_bytes and len(self._entries) > 1):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size_bytes -= entry[-1]
+
+    # 清空缓存（统计信息保留）
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    # 当前的统计信息
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries),
+                    'size_bytes': self.size_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+                    'expired': self.expired,
+                    'evictions': self.evictions}
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"检测结果缓存：{stats['entries']} 条（{stats['size_bytes'] / 1024:.1f} KB），"
+                f"命中 {stats['hits']} 次，未命中 {stats['misses']} 次（命中率 {stats['hit_rate']:.1%}），"
+                f"过期 {stats['expired']} 次，淘汰 {stats['evictions']} 次")
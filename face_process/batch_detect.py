@@ -0,0 +1,123 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-18
+
+import cv2
+import numpy as np
+from insightface.app import FaceAnalysis
+from insightface.model_zoo.retinaface import distance2bbox, distance2kps
+
+'''
+    多帧批量人脸检测（用于上传的视频、数据集处理等离线场景）：
+    每张图像先按检测模型的输入尺寸等比缩放并补零（letterbox），再拼成一个批次一次性送入 RetinaFace，
+    输出按图像拆开后，各自解码目标框、关键点并做 NMS，结果和逐张调用 det_model.detect 完全相同；
+    只有输出带批次维度、且输入的批大小不固定的检测模型才能批量推理（InsightFace 默认的 det_10g 批大小固定为 1，输出也不带批次维度），
+    其他模型自动退回逐张检测
+'''
+
+
+# 检测模型的输出是否带批次维度（输出为 批大小 × 锚点数 × 通道数）
+def has_batch_dim(det_model) -> bool:
+    return len(det_model.session.get_outputs()[0].shape) == 3
+
+
+# 判断检测模型能否批量推理：输出带批次维度，且输入的批大小不是固定值
+def supports_batch(det_model) -> bool:
+    batch_dim = det_model.session.get_inputs()[0].shape[0]
+    return has_batch_dim(det_model) and not (isinstance(batch_dim, int) and batch_dim > 0)
+
+
+# 等比缩放图像并补零到检测模型的输入尺寸，返回补零后的图像和缩放比例（和 det_model.detect 中的处理一致）
+def letterbox(image, input_size):
+    im_ratio = float(image.shape[0]) / image.shape[1]
+    model_ratio = float(input_size[1]) / input_size[0]
+    if im_ratio > model_ratio:
+        new_height = input_size[1]
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_size[0]
+        new_height = int(new_width * im_ratio)
+
+    det_scale = float(new_height) / image.shape[0]
+    det_image = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    det_image[:new_height, :new_width, :] = cv2.resize(image, (new_width, new_height))
+
+    return det_image, det_scale
+
+
+# 取出批次中第 batch_index 张图像的输出（输出不带批次维度时只有一张图像）
+def select_output(output, batch_index: int):
+    return output[batch_index] if output.ndim == 3 else output
+
+
+# 解码批次中第 batch_index 张图像的检测结果，并做 NMS（和 det_model.forward + det_model.detect 的处理一致）
+def decode_detections(det_model, net_outs, batch_index: int, input_height: int, input_width: int, det_scale: float):
+    scores_list, bboxes_list, kpss_list = [], [], []
+    fmc = det_model.fmc
+    for idx, stride in enumerate(det_model._feat_stride_fpn):
+        scores = select_output(net_outs[idx], batch_index)
+        bbox_preds = select_output(net_outs[idx + fmc], batch_index) * stride
+
+        height, width = input_height // stride, input_width // stride
+        key = (height, width, stride)
+        anchor_centers = det_model.center_cache.get(key)
+        if anchor_centers is None:
+            anchor_centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+            if det_model._num_anchors > 1:
+                anchor_centers = np.stack([anchor_centers] * det_model._num_anchors, axis=1).reshape((-1, 2))
+            if len(det_model.center_cache) < 100:
+                det_model.center_cache[key] = anchor_centers
+
+        pos_inds = np.where(scores >= det_model.det_thresh)[0]
+        scores_list.append(scores[pos_inds])
+        bboxes_list.append(distance2bbox(anchor_centers, bbox_preds)[pos_inds])
+        if det_model.use_kps:
+            kps_preds = select_output(net_outs[idx + fmc * 2], batch_index) * stride
+            kpss = distance2kps(anchor_centers, kps_preds)
+            kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2))[pos_inds])
+
+    order = np.vstack(scores_list).ravel().argsort()[::-1]
+    pre_det = np.hstack((np.vstack(bboxes_list) / det_scale, np.vstack(scores_list))).astype(np.float32, copy=False)
+    pre_det = pre_det[order, :]
+    keep = det_model.nms(pre_det)
+
+    kpss = None
+    if det_model.use_kps:
+        kpss = (np.vstack(kpss_list) / det_scale)[order, :, :][keep, :, :]
+
+    return pre_det[keep, :], kpss
+
+
+# 批量检测多张图像，返回每张图像的 (目标框及置信度 n×5, 关键点 n×5×2)，每批最多 max_batch_size 张
+def detect_batch(app: FaceAnalysis, images: list, max_batch_size: int=8, input_size=None) -> list:
+    det_model = app.det_model
+    input_size = input_size or det_model.input_size
+
+    # 输出不带批次维度的模型直接逐张调用 det_model.detect
+    if not has_batch_dim(det_model):
+        return [det_model.detect(image, input_size=input_size, max_num=0, metric='default') for image in images]
+
+    # 输入的批大小固定时（通常为 1），按固定的批大小推理
+    if not supports_batch(det_model):
+        max_batch_size = 1
+
+    results = []
+    for start_idx in range(0, len(images), max(1, max_batch_size)):
+        results.extend(detect_images(det_model, images[start_idx:start_idx + max(1, max_batch_size)], input_size))
+
+    return results
+
+
+# 把一批图像拼成一个批次送入检测模型，再逐张解码
+def detect_images(det_model, images: list, input_size) -> list:
+    det_images, det_scales = zip(*[letterbox(image, input_size) for image in images])
+
+    blob = cv2.dnn.blobFromImages(list(det_images),
+                                  1.0 / det_model.input_std,
+                                  tuple(input_size),
+                                  (det_model.input_mean, det_model.input_mean, det_model.input_mean),
+                                  swapRB=True)
+    net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+
+    return [decode_detections(det_model, net_outs, batch_index, blob.shape[2], blob.shape[3], det_scale)
+            for batch_index, det_scale in enumerate(det_scales)]
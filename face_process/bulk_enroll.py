@@ -0,0 +1,200 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-25
+
+import os
+import cv2
+import csv
+import time
+import numpy as np
+from tqdm import tqdm
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from insightface.utils import face_align
+from SQL.face_gallery import Face_Gallery
+from SQL.database_operate import create_database, migrate_database, get_enroll_checkpoint
+from face_process.model_pool import Model_Pool
+from face_process.face_recognize import detect_faces_batch, extract_embeddings_batch
+
+'''
+    从图像目录或清单文件批量录入人脸（用于一次性导入大量员工照片等场景）：
+    1.图像目录中每个子文件夹为一个人（文件夹名为姓名），直接放在目录下的图像以文件名为姓名；
+      清单文件为 CSV，每行为 姓名,图像路径（相对路径以清单文件所在的目录为起点）
+    2.条目按 chunk_size 分段交给多个工作线程（每个线程从模型副本池取一份模型），解码、批量检测、批量提取特征向量并行进行，
+      OpenCV 和 ONNX Runtime 计算时都会释放 GIL，所以多线程就能用满多个 CPU 核
+    3.主线程按原来的顺序取回结果，每攒够 commit_size 个人脸，就用 executemany 在一个事务中写入数据库（而不是每个人脸一个连接、一次提交），
+      任务已经处理完的条目数（断点）也在同一个事务中更新，中断后重新运行会从断点继续
+    4.没有检测到人脸、检测到多个人脸、无法读取的图像都记录到报告文件（CSV）中，不会录入
+'''
+
+
+# 从图像目录中找出所有 (姓名, 图像路径)，按路径排序，保证每次运行的顺序一致（断点才有意义）
+def list_image_directory(directory: str) -> list:
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.lower().endswith(('.bmp', '.jpg', '.jpeg', '.png')):
+                continue
+            relative_dir = os.path.relpath(root, directory)
+            # 子文件夹中的图像以第一级子文件夹名为姓名，直接放在目录下的图像以文件名为姓名
+            name = os.path.splitext(file)[0] if relative_dir == '.' else relative_dir.split(os.sep)[0]
+            entries.append((name, os.path.join(root, file)))
+
+    return entries
+
+
+# 读取清单文件（CSV，每行为 姓名,图像路径，可以有表头 name,image），返回 (姓名, 图像路径) 列表
+def read_manifest(manifest_path: str) -> list:
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip() == '' or (len(entries) == 0 and row[0].strip().lower() == 'name'):
+                continue
+            entries.append((row[0].strip(), os.path.join(base_dir, row[1].strip())))
+
+    return entries
+
+
+# 读取图像（支持中文路径），读取失败时返回 None
+def read_image(image_path: str):
+    try:
+        return cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except (OSError, ValueError):
+        return None
+
+
+# 工作线程处理一段条目：读取图像、批量检测人脸，只有一个人脸的图像批量提取特征向量
+# 返回每个条目的 (状态, 人脸图像, 特征向量)，状态为 'ok' / 'no_face' / 'multiple_faces' / 'unreadable'
+def _process_chunk(model_pool: Model_Pool, entries: list, allow_multiple_faces: bool) -> list:
+    images = [read_image(image_path) for _, image_path in entries]
+    readable = [i for i, image in enumerate(images) if image is not None]
+
+    results = [('unreadable', None, None)] * len(entries)
+    if len(readable) <= 0:
+        return results
+
+    with model_pool.acquire() as app:
+        faces_per_image = detect_faces_batch(app, [images[i] for i in readable])
+
+        # 每张图像只录入一个人脸：有多个人脸时默认跳过，allow_multiple_faces 为 True 时录入最大的人脸
+        selected = []
+        for i, faces in zip(readable, faces_per_image):
+            if len(faces) <= 0:
+                results[i] = ('no_face', None, None)
+            elif len(faces) > 1 and not allow_multiple_faces:
+                results[i] = ('multiple_faces', None, None)
+            else:
+                selected.append((i, max(faces, key=lambda face: (face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1]))))
+
+        extract_embeddings_batch(app, [images[i] for i, _ in selected], [[face] for _, face in selected])
+
+    for i, face in selected:
+        face_image = face_align.norm_crop(img=images[i], landmark=face.kps)
+        results[i] = ('ok', face_image, face.embedding)
+
+    return results
+
+
+# 批量录入人脸，返回统计结果；source 为图像目录或清单文件（.csv）
+# 同一个 source 中断后重新运行时，从数据库中记录的断点继续（resume 为 False 时从头开始）
+def bulk_enroll(model_pool: Model_Pool,
+                gallery: Face_Gallery,
+                source: str,
+                report_path: str=None,
+                num_workers: int=None,
+                chunk_size: int=16,
+                commit_size: int=512,
+                allow_multiple_faces: bool=False,
+                resume: bool=True) -> dict:
+    entries = read_manifest(source) if os.path.isfile(source) else list_image_directory(source)
+    job = os.path.abspath(source)
+    start_idx = get_enroll_checkpoint(job, gallery.database_path) if resume else 0
+    if start_idx > 0:
+        print(f"\n从断点继续：已处理 {start_idx} / {len(entries)} 个条目\n")
+
+    # 默认每份模型副本一个工作线程
+    num_workers = num_workers or model_pool.num_replicas
+    report_path = report_path or os.path.splitext(job)[0] + '_enroll_report.csv'
+    stats = {'total': len(entries), 'skipped': start_idx, 'ok': 0, 'no_face': 0, 'multiple_faces': 0, 'unreadable': 0}
+
+    pending_faces, pending_issues = [], []
+    completed = start_idx
+
+    # 写入一批人脸和断点（同一个事务），再把这批条目中的问题追加到报告文件
+    def commit():
+        gallery.add_faces(pending_faces, checkpoint=(job, completed))
+        if pending_issues:
+            new_file = not os.path.exists(report_path)
+            with open(report_path, 'a', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(('name', 'image', 'status'))
+                writer.writerows(pending_issues)
+        pending_faces.clear()
+        pending_issues.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(num_workers) as executor, tqdm(total=len(entries), initial=start_idx, unit='张') as progress:
+        # 每个工作线程最多排队两段，既能让工作线程一直有活干，又限制了内存中的图像数量
+        pending = deque()
+        chunk_starts = iter(range(start_idx, len(entries), chunk_size))
+
+        def submit_next():
+            chunk_start = next(chunk_starts, None)
+            if chunk_start is not None:
+                chunk = entries[chunk_start:chunk_start + chunk_size]
+                pending.append((chunk, executor.submit(_process_chunk, model_pool, chunk, allow_multiple_faces)))
+
+        for _ in range(num_workers * 2):
+            submit_next()
+
+        # 按提交顺序取回结果，保证断点之前的条目都已经处理完
+        while pending:
+            chunk, future = pending.popleft()
+            results = future.result()
+            submit_next()
+
+            for (name, image_path), (status, face_image, embedding) in zip(chunk, results):
+                stats[status] += 1
+                if status == 'ok':
+                    pending_faces.append((face_image, name, embedding))
+                else:
+                    pending_issues.append((name, image_path, status))
+
+            completed += len(chunk)
+            progress.update(len(chunk))
+            progress.set_postfix(ok=stats['ok'], no_face=stats['no_face'], multiple=stats['multiple_faces'])
+
+            if len(pending_faces) >= commit_size:
+                commit()
+
+        # 最后不足 commit_size 的部分（以及最终的断点）
+        if completed > start_idx:
+            commit()
+
+    elapsed = time.perf_counter() - start
+    processed = completed - start_idx
+    print(f"\n批量录入完成：本次处理 {processed} 个条目（{processed / elapsed if elapsed > 0 else 0:.1f} 张/秒），"
+          f"录入 {stats['ok']} 个人脸，没有人脸 {stats['no_face']} 张，多个人脸 {stats['multiple_faces']} 张，"
+          f"无法读取 {stats['unreadable']} 张")
+    if stats['no_face'] + stats['multiple_faces'] + stats['unreadable'] > 0:
+        print(f"未录入的图像见报告文件：{report_path}\n")
+
+    return stats
+
+
+# 在项目根目录下运行：python -m face_process.bulk_enroll
+if __name__ == '__main__':
+    # 图像目录或清单文件、数据库文件路径、模型副本数（每份副本一个工作线程）
+    source = 'enroll_images/'
+    database_path = 'databases/known_faces.db'
+    num_replicas = 2
+
+    if not os.path.exists(database_path):
+        create_database(database_path)
+    migrate_database(database_path)
+
+    model_pool = Model_Pool(num_replicas, None, None)
+    gallery = Face_Gallery(database_path)
+    bulk_enroll(model_pool, gallery, source)
@@ -0,0 +1,139 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-19
+
+import math
+import numpy as np
+from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from face_process.batch_detect import detect_batch
+
+'''
+    自适应的人脸检测策略（用于视频流）：
+    1.检测模型的输入尺寸不再固定为 640×640，而是根据视频帧的尺寸和需要检测的最小人脸尺寸来选择：
+      检测模型大约能检出输入中 16 像素大小的人脸，所以把视频帧缩放到最小人脸约为 16 像素即可，
+      输入的宽高按视频帧的宽高比取 32 的倍数（不补大片的零），高清 / 4K 视频的检测计算量可以大幅降低
+    2.每隔 full_scan_interval 帧做一次全图检测（发现新出现的人脸），其余帧只在上一帧人脸的周围区域（ROI）内检测，
+      ROI 中检测到的人脸数变少时（人脸可能移出了 ROI），下一帧立即全图检测
+    3.检测结果的目标框和关键点都换算回原始视频帧的坐标，人脸对齐和特征提取仍然使用原始分辨率的视频帧
+    4.传入画面中发生变化的区域（motion_gate.Motion_Gate）时，变化的区域也作为 ROI，画面中没有人脸时也只在变化的区域内检测
+'''
+
+
+# 检测模型能可靠检出的人脸在输入图像中的大致尺寸（像素）
+DETECTOR_MIN_FACE = 16
+
+
+# 向上取整到 32 的倍数（检测模型最大的步长为 32）
+def ceil_to_32(value: float) -> int:
+    return max(32, int(math.ceil(value / 32)) * 32)
+
+
+class Detection_Policy:
+    def __init__(self,
+                 min_face_size: int=40,
+                 full_scan_interval: int=10,
+                 roi_margin: float=0.5,
+                 max_input_size: int=1280):
+        assert min_face_size > 0, 'Error: 最小人脸尺寸必须大于 0！'
+        self.min_face_size = min_face_size
+        self.full_scan_interval = full_scan_interval
+        self.roi_margin = roi_margin
+        self.max_input_size = max_input_size
+
+        self._last_bboxes = np.zeros((0, 4), dtype=np.float32)
+        self._frames_since_full_scan = 0
+        self._force_full_scan = True
+
+        # 统计信息：全图检测次数、ROI 检测次数、检测模型输入的总像素数（用来估计计算量）
+        self.stats = {'full_scans': 0, 'roi_scans': 0, 'input_pixels': 0}
+
+    # 根据图像（视频帧或 ROI）的宽高选择检测模型的输入尺寸 (宽, 高)
+    def choose_input_size(self, det_model, width: int, height: int):
+        # 模型的输入尺寸是固定值时只能使用该尺寸
+        if isinstance(det_model.input_shape[2], int) and isinstance(det_model.input_shape[3], int):
+            return det_model.input_size
+
+        # 只缩小不放大：最小人脸缩放到约 DETECTOR_MIN_FACE 像素，最长边不超过 max_input_size
+        scale = min(1.0, DETECTOR_MIN_FACE / self.min_face_size, self.max_input_size / max(width, height))
+        return ceil_to_32(width * scale), ceil_to_32(height * scale)
+
+    # 在图像的一个区域内检测人脸，返回换算到原图坐标的 (目标框及置信度, 关键点)
+    def _detect_region(self, app: FaceAnalysis, frame, x1: int, y1: int, x2: int, y2: int):
+        region = frame[y1:y2, x1:x2]
+        input_size = self.choose_input_size(app.det_model, x2 - x1, y2 - y1)
+        self.stats['input_pixels'] += input_size[0] * input_size[1]
+
+        bboxes, kpss = detect_batch(app, [region], 1, input_size=input_size)[0]
+        bboxes = bboxes.copy()
+        bboxes[:, [0, 2]] += x1
+        bboxes[:, [1, 3]] += y1
+        if kpss is not None:
+            kpss = kpss + np.array([x1, y1], dtype=np.float32)
+
+        return bboxes, kpss
+
+    # 上一帧的人脸框向外扩展 roi_margin 倍后作为 ROI（再加上画面中发生变化的区域），相互重叠的 ROI 合并成一个
+    def _get_rois(self, width: int, height: int, motion_regions: list=()):
+        rois = []
+        for x1, y1, x2, y2 in self._last_bboxes:
+            margin_x, margin_y = (x2 - x1) * self.roi_margin, (y2 - y1) * self.roi_margin
+            rois.append([max(0, int(x1 - margin_x)), max(0, int(y1 - margin_y)),
+                         min(width, int(math.ceil(x2 + margin_x))), min(height, int(math.ceil(y2 + margin_y)))])
+        for x1, y1, x2, y2 in motion_regions:
+            rois.append([max(0, int(x1)), max(0, int(y1)), min(width, int(math.ceil(x2))), min(height, int(math.ceil(y2)))])
+
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rois)):
+                for j in range(i + 1, len(rois)):
+                    a, b = rois[i], rois[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del rois[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        return [roi for roi in rois if roi[2] > roi[0] and roi[3] > roi[1]]
+
+    # 检测一帧中的人脸，返回带有目标框和关键点的人脸列表（坐标均为原始视频帧的坐标）
+    # motion_regions 为画面中发生变化的区域，为 None 时没有人脸就全图检测
+    def detect(self, app: FaceAnalysis, frame, motion_regions: list=None) -> list:
+        height, width = frame.shape[:2]
+        full_scan = self._force_full_scan or self._frames_since_full_scan >= self.full_scan_interval or \
+            (len(self._last_bboxes) <= 0 and motion_regions is None)
+
+        rois = [] if full_scan else self._get_rois(width, height, motion_regions or [])
+        full_scan = full_scan or len(rois) <= 0
+
+        if full_scan:
+            bboxes, kpss = self._detect_region(app, frame, 0, 0, width, height)
+            self._frames_since_full_scan = 0
+            self.stats['full_scans'] += 1
+        else:
+            results = [self._detect_region(app, frame, *roi) for roi in rois]
+            bboxes = np.concatenate([result[0] for result in results], axis=0)
+            kpss = np.concatenate([result[1] for result in results], axis=0) if results[0][1] is not None else None
+
+            # 合并后的 ROI 之间仍可能有少量重叠，用 NMS 去掉重复的人脸
+            if len(results) > 1 and len(bboxes) > 0:
+                keep = app.det_model.nms(bboxes)
+                bboxes = bboxes[keep]
+                kpss = kpss[keep] if kpss is not None else None
+
+            self._frames_since_full_scan += 1
+            self.stats['roi_scans'] += 1
+
+        # ROI 中检测到的人脸变少了，可能有人脸移出了 ROI，下一帧做一次全图检测
+        self._force_full_scan = not full_scan and len(bboxes) < len(self._last_bboxes)
+        self._last_bboxes = bboxes[:, 0:4].copy()
+
+        return [Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+                for i in range(bboxes.shape[0])]
+
+    def reset(self):
+        self._last_bboxes = np.zeros((0, 4), dtype=np.float32)
+        self._frames_since_full_scan = 0
+        self._force_full_scan = True
@@ -1,125 +1,236 @@
 # @Author        : Justin Lee
 # @Time          : 2025-3-27
 
-import cv2
 import numpy as np
-import torch
-from PIL import Image, ImageDraw, ImageFont
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
+from SQL.face_gallery import Face_Gallery
+from face_process.batch_detect import detect_batch
+from face_process.overlay_renderer import Overlay_Renderer
+from face_process.analysis_cache import Face_Analysis_Cache
 
 '''
     通过InsightFace对摄像头捕捉到的视频帧进行人脸识别：
     1.调用RetinaFace进行人脸检测，获取目标框和关键点
-    2.调用ArcFace进行人脸特征提取，获取特征向量
-    3.计算当前人脸和已知人脸库的相似度，来识别当前人脸的姓名
-    4.把识别结果画在视频帧上，并返回
+    2.调用ArcFace进行人脸特征提取，获取特征向量（一帧或多帧中的所有人脸先对齐，再拼成一个批次一次性推理）
+    3.把一帧中所有人脸和已知人脸库（已L2归一化）一次性做矩阵乘法计算相似度，来识别每个人脸的姓名
+    4.把识别结果画在视频帧上（overlay_renderer.Overlay_Renderer），并返回
+    传入缓存（analysis_cache.Face_Analysis_Cache）时，重复提交的同一张图像直接使用缓存的检测和特征提取结果，只重新匹配
 '''
 
 
-# 计算cos相似度（如果设备有GPU的话，可用GPU加速，没有的话使用CPU）
-def cosine_similarity(known_faces, current_face, device):
-    with torch.no_grad():
-        known_faces = torch.tensor(known_faces, dtype=torch.float32).to(device)
-        current_face = torch.tensor(current_face, dtype=torch.float32).to(device)
+# 只进行人脸检测，返回带有目标框和关键点的人脸（不提取特征向量）
+# 和批量检测走同一个入口，输出带批次维度的检测模型也能使用（det_model.detect 只支持不带批次维度的输出）
+def detect_faces(app: FaceAnalysis, frame) -> list:
+    return detect_faces_batch(app, [frame], 1)[0]
 
-        known_faces_norm = torch.linalg.norm(known_faces, dim=1, keepdims=True).reshape(-1)
-        current_face_norm = torch.linalg.norm(current_face, dim=0, keepdims=True)
 
-        cos = torch.matmul(known_faces, current_face) / (known_faces_norm * current_face_norm)
+# 批量检测多帧中的人脸（每批最多 det_batch_size 帧），返回每一帧的人脸列表，和逐帧调用 detect_faces 的结果相同
+def detect_faces_batch(app: FaceAnalysis, frames: list, det_batch_size: int=8) -> list:
+    faces_per_frame = []
+    for bboxes, kpss in detect_batch(app, frames, det_batch_size):
+        faces_per_frame.append([Face(bbox=bboxes[i, 0:4], 
+                                     kps=kpss[i] if kpss is not None else None, 
+                                     det_score=bboxes[i, 4]) 
+                                for i in range(bboxes.shape[0])])
 
-        return cos.cpu().numpy()
+    return faces_per_frame
 
 
-# 识别人脸
+# 根据关键点把人脸对齐并裁剪成识别模型的输入尺寸（和 ArcFace 模型的 get 方法一致）
+def align_faces(app: FaceAnalysis, frame, faces: list) -> list:
+    image_size = app.models['recognition'].input_size[0]
+    return [face_align.norm_crop(frame, landmark=face.kps, image_size=image_size) for face in faces]
+
+
+# 把对齐好的人脸图像分批送入识别模型，返回特征向量矩阵（每行一个人脸）
+# 每批最多 app.max_batch_size 个人脸（由 Init_model 设置）；模型的批大小是固定值时按固定值分批，不足的用最后一张补齐
+def embed_aligned_faces(app: FaceAnalysis, aligned_images: list):
+    model = app.models['recognition']
+    if len(aligned_images) <= 0:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    fixed_batch_size = model.input_shape[0] if isinstance(model.input_shape[0], int) and model.input_shape[0] > 0 else None
+    batch_size = fixed_batch_size or max(1, getattr(app, 'max_batch_size', 32))
+
+    embeddings = []
+    for start_idx in range(0, len(aligned_images), batch_size):
+        batch = aligned_images[start_idx:start_idx + batch_size]
+        num_images = len(batch)
+        if fixed_batch_size is not None and num_images < fixed_batch_size:
+            batch = batch + [batch[-1]] * (fixed_batch_size - num_images)
+
+        try:
+            embeddings.append(model.get_feat(batch)[:num_images])
+        except Exception:
+            # 模型声明了动态批大小但实际不支持时，退回逐个推理，并记住该模型只能逐个推理
+            if len(batch) <= 1:
+                raise
+            print("Warning: 识别模型不支持批量推理，改为逐个推理")
+            model.input_shape = [1] + list(model.input_shape[1:])
+            embeddings.append(embed_aligned_faces(app, aligned_images[start_idx:]))
+            break
+
+    return np.concatenate(embeddings, axis=0).astype(np.float32)
+
+
+# 对指定的人脸提取特征向量（保存在 face.embedding 中），一帧中的所有人脸一起批量推理
+def extract_embeddings(app: FaceAnalysis, frame, faces: list):
+    return extract_embeddings_batch(app, [frame], [faces])[0]
+
+
+# 对多帧中的人脸一起提取特征向量：所有人脸先对齐，再拼成批次推理，faces_per_frame[i] 为第 i 帧中要提取的人脸
+def extract_embeddings_batch(app: FaceAnalysis, frames: list, faces_per_frame: list):
+    aligned_images = []
+    for frame, faces in zip(frames, faces_per_frame):
+        aligned_images.extend(align_faces(app, frame, faces))
+
+    embeddings = embed_aligned_faces(app, aligned_images)
+    all_faces = [face for faces in faces_per_frame for face in faces]
+    for face, embedding in zip(all_faces, embeddings):
+        face.embedding = embedding
+
+    return faces_per_frame
+
+
+# 检测人脸并提取所有人脸的特征向量；传入缓存时，同一张图像（且模型相同）直接返回缓存的结果
+def detect_and_embed(app: FaceAnalysis, frame, cache: Face_Analysis_Cache=None) -> list:
+    key = None
+    if cache is not None:
+        key = cache.make_key(app, frame)
+        faces = cache.get(key)
+        if faces is not None:
+            return faces
+
+    faces = detect_faces(app, frame)
+    extract_embeddings(app, frame, faces)
+
+    if cache is not None:
+        cache.put(key, faces)
+
+    return faces
+
+
+# 把一帧中所有人脸的特征向量和已知人脸库进行匹配，返回每个人脸的姓名和各自的cos相似度
+def match_embeddings(embeddings,
+                     gallery: Face_Gallery,
+                     threshold: float = 0.5):
+    # 一帧中的所有人脸一起在人脸库中搜索最相似的已知人脸
+    best_names, best_similarities = gallery.search(embeddings)
+
+    # 相似度全为负数（或人脸库为空）时记为 0；根据相似度阈值，判断是否为已知人脸，未录入的人脸对应的姓名为 Unknown
+    similarities = np.maximum(best_similarities, 0)
+    names = [best_name if similarity > threshold and similarity > 0 else "Unknown"
+             for best_name, similarity in zip(best_names, best_similarities)]
+
+    return names, similarities
+
+
+# 识别人脸，返回每个人脸的目标框和姓名，以及每个人脸各自的最大cos相似度
+# 传入跟踪器（face_tracker.Face_Tracker）时，已跟踪的人脸直接沿用跟踪目标的身份，不再每帧提取特征向量
 def recognize_faces(app: FaceAnalysis,
                     frame,
-                    known_face_encodings,
-                    known_face_names,
+                    gallery: Face_Gallery,
                     threshold: float = 0.5,
-                    batch_size: int = 1024) -> list:
-    # 使用检测模型检测人脸
-    faces = app.get(frame)
+                    tracker=None,
+                    cache: Face_Analysis_Cache=None) -> list:
+    if tracker is not None:
+        return tracker.update(app, frame, gallery, threshold)
 
-    # 如果有GPU的话选择GPU进行矩阵运算加速，没有的话使用CPU
-    if torch.cuda.is_available():
-        device = torch.device("cuda:0")
-    else:
-        device = torch.device("cpu")
+    # 使用检测模型检测人脸，再对所有人脸批量提取特征向量（命中缓存时直接使用缓存的结果）
+    faces = detect_and_embed(app, frame, cache)
 
-    # 和数据库已知人脸进行匹配，返回人脸框和姓名
-    face_names = []
-    max_similarity_overall = 0
-    for face in faces:
-        # 未录入的人脸对应的姓名为 Unknown
-        name = "Unknown"
+    return recognize_analyzed_faces(faces, gallery, threshold)
 
-        # 记录所有已知人脸和当前人脸相似度最大的最大值
-        max_similarity_overall = 0
 
-        # 计算数据库中所有的已知人脸有多少个batch
-        num_batches = len(known_face_encodings) // batch_size + (1 if len(known_face_encodings) % batch_size != 0 else 0)
-        # 按批次处理已知人脸编码
-        for i in range(num_batches):
-            # 计算当前batch的范围，并截取
-            start_idx = i * batch_size
-            end_idx = min(start_idx + batch_size, len(known_face_encodings))
-            batch_encodings = known_face_encodings[start_idx:end_idx]
+# 识别一帧中已经检测并提取了特征向量的人脸（如视频处理工作进程的结果），返回值和 recognize_faces 相同
+# 传入跟踪器时和 recognize_faces 一样由跟踪器关联、投票决定身份，只是需要识别的人脸直接使用已有的特征向量
+def recognize_analyzed_faces(faces: list,
+                             gallery: Face_Gallery,
+                             threshold: float = 0.5,
+                             tracker=None) -> list:
+    if tracker is not None:
+        return tracker.update_with_faces(faces, gallery, threshold)
 
-            # 计算当前人脸和当前批次已知人脸矩阵的cos相似度
-            similarities = cosine_similarity(batch_encodings, face.embedding, device)
-            # 取当前批次的最大相似度
-            max_similarity_batch = np.max(similarities)
+    if len(faces) <= 0:
+        return [], np.zeros(0, dtype=np.float32)
 
-            # 更新全局最大相似度和对应的姓名
-            if max_similarity_batch > max_similarity_overall:
-                max_similarity_overall = max_similarity_batch
+    # 一帧中的所有人脸一起和数据库已知人脸进行匹配
+    embeddings = np.stack([face.embedding for face in faces])
+    names, similarities = match_embeddings(embeddings, gallery, threshold)
 
-                # 根据相似度阈值，判断是否为已知人脸，有已知人脸匹配才更新姓名
-                if max_similarity_batch > threshold:
-                    index_in_batch = np.argmax(similarities)
-                    index = start_idx + index_in_batch
-                    name = known_face_names[index]
+    face_names = [(face.bbox, name) for face, name in zip(faces, names)]
 
-        print(f"cos_similarity: {max_similarity_overall}")
+    return face_names, similarities
 
-        face_names.append((face.bbox, name))
 
-    return face_names, max_similarity_overall
+# 识别多帧中的人脸：多帧批量检测，所有帧中的人脸一起批量提取特征向量并一次性匹配
+# 返回每一帧的 (目标框, 姓名) 列表和相似度，和逐帧调用 recognize_faces（不使用跟踪器）的结果相同
+def recognize_faces_batch(app: FaceAnalysis,
+                          frames: list,
+                          gallery: Face_Gallery,
+                          threshold: float = 0.5,
+                          det_batch_size: int = 8) -> list:
+    faces_per_frame = detect_faces_batch(app, frames, det_batch_size)
+    extract_embeddings_batch(app, frames, faces_per_frame)
+
+    all_faces = [face for faces in faces_per_frame for face in faces]
+    if len(all_faces) > 0:
+        names, similarities = match_embeddings(np.stack([face.embedding for face in all_faces]), gallery, threshold)
+    else:
+        names, similarities = [], np.zeros(0, dtype=np.float32)
+
+    results = []
+    start_idx = 0
+    for faces in faces_per_frame:
+        end_idx = start_idx + len(faces)
+        face_names = [(face.bbox, name) for face, name in zip(faces, names[start_idx:end_idx])]
+        results.append((face_names, similarities[start_idx:end_idx]))
+        start_idx = end_idx
+
+    return results
 
 
 # 把人脸识别的结果画在视频帧上
 def process_frame(app: FaceAnalysis, 
                   frame, 
-                  known_face_encodings,
-                  known_face_names, 
-                  threshold: float=0.5):
+                  gallery: Face_Gallery, 
+                  threshold: float=0.5,
+                  tracker=None,
+                  cache: Face_Analysis_Cache=None):
     
-    # 识别人脸，返回人脸框和姓名
-    face_names, similarity = recognize_faces(app, 
+    # 识别人脸，返回人脸框和姓名，以及每个人脸各自的相似度
+    face_names, similarities = recognize_faces(app, 
                                  frame, 
-                                 known_face_encodings, 
-                                 known_face_names, 
-                                 threshold)
+                                 gallery, 
+                                 threshold,
+                                 tracker,
+                                 cache)
     
     # 如果没有检测到人脸，直接返回，并标记未检测到
     if len(face_names) <= 0:
-        return frame, False, 0
+        return frame, False, similarities
 
-    # 因为 OpenCV 不能绘制中文，所以要将 OpenCV 图像转换为 PIL 图像，绘制完再转回OpenCV图像
-    pil_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    draw = ImageDraw.Draw(pil_image)
-    font = ImageFont.truetype("msyhbd.ttc", 30)  # 请确保系统中有这个字体文件
-    
-    # 在原始视频帧上画出人脸框和姓名
-    for (bbox, name) in face_names:
-        x1, y1, x2, y2 = [int(v) for v in bbox]
-        
-        # 在 PIL 图像上绘制人脸框
-        draw.rectangle([x1, y1, x2, y2], outline=(255, 0, 0), width=2)
-        # 在 PIL 图像上绘制中文姓名
-        draw.text((x1, y2), name, font=font, fill=(0, 255, 0))
+    frame = draw_faces(frame, face_names)
     
-    # 将 PIL 图像转换回 OpenCV 图像
-    frame = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-    
-    return frame, True, similarity
+    return frame, True, similarities
+
+
+# 在视频帧上画出人脸框和姓名，face_names 为 (目标框, 姓名) 的列表（直接在传入的视频帧上绘制）
+def draw_faces(frame, face_names: list):
+    if len(face_names) <= 0:
+        return frame
+
+    return get_renderer().draw(frame, face_names)
+
+
+# 全局共用的绘制器（第一次绘制时才加载字体）
+_renderer = None
+
+
+def get_renderer() -> Overlay_Renderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = Overlay_Renderer("msyhbd.ttc", 30)
+    return _renderer
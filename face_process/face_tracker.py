@@ -0,0 +1,231 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-13
+
+import numpy as np
+from collections import deque, defaultdict
+from insightface.app import FaceAnalysis
+from SQL.face_gallery import Face_Gallery
+from face_process.face_recognize import detect_faces, extract_embeddings, match_embeddings
+from face_process.detect_policy import Detection_Policy
+from face_process.motion_gate import Motion_Gate
+
+'''
+    多目标人脸跟踪：
+    每一帧仍然做人脸检测，但只有新出现的人脸、身份置信度衰减到阈值以下的人脸，
+    或者距离上次识别超过 refresh_interval 帧的人脸，才会重新提取 ArcFace 特征向量并和人脸库匹配；
+    置信度的衰减系数默认由 refresh_interval 推出（投票一致的目标恰好在 refresh_interval 帧时衰减到阈值），
+    投票有分歧的目标会更早重新识别，但两次识别之间至少间隔 min_embed_interval 帧，不会每帧都提取特征向量；
+    其余人脸通过 IoU（可选匀速运动模型预测位置）和上一帧的跟踪目标关联，直接沿用跟踪目标的身份，
+    每个跟踪目标的身份由最近几次识别结果投票决定，画面稳定时可以大幅减少 ArcFace 的调用次数；
+    传入检测策略（detect_policy.Detection_Policy）时，按策略自适应选择检测的输入尺寸，并只在人脸周围的区域内检测；
+    传入运动门控（motion_gate.Motion_Gate）时，画面没有变化的帧直接沿用上一帧的结果，有变化时只在变化的区域和人脸周围检测
+'''
+
+
+# 计算两组目标框之间的 IoU 矩阵，目标框格式为 [x1, y1, x2, y2]
+def bbox_iou(bboxes_a, bboxes_b):
+    bboxes_a = np.asarray(bboxes_a, dtype=np.float32).reshape(-1, 4)
+    bboxes_b = np.asarray(bboxes_b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(bboxes_a[:, None, 0], bboxes_b[None, :, 0])
+    y1 = np.maximum(bboxes_a[:, None, 1], bboxes_b[None, :, 1])
+    x2 = np.minimum(bboxes_a[:, None, 2], bboxes_b[None, :, 2])
+    y2 = np.minimum(bboxes_a[:, None, 3], bboxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (bboxes_a[:, 2] - bboxes_a[:, 0]) * (bboxes_a[:, 3] - bboxes_a[:, 1])
+    area_b = (bboxes_b[:, 2] - bboxes_b[:, 0]) * (bboxes_b[:, 3] - bboxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-6)
+
+
+# 单个跟踪目标
+class Face_Track:
+    def __init__(self, track_id: int, face, frame_index: int, vote_window: int):
+        self.track_id = track_id
+        self.face = face
+        self.bbox = np.asarray(face.bbox, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.misses = 0
+
+        # 最近几次识别的结果 (姓名, 相似度)，用于投票决定身份
+        self.votes = deque(maxlen=vote_window)
+        self.name = "Unknown"
+        self.similarity = 0.0
+        self.vote_share = 0.0
+        self.last_embedded_frame = frame_index
+
+    # 用匀速运动模型预测当前帧的目标框
+    def predict(self):
+        return self.bbox + self.velocity
+
+    # 用关联上的检测结果更新目标框和速度（速度做指数平滑，避免检测框抖动带来的误差）
+    def update(self, face, momentum: float=0.5):
+        bbox = np.asarray(face.bbox, dtype=np.float32)
+        self.velocity = momentum * self.velocity + (1 - momentum) * (bbox - self.bbox)
+        self.bbox = bbox
+        self.face = face
+        self.misses = 0
+
+    # 加入一次识别结果，重新投票决定身份：所有投票中相似度之和最大的姓名即为身份
+    def add_vote(self, name: str, similarity: float, frame_index: int):
+        self.votes.append((name, float(similarity)))
+        self.last_embedded_frame = frame_index
+
+        scores = defaultdict(float)
+        for vote_name, vote_similarity in self.votes:
+            scores[vote_name] += vote_similarity
+        self.name = max(scores, key=scores.get)
+
+        similarities = [vote_similarity for vote_name, vote_similarity in self.votes if vote_name == self.name]
+        self.similarity = float(np.mean(similarities))
+        self.vote_share = len(similarities) / len(self.votes)
+
+    # 身份置信度：投票占比，随距离上次识别的帧数指数衰减
+    def confidence(self, frame_index: int, decay: float):
+        return self.vote_share * decay ** (frame_index - self.last_embedded_frame)
+
+
+class Face_Tracker:
+    def __init__(self,
+                 iou_threshold: float=0.3,
+                 max_misses: int=5,
+                 refresh_interval: int=30,
+                 vote_window: int=5,
+                 min_confidence: float=0.5,
+                 confidence_decay: float=None,
+                 min_embed_interval: int=3,
+                 use_motion: bool=True,
+                 detection_policy: Detection_Policy=None,
+                 motion_gate: Motion_Gate=None):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.refresh_interval = refresh_interval
+        self.vote_window = vote_window
+        self.min_confidence = min_confidence
+        # 没有指定衰减系数时，让投票一致（投票占比为 1）的目标经过 refresh_interval 帧恰好衰减到 min_confidence，
+        # 这样两种重新识别的条件不会互相矛盾（衰减过快时 refresh_interval 永远不会起作用）
+        if confidence_decay is None:
+            confidence_decay = min_confidence ** (1 / refresh_interval) if 0 < min_confidence < 1 else 1.0
+        assert 0 < confidence_decay <= 1, 'Error: 置信度的衰减系数必须在 (0, 1] 之间！'
+        self.confidence_decay = confidence_decay
+        # 同一个目标两次提取特征向量之间至少间隔的帧数（新目标除外）
+        self.min_embed_interval = min_embed_interval
+        self.use_motion = use_motion
+        self.detection_policy = detection_policy
+        # 运动门控：画面没有变化时不检测、不识别，直接沿用上一帧的结果
+        self.motion_gate = motion_gate
+        self._last_result = None
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_track_id = 0
+
+        # 统计信息：处理的帧数、检测到的人脸数、实际提取特征向量的人脸数
+        self.stats = {'frames': 0, 'detections': 0, 'embeddings': 0}
+
+    # 把检测结果和已有的跟踪目标关联（按 IoU 从大到小贪心匹配），返回匹配对、未匹配的检测和未匹配的跟踪目标
+    def _associate(self, faces):
+        if len(self.tracks) <= 0 or len(faces) <= 0:
+            return [], list(range(len(faces))), list(range(len(self.tracks)))
+
+        predicted = [track.predict() if self.use_motion else track.bbox for track in self.tracks]
+        ious = bbox_iou(predicted, [face.bbox for face in faces])
+
+        matches = []
+        unmatched_faces = set(range(len(faces)))
+        unmatched_tracks = set(range(len(self.tracks)))
+        for flat_index in np.argsort(-ious, axis=None):
+            track_index, face_index = np.unravel_index(flat_index, ious.shape)
+            if ious[track_index, face_index] < self.iou_threshold:
+                break
+            if track_index in unmatched_tracks and face_index in unmatched_faces:
+                matches.append((track_index, face_index))
+                unmatched_tracks.discard(track_index)
+                unmatched_faces.discard(face_index)
+
+        return matches, sorted(unmatched_faces), sorted(unmatched_tracks)
+
+    # 已有的跟踪目标是否需要重新识别：距离上次识别至少 min_embed_interval 帧，并且到了刷新间隔或置信度过低
+    def _need_refresh(self, track: Face_Track):
+        frames_since = self.frame_index - track.last_embedded_frame
+        if frames_since < self.min_embed_interval:
+            return False
+        return frames_since >= self.refresh_interval or \
+            track.confidence(self.frame_index, self.confidence_decay) < self.min_confidence
+
+    # 处理一帧：检测、关联、按需识别，返回当前帧可见人脸的 (目标框, 姓名) 列表和相似度
+    def update(self, app: FaceAnalysis, frame, gallery: Face_Gallery, threshold: float=0.5):
+        # 画面没有变化时直接返回上一帧的结果；有变化时只在变化的区域内检测（需要自适应检测策略）
+        motion_regions = None
+        if self.motion_gate is not None:
+            changed, motion_regions = self.motion_gate.update(frame)
+            if not changed and self._last_result is not None:
+                return self._last_result
+
+        if self.detection_policy is not None:
+            faces = self.detection_policy.detect(app, frame, motion_regions)
+        else:
+            faces = detect_faces(app, frame)
+
+        self._last_result = self._track(faces, gallery, threshold, lambda faces: extract_embeddings(app, frame, faces))
+        return self._last_result
+
+    # 处理一帧已经检测并提取了特征向量的人脸（如视频处理工作进程的结果），关联、投票的逻辑和 update 完全相同，
+    # 需要识别的人脸直接使用已有的特征向量，所以多进程处理视频时的结果和串行处理一致（不使用运动门控和检测策略）
+    def update_with_faces(self, faces: list, gallery: Face_Gallery, threshold: float=0.5):
+        return self._track(faces, gallery, threshold, None)
+
+    # 关联检测结果和跟踪目标，并对需要识别的跟踪目标提取特征向量（extract 为 None 时人脸已有特征向量）后和人脸库匹配
+    def _track(self, faces: list, gallery: Face_Gallery, threshold: float, extract):
+        self.frame_index += 1
+        matches, unmatched_faces, unmatched_tracks = self._associate(faces)
+
+        visible_tracks = []
+        for track_index, face_index in matches:
+            track = self.tracks[track_index]
+            track.update(faces[face_index])
+            visible_tracks.append(track)
+
+        # 没有关联上的检测结果作为新的跟踪目标
+        new_tracks = []
+        for face_index in unmatched_faces:
+            track = Face_Track(self._next_track_id, faces[face_index], self.frame_index, self.vote_window)
+            self._next_track_id += 1
+            new_tracks.append(track)
+        visible_tracks.extend(new_tracks)
+
+        # 连续多帧没有关联上的跟踪目标删除
+        for track_index in unmatched_tracks:
+            self.tracks[track_index].misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses] + new_tracks
+
+        # 只对新目标、置信度过低或到了刷新间隔的目标重新提取特征向量并匹配
+        need_recognize = [track for track in visible_tracks if track in new_tracks or self._need_refresh(track)]
+        if need_recognize:
+            if extract is not None:
+                extract([track.face for track in need_recognize])
+            embeddings = np.stack([track.face.embedding for track in need_recognize])
+            names, similarities = match_embeddings(embeddings, gallery, threshold)
+            for track, name, similarity in zip(need_recognize, names, similarities):
+                track.add_vote(name, similarity, self.frame_index)
+
+        self.stats['frames'] += 1
+        self.stats['detections'] += len(faces)
+        self.stats['embeddings'] += len(need_recognize)
+
+        face_names = [(track.bbox, track.name) for track in visible_tracks]
+        similarities = np.array([track.similarity for track in visible_tracks], dtype=np.float32)
+
+        return face_names, similarities
+
+    # 清空所有跟踪目标（例如切换到新的视频时）
+    def reset(self):
+        self.tracks = []
+        self.frame_index = 0
+        self._last_result = None
+        if self.detection_policy is not None:
+            self.detection_policy.reset()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
@@ -4,8 +4,10 @@
 import cv2
 from insightface.app import FaceAnalysis
 from insightface.utils import face_align
-from SQL.database_operate import add_face_to_database
+from SQL.face_gallery import Face_Gallery
 from camera.video_capture import get_video
+from face_process.face_recognize import detect_faces, extract_embeddings, detect_and_embed
+from face_process.analysis_cache import Face_Analysis_Cache
 
 '''
     人脸录入：
@@ -15,15 +17,15 @@ from camera.video_capture import get_video
 
 # 通过本地摄像头录入人脸（录入只支持一个图像一个人脸）
 def enroll_from_camera_local(app: FaceAnalysis, 
-                             database_path: str):
+                             gallery: Face_Gallery):
     
     # 初始化连续检测到人脸的帧数计数器
     frame_count_have_face = 0
     
-    # 调用本地摄像头实时获取视频帧
-    for frame in get_video():
-        # 使用检测模型检测人脸
-        faces = app.get(frame)
+    # 调用本地摄像头实时获取视频帧（后台线程采集，每次只处理最新的一帧）
+    for frame in get_video(latest_only=True):
+        # 使用检测模型检测人脸（拍摄过程中只做检测，确定要录入的人脸后再提取特征向量）
+        faces = detect_faces(app, frame)
         
         # 如果检测到人脸，则计数器加1；否则计数器清零
         if faces:
@@ -31,12 +33,13 @@ def enroll_from_camera_local(app: FaceAnalysis,
         else:
             frame_count_have_face = 0
                     
-        # 显示处理后的视频帧
+        # 显示处理后的视频帧（目标框画在副本上，录入用的 frame 保持原样，对齐的人脸图像和特征向量中不会带上目标框）
+        display = frame.copy()
         for face in faces:
             x1, y1, x2, y2 = [int(v) for v in face.bbox]
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+            cv2.rectangle(display, (x1, y1), (x2, y2), (0, 0, 255), 2)
         
-        cv2.imshow('FaceMind: CapturedFace (Esc To Exit)', frame)
+        cv2.imshow('FaceMind: CapturedFace (Esc To Exit)', display)
         
         # 按下Esc键退出
         if (cv2.waitKey(1) & 0xFF) == 27:
@@ -51,20 +54,22 @@ def enroll_from_camera_local(app: FaceAnalysis,
         所以不存在摄像头检测不到人脸的情况
     '''
     
-    # 录入只支持一个图像一个人脸
+    # 录入只支持一个图像一个人脸：画面中有多个人脸时录入最大（离摄像头最近）的人脸
     name = input('请输入您的姓名：')
+    face = largest_face(faces)
 
     # 获取对齐后的人脸图像
-    face_image = face_align.norm_crop(img=frame, landmark=faces[0].kps)
+    face_image = face_align.norm_crop(img=frame, landmark=face.kps)
+    # 只对要录入的人脸提取特征向量
+    embedding = extract_embeddings(app, frame, [face])[0].embedding
 
-    # 录入检测到的人脸
-    add_face_to_database(face_image,
-                         name,
-                         faces[0].embedding,
-                         database_path)
+    # 录入检测到的人脸（同时写入数据库和内存中的人脸库）
+    gallery.add_face(face_image,
+                     name,
+                     embedding)
 
     # 截取人脸区域子图像
-    x1, y1, x2, y2 = [int(v) for v in faces[0].bbox]
+    x1, y1, x2, y2 = [int(v) for v in face.bbox]
     # 输出检测到的人脸目标框到原始图像
     cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
     
@@ -82,31 +87,57 @@ def enroll_from_camera_local(app: FaceAnalysis,
 def enroll_from_image(app: FaceAnalysis, 
                       name: str, 
                       image_path: str, 
-                      database_path: str):
+                      gallery: Face_Gallery):
     
     # 读取图像
     frame = cv2.imread(image_path)
     
-    # 使用检测模型检测人脸
-    faces = app.get(frame)
+    # 检测并录入图像中的人脸
+    _, face = enroll_face(app, name, frame, gallery)
     
     # 判断是否检测到了人脸
-    have_faces = len(faces) > 0
-    # 如果检测到了人脸就录入
+    have_faces = face is not None
     if have_faces:
-        # 获取对齐后的人脸图像
-        face_image = face_align.norm_crop(img=frame, landmark=faces[0].kps)
-
-        # 录入检测到的人脸
-        add_face_to_database(face_image,
-                             name,
-                             faces[0].embedding,
-                             database_path)
-
         # 截取人脸区域子图像
-        x1, y1, x2, y2 = [int(v) for v in faces[0].bbox]
+        x1, y1, x2, y2 = [int(v) for v in face.bbox]
         # 输出检测到的人脸目标框到原始图像
         cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
         
     return frame, have_faces
-    
\ No newline at end of file
+
+
+# 面积最大的人脸
+def largest_face(faces: list):
+    return max(faces, key=lambda face: (face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1]))
+
+
+# 录入一张已解码图像（BGR）中的人脸，返回 (状态, 录入的人脸)，录入的人脸的 face_id 为人脸在数据库中的 id
+# 状态为 'ok' / 'no_face' / 'multiple_faces'（和批量录入一致），没有录入时人脸为 None
+# 录入只支持一个图像一个人脸：有多个人脸时默认不录入，allow_multiple_faces 为 True 时录入最大的人脸
+# 传入缓存时，同一张照片重复录入（或先识别再录入）不会重新检测和提取特征向量
+def enroll_face(app: FaceAnalysis, 
+                name: str, 
+                frame, 
+                gallery: Face_Gallery,
+                cache: Face_Analysis_Cache=None,
+                allow_multiple_faces: bool=False):
+    # 使用检测模型检测人脸（使用缓存时，所有人脸的特征向量也一起提取并缓存）
+    faces = detect_and_embed(app, frame, cache) if cache is not None else detect_faces(app, frame)
+    if len(faces) <= 0:
+        return 'no_face', None
+    if len(faces) > 1 and not allow_multiple_faces:
+        return 'multiple_faces', None
+
+    # 获取对齐后的人脸图像
+    face = largest_face(faces)
+    face_image = face_align.norm_crop(img=frame, landmark=face.kps)
+    # 只对要录入的人脸提取特征向量
+    if face.embedding is None:
+        extract_embeddings(app, frame, [face])
+
+    # 录入检测到的人脸（同时写入数据库和内存中的人脸库）
+    face.face_id = gallery.add_face(face_image,
+                                    name,
+                                    face.embedding)
+
+    return 'ok', face
@@ -2,13 +2,19 @@
 # @Time          : 2025-3-27
 
 import os
+import time
 import modelscope
 import insightface.model_zoo as model_zoo
 from insightface.app import FaceAnalysis
+from insightface.utils import ensure_available
+from face_process.ort_session import merge_session_options, create_session
 
 '''
     根据指定的RetinaFace和ArcFace模型路径，初始化InsightFace模型
-    如果没有指定，则使用InsightFace默认的RetinaFace和ArcFace模型
+    如果没有指定，则使用InsightFace默认的RetinaFace和ArcFace模型；
+    默认只加载 FaceMind 用到的检测和识别两个模型（不加载关键点、性别年龄等模型，app.get 时也不会运行它们），
+    指定了自己的模型时直接加载该模型，不会先加载默认模型再替换，并输出每个模型的加载耗时；
+    模型的 ONNX Runtime 会话可以自定义线程数、图优化级别等配置（见 ort_session.py），图优化的结果缓存在 .insightface/optimized/ 下
 '''
 
 
@@ -17,6 +23,14 @@ model_path = {"retinaface": {"repo": None,
               "arcface": {"repo": "JustinLeee/FaceMind_ArcFace_iResNet50_CASIA_FaceV5", 
                           "file": "ArcFace_iResNet50_CASIA_FaceV5.onnx"}}
 
+# InsightFace 默认模型包，以及其中检测和识别模型的文件名
+default_model_pack = "buffalo_l"
+default_model_files = {"detection": "det_10g.onnx", 
+                       "recognition": "w600k_r50.onnx"}
+
+# 推理时优先使用GPU，没有GPU则使用CPU
+providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+
 
 # 如果模型文件不存在，则从 ModelScope 下载模型文件。
 def download_model(model_path: str, 
@@ -35,9 +49,30 @@ def download_model(model_path: str,
     print(f"\n模型文件已下载到 {download_path}")
 
 
+# 按指定的会话配置加载单个模型并输出加载耗时
+def load_model(task_name: str, model_file: str, session_options: dict, cache_dir: str):
+    start = time.perf_counter()
+    session = create_session(model_file, providers, session_options, cache_dir)
+
+    # 检测模型（RetinaFace / SCRFD）至少有 5 个输出，其余的按识别模型（ArcFace）处理，和 model_zoo.get_model 的判断方式一致
+    # 模型的预处理参数是从原始模型文件中读取的，所以传入的是原始模型文件，会话则可能来自缓存的优化模型
+    if task_name == 'detection':
+        assert len(session.get_outputs()) >= 5, f'Error: {model_file} 不是检测模型！'
+        model = model_zoo.RetinaFace(model_file=model_file, session=session)
+    else:
+        model = model_zoo.ArcFaceONNX(model_file=model_file, session=session)
+
+    print(f"加载{task_name}模型 {os.path.basename(model_file)} 耗时：{time.perf_counter() - start:.2f} s")
+    return model
+
+
 # 初始化InsightFace模型
+# lean 为 True 时只构建检测和识别模型，为 False 时和以前一样加载默认模型包中的所有模型
 def Init_model(retinaface_model_path: str=None,
-               arcface_model_path: str='.insightface/models/ArcFace_iResNet50_CASIA_FaceV5.onnx') -> FaceAnalysis:
+               arcface_model_path: str='.insightface/models/ArcFace_iResNet50_CASIA_FaceV5.onnx',
+               lean: bool=True,
+               session_options: dict=None,
+               max_batch_size: int=32) -> FaceAnalysis:
     # 设置模型的存放位置
     current_file_path = os.path.abspath(__file__)  # 获取当前文件的绝对路径
     parent_directory = os.path.dirname(os.path.dirname(current_file_path))  # 获取向上两级目录（到达项目根目录 FaceMind）
@@ -45,28 +80,80 @@ def Init_model(retinaface_model_path: str=None,
 
     print(f"\n模型文件根目录：{root}\n")
 
-    # 推理时优先使用GPU，没有GPU则使用CPU
-    app = FaceAnalysis(providers=['CUDAExecutionProvider', 'CPUExecutionProvider'], root=root)
+    # ONNX Runtime 会话配置，以及图优化后模型的缓存目录
+    session_options = merge_session_options(session_options)
+    cache_dir = os.path.join(root, 'optimized')
+
+    # 如果 ArcFace 模型不在指定路径，就从modelscope下载
+    if arcface_model_path and not os.path.exists(arcface_model_path):
+        download_model(
+            arcface_model_path,
+            repo_name=model_path['arcface']['repo'],
+            file_name=model_path['arcface']['file'], 
+            local_dir=os.path.join(root, 'models')
+        )
+
+    start = time.perf_counter()
+    if lean:
+        app = init_lean_model(root, retinaface_model_path, arcface_model_path, session_options, cache_dir)
+    else:
+        app = init_full_model(root, retinaface_model_path, arcface_model_path, session_options, cache_dir)
+    print(f"模型初始化总耗时：{time.perf_counter() - start:.2f} s\n")
+
+    # 批量提取特征向量时每批最多的人脸数（见 face_recognize.embed_aligned_faces）
+    app.max_batch_size = max_batch_size
+        
+    return app
+
+
+# 只构建检测和识别模型：指定了模型路径的直接加载指定的模型，否则加载默认模型包中对应的模型文件
+def init_lean_model(root: str, 
+                    retinaface_model_path: str=None, 
+                    arcface_model_path: str=None,
+                    session_options: dict=None,
+                    cache_dir: str=None) -> FaceAnalysis:
+    model_files = {"detection": retinaface_model_path, 
+                   "recognition": arcface_model_path}
+
+    # 只有需要用到默认模型时才检查（必要时下载）默认模型包
+    if not all(model_files.values()):
+        model_dir = ensure_available('models', default_model_pack, root=root)
+        for task_name, model_file in model_files.items():
+            if not model_file:
+                model_files[task_name] = os.path.join(model_dir, default_model_files[task_name])
+
+    # FaceAnalysis 的构造函数会加载模型包中的所有模型，这里跳过构造函数，只放入需要的两个模型
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    app.model_dir = os.path.dirname(model_files["detection"])
+    app.models = {task_name: load_model(task_name, model_file, session_options, cache_dir) 
+                  for task_name, model_file in model_files.items()}
+    app.det_model = app.models["detection"]
+
+    # 准备模型，即配置模型的上下文设备、阈值、输入尺寸等（和默认方式的配置相同）
+    app.prepare(ctx_id=0, det_size=(640, 640))
+
+    return app
+
+
+# 加载默认模型包中的所有模型，再替换成指定的RetinaFace和ArcFace模型（会话配置只对指定的模型生效）
+def init_full_model(root: str, 
+                    retinaface_model_path: str=None, 
+                    arcface_model_path: str=None,
+                    session_options: dict=None,
+                    cache_dir: str=None) -> FaceAnalysis:
+    app = FaceAnalysis(providers=providers, root=root)
     app.prepare(ctx_id=0, det_size=(640, 640))
 
     # 加载自己微调的RetinaFace和ArcFace模型（如果没有指定，则使用InsightFace默认的模型）
     if retinaface_model_path:
         # 从模型文件加载模型，如：retinaface_model_path = 'path/to/your/retinaface.onnx'
-        app.models['detection'] = model_zoo.get_model(retinaface_model_path)
+        app.models['detection'] = load_model('detection', retinaface_model_path, session_options, cache_dir)
         # 准备模型，即配置模型的上下文设备、阈值、输入尺寸等
         app.models['detection'].prepare(ctx_id=0, input_size=(640, 640))
+        app.det_model = app.models['detection']
     
     if arcface_model_path:
-        # 如果 ArcFace 模型不在指定路径，就从modelscope下载
-        if not os.path.exists(arcface_model_path):
-            download_model(
-                arcface_model_path,
-                repo_name=model_path['arcface']['repo'],
-                file_name=model_path['arcface']['file'], 
-                local_dir=os.path.join(root, 'models')
-            )
-        
-        app.models['recognition'] = model_zoo.get_model(arcface_model_path)
+        app.models['recognition'] = load_model('recognition', arcface_model_path, session_options, cache_dir)
         app.models['recognition'].prepare(ctx_id=0)
-        
+
     return app
@@ -0,0 +1,178 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-24
+
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+from SQL.face_gallery import Face_Gallery
+from face_process.model_pool import Model_Pool
+from face_process.face_recognize import recognize_faces_batch
+
+'''
+    识别请求的动态微批处理：
+    多个调用方同时识别图像时，不再各自以批大小 1 推理，而是把请求放进同一个队列，
+    批处理线程取到第一个请求后最多再等待 max_wait_ms 毫秒（或凑满 max_batch_size 张图像），
+    把这段时间内到达的图像一起批量检测、所有人脸一起批量提取特征向量、一次性和人脸库匹配，再把结果分别交还给各个调用方；
+    每份模型副本对应一个批处理线程，请求少时几乎不用等待，请求多时批次自动变大，共享 CPU 的服务器上吞吐量可以明显提高；
+    统计批大小的分布，以及请求排队等待和从提交到拿到结果的延迟分布（直方图）
+'''
+
+
+# 延迟直方图的桶上界（毫秒），最后一个桶为超过 1000 ms 的请求
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+# 延迟直方图：按 LATENCY_BUCKETS_MS 分桶计数
+class Latency_Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, latency_ms: float):
+        self.counts[int(np.searchsorted(LATENCY_BUCKETS_MS, latency_ms))] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+
+    # 按直方图估计分位数（返回所在桶的上界）
+    def percentile(self, q: float) -> float:
+        target = self.count * q / 100
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + [float('inf')], self.counts):
+            cumulative += count
+            if cumulative >= target and count > 0:
+                return bound
+        return 0.0
+
+    def to_dict(self) -> dict:
+        labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {'count': self.count,
+                'mean_ms': self.total_ms / self.count if self.count > 0 else 0.0,
+                'buckets': dict(zip(labels, self.counts))}
+
+
+# 一个识别请求：图像、阈值、提交时间，以及交还结果用的 Future
+class _Request:
+    def __init__(self, frame, threshold: float):
+        self.frame = frame
+        self.threshold = threshold
+        self.submit_time = time.perf_counter()
+        self.future = Future()
+
+
+class Micro_Batcher:
+    def __init__(self,
+                 model_pool: Model_Pool,
+                 gallery: Face_Gallery,
+                 max_batch_size: int=16,
+                 max_wait_ms: float=5.0):
+        assert max_batch_size >= 1, 'Error: 最大批大小至少为 1！'
+        assert max_wait_ms >= 0, 'Error: 最长等待时间不能为负数！'
+        self.model_pool = model_pool
+        self.gallery = gallery
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+
+        # 统计信息：每种批大小出现的次数、排队等待时间和总延迟的直方图
+        self._lock = threading.Lock()
+        self.batch_sizes = [0] * (max_batch_size + 1)
+        self.queue_histogram = Latency_Histogram()
+        self.latency_histogram = Latency_Histogram()
+
+        # 每份模型副本一个批处理线程，各个批次可以在不同的副本上同时推理
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(model_pool.num_replicas)]
+        for thread in self._threads:
+            thread.start()
+
+    # 提交一张图像（BGR），返回 Future，结果为该图像的 (目标框, 姓名) 列表和相似度（和 recognize_faces 的返回值相同）
+    def submit(self, frame, threshold: float=0.5) -> Future:
+        request = _Request(frame, threshold)
+        self._queue.put(request)
+        return request.future
+
+    # 识别一张图像，等待批处理完成后返回结果
+    def recognize(self, frame, threshold: float=0.5):
+        return self.submit(frame, threshold).result()
+
+    # 取出一批请求：等到第一个请求后，最多再等待 max_wait 秒或凑满 max_batch_size 个请求
+    def _collect_batch(self):
+        request = self._queue.get()
+        if request is None:
+            return None
+
+        batch = [request]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # 把停止标记放回去，处理完这一批后再退出
+                self._queue.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                # 以最低的阈值匹配（每个人脸都得到最相似的已知人脸），再按每个请求各自的阈值判断是否为已知人脸
+                with self.model_pool.acquire() as app:
+                    results = recognize_faces_batch(app, [request.frame for request in batch], self.gallery, -1.0)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            finish = time.perf_counter()
+            with self._lock:
+                self.batch_sizes[len(batch)] += 1
+                for request in batch:
+                    self.queue_histogram.add((start - request.submit_time) * 1000)
+                    self.latency_histogram.add((finish - request.submit_time) * 1000)
+
+            for request, (face_names, similarities) in zip(batch, results):
+                face_names = [(bbox, name if similarity > request.threshold else "Unknown")
+                              for (bbox, name), similarity in zip(face_names, similarities)]
+                request.future.set_result((face_names, similarities))
+
+    # 当前的统计信息：批大小的分布、平均批大小、排队等待时间和总延迟的直方图
+    def stats(self) -> dict:
+        with self._lock:
+            batches = sum(self.batch_sizes)
+            requests = sum(size * count for size, count in enumerate(self.batch_sizes))
+            return {'batches': batches,
+                    'requests': requests,
+                    'mean_batch_size': requests / batches if batches > 0 else 0.0,
+                    'batch_sizes': {size: count for size, count in enumerate(self.batch_sizes) if count > 0},
+                    'queue_wait': self.queue_histogram.to_dict(),
+                    'latency': self.latency_histogram.to_dict(),
+                    'p95_latency_ms': self.latency_histogram.percentile(95)}
+
+    def report(self) -> str:
+        stats = self.stats()
+        batch_sizes = '，'.join(f'{size}: {count}' for size, count in stats['batch_sizes'].items())
+        latency = '，'.join(f'{label}: {count}' for label, count in stats['latency']['buckets'].items() if count > 0)
+        return (f"微批处理：{stats['requests']} 个请求，{stats['batches']} 批，平均批大小 {stats['mean_batch_size']:.2f}\n"
+                f"批大小分布：{batch_sizes or '无'}\n"
+                f"延迟分布：{latency or '无'}（平均 {stats['latency']['mean_ms']:.1f} ms，"
+                f"其中排队 {stats['queue_wait']['mean_ms']:.1f} ms，P95 不超过 {stats['p95_latency_ms']} ms）")
+
+    # 停止批处理线程（已经提交的请求处理完后才退出）
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,101 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-22
+
+import time
+import queue
+import threading
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from face_process.init_InsightFace import Init_model
+from face_process.ort_session import split_session_options
+
+'''
+    多用户同时使用时的模型副本池：
+    预先初始化 num_replicas 份模型（每份都有自己的检测和识别推理会话），每次推理前从池中取出一份，用完放回，
+    同一份模型同一时间只被一个请求使用（批量提取特征向量失败时会修改模型的输入形状，多个线程共用一份模型并不安全），
+    所有副本都在使用中时，请求排队等待空闲的副本；
+    没有指定线程数时，把 CPU 核平均分给每个副本并关闭自旋等待，副本之间不会互相抢占 CPU；
+    统计当前排队的请求数、最多排队的请求数、等待时间和占用时间，用来估计一台机器能同时服务多少用户
+'''
+
+
+class Model_Pool:
+    def __init__(self,
+                 num_replicas: int=1,
+                 retinaface_model_path: str=None,
+                 arcface_model_path: str='.insightface/models/ArcFace_iResNet50_CASIA_FaceV5.onnx',
+                 session_options: dict=None,
+                 max_batch_size: int=32,
+                 stats_window: int=1000):
+        assert num_replicas >= 1, 'Error: 模型副本数至少为 1！'
+        self.num_replicas = num_replicas
+        session_options = split_session_options(session_options, num_replicas)
+
+        self.replicas = [Init_model(retinaface_model_path,
+                                    arcface_model_path,
+                                    session_options=session_options,
+                                    max_batch_size=max_batch_size)
+                         for _ in range(num_replicas)]
+
+        self._idle = queue.Queue()
+        for app in self.replicas:
+            self._idle.put(app)
+
+        # 统计信息：当前排队 / 使用中的请求数，以及最近 stats_window 次请求的等待时间和占用时间（秒）
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_use = 0
+        self.requests = 0
+        self.wait_times = deque(maxlen=stats_window)
+        self.hold_times = deque(maxlen=stats_window)
+
+    # 取出一份空闲的模型，用完（离开 with 语句）后自动放回
+    @contextmanager
+    def acquire(self):
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+        app = self._idle.get()
+
+        acquired = time.perf_counter()
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.requests += 1
+            self.wait_times.append(acquired - start)
+
+        try:
+            yield app
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                self.hold_times.append(time.perf_counter() - acquired)
+            self._idle.put(app)
+
+    # 当前的统计信息（时间单位为毫秒）
+    def stats(self) -> dict:
+        with self._lock:
+            wait_times = np.array(self.wait_times) * 1000 if self.wait_times else np.zeros(1)
+            hold_times = np.array(self.hold_times) * 1000 if self.hold_times else np.zeros(1)
+            return {'replicas': self.num_replicas,
+                    'in_use': self.in_use,
+                    'waiting': self.waiting,
+                    'max_waiting': self.max_waiting,
+                    'requests': self.requests,
+                    'mean_wait_ms': float(wait_times.mean()),
+                    'p95_wait_ms': float(np.percentile(wait_times, 95)),
+                    'max_wait_ms': float(wait_times.max()),
+                    'mean_hold_ms': float(hold_times.mean())}
+
+    def report(self) -> str:
+        stats = self.stats()
+        # 每次推理平均占用一份模型 mean_hold_ms，所有副本满负荷时每秒最多能处理的请求数
+        capacity = stats['replicas'] * 1000 / stats['mean_hold_ms'] if stats['mean_hold_ms'] > 0 else float('inf')
+        return (f"模型副本 {stats['replicas']} 份（使用中 {stats['in_use']} 份），"
+                f"当前排队 {stats['waiting']} 个请求（最多 {stats['max_waiting']} 个），共 {stats['requests']} 次推理\n"
+                f"等待时间 平均 {stats['mean_wait_ms']:.1f} ms / P95 {stats['p95_wait_ms']:.1f} ms / 最长 {stats['max_wait_ms']:.1f} ms，"
+                f"每次占用模型 平均 {stats['mean_hold_ms']:.1f} ms（满负荷约 {capacity:.1f} 次推理/秒）")
@@ -0,0 +1,95 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-29
+
+import cv2
+import numpy as np
+
+'''
+    运动门控（用于固定摄像头的实时识别）：
+    摄像头大部分时间对着没有变化的画面（如空走廊），每帧仍然完整地检测、识别是浪费，
+    所以在推理之前先做一次很便宜的变化检测：把视频帧缩小到 downscale_width 宽的灰度图并模糊去噪，
+    和上一次推理时的画面逐像素比较，变化超过 pixel_threshold 的像素占比不到 min_area 时认为画面没有变化，直接沿用上一次的识别结果；
+    有变化时返回变化的区域（换算回原始视频帧的坐标），检测只需要在这些区域（以及已有人脸的周围）内进行；
+    参考画面只在推理时更新，缓慢的变化（有人慢慢走近）也会逐渐累积到触发推理；
+    连续跳过 max_skipped_frames 帧后强制推理一次，避免一直沿用过时的结果
+'''
+
+
+class Motion_Gate:
+    def __init__(self,
+                 min_area: float=0.002,
+                 pixel_threshold: int=25,
+                 downscale_width: int=160,
+                 region_margin: float=0.5,
+                 max_skipped_frames: int=300):
+        assert 0 <= min_area < 1, 'Error: 变化区域的占比必须在 [0, 1) 之间！'
+        # 灵敏度：变化的像素占比超过 min_area 才认为画面有变化，像素值（0~255）变化超过 pixel_threshold 才算变化的像素
+        self.min_area = min_area
+        self.pixel_threshold = pixel_threshold
+        self.downscale_width = downscale_width
+        self.region_margin = region_margin
+        self.max_skipped_frames = max_skipped_frames
+
+        self._reference = None
+        self._skipped_in_row = 0
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+        # 统计信息：处理的帧数、跳过推理的帧数、因画面变化推理的帧数、因跳过太多帧强制推理的帧数
+        self.stats = {'frames': 0, 'skipped': 0, 'motion_frames': 0, 'forced': 0}
+
+    # 缩小为灰度图并模糊去噪（摄像头的噪点不会被当成变化）
+    def _preprocess(self, frame):
+        height, width = frame.shape[:2]
+        small_width = min(width, self.downscale_width)
+        small_height = max(1, round(height * small_width / width))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (small_width, small_height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    # 判断这一帧是否需要推理，返回 (是否需要推理, 变化的区域)
+    # 变化的区域为原始视频帧坐标的 [x1, y1, x2, y2] 列表；第一帧和强制推理时为 None，表示需要检测整个画面
+    def update(self, frame):
+        self.stats['frames'] += 1
+        small = self._preprocess(frame)
+
+        if self._reference is None or self._reference.shape != small.shape:
+            self._accept(small)
+            return True, None
+
+        mask = cv2.absdiff(small, self._reference) > self.pixel_threshold
+        if np.count_nonzero(mask) <= self.min_area * mask.size:
+            if self._skipped_in_row < self.max_skipped_frames:
+                self._skipped_in_row += 1
+                self.stats['skipped'] += 1
+                return False, []
+
+            self.stats['forced'] += 1
+            self._accept(small)
+            return True, None
+
+        self.stats['motion_frames'] += 1
+        self._accept(small)
+        return True, self._get_regions(mask, frame.shape[1] / small.shape[1], frame.shape[0] / small.shape[0])
+
+    # 推理时更新参考画面
+    def _accept(self, small):
+        self._reference = small
+        self._skipped_in_row = 0
+
+    # 把变化的像素膨胀后连成块，每块的外接矩形向外扩展 region_margin 倍，换算回原始视频帧的坐标
+    def _get_regions(self, mask, scale_x: float, scale_y: float):
+        mask = cv2.dilate(mask.astype(np.uint8), self._kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            margin_x, margin_y = w * self.region_margin, h * self.region_margin
+            regions.append([(x - margin_x) * scale_x, (y - margin_y) * scale_y,
+                            (x + w + margin_x) * scale_x, (y + h + margin_y) * scale_y])
+
+        return regions
+
+    def reset(self):
+        self._reference = None
+        self._skipped_in_row = 0
@@ -0,0 +1,114 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-17
+
+import os
+import hashlib
+import platform
+import onnxruntime
+
+'''
+    ONNX Runtime 推理会话的配置：
+    1.可以设置算子内 / 算子间的线程数、图优化级别、执行模式、是否使用内存池（arena）以及空闲线程是否自旋等待，
+      一台多核机器上运行多个互相独立的会话（如多个工作进程）时，限制每个会话的线程数并关闭自旋，避免线程数超过核数互相抢占
+    2.图优化的结果会序列化到 .insightface/optimized/ 目录下，下次启动直接加载优化好的模型，不用重新做图优化；
+      缓存文件名包含原模型文件的大小和修改时间、ONNX Runtime 版本、执行设备、优化级别和机器名，任何一项变化都会重新优化
+'''
+
+
+# 默认的会话配置（和 ONNX Runtime 的默认行为一致）
+default_session_options = {
+    'intra_op_num_threads': 0,            # 算子内并行的线程数，0 表示由 ONNX Runtime 决定（通常为物理核数）
+    'inter_op_num_threads': 0,            # 算子间并行的线程数（只在 parallel 执行模式下有用），0 表示由 ONNX Runtime 决定
+    'graph_optimization_level': 'all',    # 图优化级别：disable / basic / extended / all
+    'execution_mode': 'sequential',       # 执行模式：sequential（顺序执行算子）/ parallel（无依赖的算子并行执行）
+    'enable_mem_arena': True,             # 是否使用 CPU 内存池（关闭后内存占用更低，但分配更频繁）
+    'allow_spinning': True,               # 空闲的线程是否自旋等待（多个会话共享核时建议关闭）
+    'cache_optimized_model': True,        # 是否缓存图优化后的模型
+}
+
+optimization_levels = {'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+                       'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+                       'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+                       'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL}
+
+execution_modes = {'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+                   'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL}
+
+
+# 合并用户的配置和默认配置，并检查配置项是否合法
+def merge_session_options(session_options: dict=None) -> dict:
+    options = dict(default_session_options)
+    for key, value in (session_options or {}).items():
+        assert key in default_session_options, f'Error: 不支持的会话配置项 {key}'
+        options[key] = value
+
+    assert options['graph_optimization_level'] in optimization_levels, \
+        f"Error: 不支持的图优化级别 {options['graph_optimization_level']}"
+    assert options['execution_mode'] in execution_modes, f"Error: 不支持的执行模式 {options['execution_mode']}"
+
+    return options
+
+
+# 多个独立的会话（如 num_sessions 个工作进程）共享一台机器时的配置：
+# 没有指定算子内线程数时，把 CPU 核平均分给每个会话，并关闭自旋等待，避免线程数超过核数
+def split_session_options(session_options: dict, num_sessions: int) -> dict:
+    options = merge_session_options(session_options)
+    if options['intra_op_num_threads'] == 0 and num_sessions > 1:
+        options['intra_op_num_threads'] = max(1, (os.cpu_count() or 1) // num_sessions)
+        options['allow_spinning'] = False
+    return options
+
+
+# 根据配置创建 onnxruntime.SessionOptions
+def build_session_options(options: dict) -> onnxruntime.SessionOptions:
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.intra_op_num_threads = options['intra_op_num_threads']
+    sess_options.inter_op_num_threads = options['inter_op_num_threads']
+    sess_options.graph_optimization_level = optimization_levels[options['graph_optimization_level']]
+    sess_options.execution_mode = execution_modes[options['execution_mode']]
+    sess_options.enable_cpu_mem_arena = options['enable_mem_arena']
+    sess_options.add_session_config_entry('session.intra_op.allow_spinning', '1' if options['allow_spinning'] else '0')
+    sess_options.add_session_config_entry('session.inter_op.allow_spinning', '1' if options['allow_spinning'] else '0')
+    return sess_options
+
+
+# 图优化后模型的缓存路径（不同的模型版本、ONNX Runtime 版本、执行设备和优化级别分别缓存）
+def get_optimized_model_path(model_file: str, providers: list, optimization_level: str, cache_dir: str):
+    stat = os.stat(model_file)
+    # 优化级别为 all 时优化结果可能和 CPU 的指令集有关，所以机器名也作为缓存的键（.insightface 放在共享存储上时不会混用）
+    key = '|'.join([os.path.abspath(model_file), str(stat.st_size), str(int(stat.st_mtime)),
+                    onnxruntime.__version__, ','.join(providers), optimization_level, platform.node()])
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(model_file))[0]
+    return os.path.join(cache_dir, f'{name}.{optimization_level}.{digest}.onnx')
+
+
+# 创建推理会话：有缓存的优化模型时直接加载（不再做图优化），没有时优化后保存到缓存目录
+def create_session(model_file: str, providers: list, options: dict, cache_dir: str=None):
+    # 只使用当前环境中可用的执行设备（缓存的优化模型和执行设备有关）
+    available = onnxruntime.get_available_providers()
+    providers = [provider for provider in providers if provider in available]
+
+    sess_options = build_session_options(options)
+    level = options['graph_optimization_level']
+    if not options['cache_optimized_model'] or cache_dir is None or level == 'disable':
+        return onnxruntime.InferenceSession(model_file, sess_options=sess_options, providers=providers)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    optimized_path = get_optimized_model_path(model_file, providers, level, cache_dir)
+    if os.path.exists(optimized_path):
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return onnxruntime.InferenceSession(optimized_path, sess_options=sess_options, providers=providers)
+        except Exception as e:
+            print(f"Warning: 缓存的优化模型 {optimized_path} 无法加载，将重新优化：{str(e)}")
+            sess_options = build_session_options(options)
+
+    # 先写到带进程号的临时文件再替换，多个进程同时启动时不会读到写了一半的缓存
+    temp_path = f'{os.path.splitext(optimized_path)[0]}.{os.getpid()}.tmp.onnx'
+    sess_options.optimized_model_filepath = temp_path
+    session = onnxruntime.InferenceSession(model_file, sess_options=sess_options, providers=providers)
+    if os.path.exists(temp_path):
+        os.replace(temp_path, optimized_path)
+
+    return session
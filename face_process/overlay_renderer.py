@@ -0,0 +1,108 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-20
+
+import cv2
+import threading
+import numpy as np
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageFont
+
+'''
+    识别结果的绘制：
+    字体只加载一次，每个姓名的文字只用 PIL 渲染一次成透明度位图（按 LRU 缓存），
+    之后直接用 OpenCV 在 BGR 视频帧上画人脸框，并按透明度把文字位图混合到视频帧中（原地修改，不复制整帧），
+    中文姓名仍然由 PIL 的 TrueType 字体渲染；找不到中文字体时依次尝试其他常见字体，都没有时退回 PIL 的默认字体
+'''
+
+
+# 依次尝试的字体（Windows / macOS / Linux 下常见的中文字体）
+FONT_CANDIDATES = ['msyhbd.ttc',
+                   'msyh.ttc',
+                   'simhei.ttf',
+                   'PingFang.ttc',
+                   'NotoSansCJK-Regular.ttc',
+                   '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+                   '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc']
+
+
+# 加载字体：先尝试指定的字体，再依次尝试常见的中文字体，都加载不了时使用 PIL 的默认字体
+def load_font(font_path: str=None, font_size: int=30):
+    candidates = ([font_path] if font_path else []) + FONT_CANDIDATES
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, font_size)
+        except OSError:
+            continue
+
+    print(f"Warning: 找不到可用的中文字体（{', '.join(candidates)}），将使用默认字体，中文姓名可能无法正常显示")
+    try:
+        return ImageFont.load_default(font_size)
+    except TypeError:
+        # 旧版本的 Pillow 中默认字体不能指定大小
+        return ImageFont.load_default()
+
+
+class Overlay_Renderer:
+    def __init__(self,
+                 font_path: str='msyhbd.ttc',
+                 font_size: int=30,
+                 box_color=(0, 0, 255),
+                 text_color=(0, 255, 0),
+                 box_thickness: int=2,
+                 cache_size: int=256):
+        self.font = load_font(font_path, font_size)
+        # 颜色都是 BGR 顺序（和以前 PIL 绘制的红色框、绿色文字一致）
+        self.box_color = box_color
+        self.text_color = np.array(text_color, dtype=np.float32)
+        self.box_thickness = box_thickness
+
+        self.cache_size = cache_size
+        self._labels = OrderedDict()
+        # 视频流水线的画框线程和 Gradio 的回调线程可能同时使用同一个绘制器
+        self._lock = threading.Lock()
+
+    # 获取姓名的文字位图：返回透明度矩阵 (高, 宽, 1) 以及文字相对于绘制位置的偏移
+    def _get_label(self, name: str):
+        with self._lock:
+            label = self._labels.get(name)
+            if label is not None:
+                self._labels.move_to_end(name)
+                return label
+
+        # 按文字实际占用的范围渲染，偏移量保证和 PIL 直接在 (x, y) 处绘制文字的位置一致
+        left, top, right, bottom = self.font.getbbox(name)
+        width, height = max(1, right - left), max(1, bottom - top)
+        image = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(image).text((-left, -top), name, font=self.font, fill=255)
+        label = (np.asarray(image, dtype=np.float32)[:, :, None] / 255.0, left, top)
+
+        with self._lock:
+            self._labels[name] = label
+            while len(self._labels) > self.cache_size:
+                self._labels.popitem(last=False)
+
+        return label
+
+    # 把文字位图按透明度混合到视频帧的 (x, y) 处（超出视频帧的部分裁掉）
+    def _blend_label(self, frame, name: str, x: int, y: int):
+        alpha, offset_x, offset_y = self._get_label(name)
+        x, y = x + offset_x, y + offset_y
+
+        frame_height, frame_width = frame.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(frame_width, x + alpha.shape[1]), min(frame_height, y + alpha.shape[0])
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        alpha = alpha[y1 - y:y2 - y, x1 - x:x2 - x]
+        region = frame[y1:y2, x1:x2]
+        region[:] = (region * (1.0 - alpha) + self.text_color * alpha).astype(np.uint8)
+
+    # 在视频帧上原地画出人脸框和姓名，face_names 为 (目标框, 姓名) 的列表
+    def draw(self, frame, face_names: list):
+        for (bbox, name) in face_names:
+            x1, y1, x2, y2 = [int(v) for v in bbox]
+            cv2.rectangle(frame, (x1, y1), (x2, y2), self.box_color, self.box_thickness)
+            self._blend_label(frame, name, x1, y2)
+
+        return frame
@@ -0,0 +1,95 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-21
+
+import time
+import threading
+import numpy as np
+from collections import deque
+from SQL.face_gallery import Face_Gallery
+from face_process.face_recognize import recognize_faces, draw_faces
+from face_process.face_tracker import Face_Tracker
+from face_process.detect_policy import Detection_Policy
+from face_process.model_pool import Model_Pool
+
+'''
+    摄像头视频流的逐帧实时识别（每个浏览器会话一个 Stream_Session）：
+    浏览器每隔 stream_every 秒发送一帧，服务器识别后立即返回画好框的这一帧，不用等整段视频录完再处理；
+    1.每个会话有自己的人脸跟踪器（可选检测策略），已跟踪的人脸不用每帧都提取特征向量
+    2.服务器处理不过来时丢帧：上一帧还没处理完时到达的帧直接跳过（只处理最新的帧），
+      再加上 Gradio 的 stream 事件本身只保留最新的一帧排队，实际处理的帧率会自动降到服务器能承受的帧率；
+      按 stream_every 估计应该收到的帧数，和实际处理的帧数相减得到丢帧数
+    3.延迟从服务器收到这一帧开始计时，到画好框的帧返回为止（包括等待空闲模型副本的时间，浏览器到服务器的传输时间在服务器端无法测量），
+      统计最近 latency_window 帧的平均延迟和 P95 延迟
+'''
+
+
+class Stream_Session:
+    def __init__(self,
+                 use_tracker: bool=True,
+                 min_face_size: int=0,
+                 stream_every: float=0.1,
+                 latency_window: int=100):
+        # min_face_size 大于 0 时按视频帧尺寸和最小人脸尺寸选择检测的输入尺寸，并只在人脸周围的区域内检测
+        detection_policy = Detection_Policy(min_face_size) if min_face_size > 0 else None
+        self.tracker = Face_Tracker(detection_policy=detection_policy) if use_tracker else None
+        self.stream_every = stream_every
+
+        # 同一个会话同时只处理一帧，处理中到达的帧直接丢弃
+        self._lock = threading.Lock()
+
+        self.latencies = deque(maxlen=latency_window)
+        self.reset()
+
+    # 识别一帧 BGR 图像（从模型副本池中取一份模型），返回画好框的帧；上一帧还没处理完时丢弃这一帧，返回 None
+    def process(self, model_pool: Model_Pool, frame, gallery: Face_Gallery, threshold: float=0.5):
+        received_time = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = received_time
+        self.received += 1
+
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return None
+
+        try:
+            with model_pool.acquire() as app:
+                face_names, _ = recognize_faces(app, frame, gallery, threshold, self.tracker)
+            frame = draw_faces(frame, face_names)
+        finally:
+            self._lock.release()
+
+        self.processed += 1
+        self.latencies.append(time.perf_counter() - received_time)
+        return frame
+
+    # 按 stream_every 估计的丢帧数：包括 Gradio 排队时丢掉的帧和处理中到达被跳过的帧
+    def dropped(self) -> int:
+        if self.start_time is None:
+            return 0
+        expected = int((time.perf_counter() - self.start_time) / self.stream_every) + 1
+        return max(self.skipped, expected - self.processed)
+
+    # 当前的统计信息：处理的帧数、丢弃的帧数、实际帧率、最近几帧的平均延迟和 P95 延迟（毫秒）
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {'processed': self.processed,
+                'dropped': self.dropped(),
+                'fps': self.processed / elapsed if elapsed > 0 else 0.0,
+                'latency_ms': float(latencies.mean()),
+                'p95_latency_ms': float(np.percentile(latencies, 95))}
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"已处理 {stats['processed']} 帧，丢弃约 {stats['dropped']} 帧，{stats['fps']:.1f} 帧/秒，"
+                f"延迟 平均 {stats['latency_ms']:.1f} ms / P95 {stats['p95_latency_ms']:.1f} ms")
+
+    # 摄像头关闭后重新开始：清空跟踪目标和统计信息
+    def reset(self):
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.start_time = None
+        self.received = 0
+        self.processed = 0
+        self.skipped = 0
+        self.latencies.clear()
@@ -0,0 +1,132 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-15
+
+import multiprocessing
+import numpy as np
+from collections import deque
+from insightface.app.common import Face
+from face_process.init_InsightFace import Init_model
+from face_process.ort_session import split_session_options
+from face_process.face_recognize import detect_faces_batch, extract_embeddings_batch
+
+'''
+    多进程分段处理上传的视频：
+    主进程按顺序解码视频，把连续的 chunk_size 帧作为一段交给进程池，
+    每个工作进程各自持有一个 Init_model 初始化的 FaceAnalysis，只负责检测人脸并提取所有人脸的特征向量（计算量最大的部分），
+    主进程按原来的顺序取回每一帧的人脸，再和串行处理一样逐帧匹配人脸库（使用跟踪器时由同一个跟踪器关联、投票），
+    所以不论是否使用跟踪器，输出的视频都和串行处理逐帧一致（跟踪器省下的特征提取在这里换成了多进程并行）；
+    同时处理中的段数有上限，解码出的视频帧不会全部堆在内存中
+'''
+
+
+# 工作进程中的模型（每个工作进程初始化一次）
+_worker_app = None
+
+
+# 工作进程的初始化函数：加载模型
+def _init_worker(retinaface_model_path: str, 
+                 arcface_model_path: str, 
+                 session_options: dict, 
+                 max_batch_size: int):
+    global _worker_app
+    _worker_app = Init_model(retinaface_model_path, 
+                             arcface_model_path, 
+                             session_options=session_options, 
+                             max_batch_size=max_batch_size)
+
+
+# 工作进程处理一段视频帧：多帧批量检测，整段中的人脸一起批量提取特征向量，
+# 返回每一帧人脸的 (目标框, 关键点, 检测置信度, 特征向量) 数组（数组比 Face 对象传回主进程更省事）
+def _analyze_chunk(frames: list):
+    faces_per_frame = detect_faces_batch(_worker_app, frames)
+    extract_embeddings_batch(_worker_app, frames, faces_per_frame)
+
+    results = []
+    for faces in faces_per_frame:
+        results.append((np.array([face.bbox for face in faces], dtype=np.float32).reshape(len(faces), 4),
+                        np.array([face.kps for face in faces], dtype=np.float32) if faces and faces[0].kps is not None else None,
+                        np.array([face.det_score for face in faces], dtype=np.float32),
+                        np.array([face.embedding for face in faces], dtype=np.float32)))
+    return results
+
+
+# 在主进程中把工作进程返回的数组还原为 Face 对象
+def _to_faces(bboxes, kpss, det_scores, embeddings) -> list:
+    return [Face(bbox=bboxes[i],
+                 kps=kpss[i] if kpss is not None else None,
+                 det_score=det_scores[i],
+                 embedding=embeddings[i])
+            for i in range(len(bboxes))]
+
+
+class Video_Worker_Pool:
+    def __init__(self,
+                 num_workers: int,
+                 retinaface_model_path: str,
+                 arcface_model_path: str,
+                 chunk_size: int=16,
+                 session_options: dict=None,
+                 max_batch_size: int=32):
+        assert num_workers >= 1, 'Error: 工作进程数至少为 1！'
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.retinaface_model_path = retinaface_model_path
+        self.arcface_model_path = arcface_model_path
+
+        # 多个工作进程共享 CPU：没有指定线程数时，每个工作进程只使用 CPU 核数 / 工作进程数 个线程
+        self.session_options = split_session_options(session_options, num_workers)
+        self.max_batch_size = max_batch_size
+
+        self._pool = None
+
+    # 第一次处理视频时才启动进程池（每个工作进程都要加载一份模型，启动比较慢）
+    # 使用 spawn 方式创建进程：onnxruntime / CUDA 在 fork 出的子进程中不安全，Windows 下也只支持 spawn
+    def _get_pool(self):
+        if self._pool is None:
+            print(f"\n正在启动 {self.num_workers} 个视频处理工作进程...\n")
+            self._pool = multiprocessing.get_context('spawn').Pool(
+                self.num_workers,
+                initializer=_init_worker,
+                initargs=(self.retinaface_model_path, 
+                          self.arcface_model_path, 
+                          self.session_options, 
+                          self.max_batch_size))
+        return self._pool
+
+    # 按顺序检测视频帧中的人脸并提取特征向量，依次返回 (视频帧, 该帧的人脸列表)，人脸的识别由调用方完成
+    def analyze_frames(self, frames):
+        pool = self._get_pool()
+
+        # 每个工作进程最多排队两段，既能让工作进程一直有活干，又限制了内存中的视频帧数量
+        max_pending = self.num_workers * 2
+        pending = deque()
+
+        chunk = []
+        for frame in frames:
+            chunk.append(frame)
+            if len(chunk) >= self.chunk_size:
+                pending.append((chunk, pool.apply_async(_analyze_chunk, (chunk,))))
+                chunk = []
+
+                # 按提交顺序取回最早的一段，保证输出顺序和输入一致
+                while len(pending) >= max_pending:
+                    yield from self._collect(pending.popleft())
+
+        if chunk:
+            pending.append((chunk, pool.apply_async(_analyze_chunk, (chunk,))))
+
+        while pending:
+            yield from self._collect(pending.popleft())
+
+    # 等待一段处理完成，并依次返回其中的视频帧和识别结果
+    @staticmethod
+    def _collect(item):
+        chunk, result = item
+        for frame, arrays in zip(chunk, result.get()):
+            yield frame, _to_faces(*arrays)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
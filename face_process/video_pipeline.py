@@ -0,0 +1,159 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-16
+
+import time
+import queue
+import threading
+
+'''
+    流水线方式处理视频：
+    把解码、人脸检测和识别、画框、编码拆成几个阶段，每个阶段在自己的线程中运行，阶段之间用有界队列连接，
+    ONNX Runtime 推理时解码器和编码器可以同时工作（OpenCV 和 ONNX Runtime 在计算时都会释放 GIL），
+    下游处理不过来时队列被填满，上游自动阻塞等待（背压），内存中的视频帧数量不会无限增长；
+    每个阶段都会统计处理的帧数、实际处理耗时和等待时间，用来判断哪个阶段是瓶颈
+'''
+
+
+# 流水线中表示数据已经处理完的标记
+_END = object()
+
+
+# 单个阶段的统计信息
+class Stage_Stats:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        # 实际处理耗时、等待上游数据的时间、等待下游队列空位的时间（秒）
+        self.busy_time = 0.0
+        self.wait_input_time = 0.0
+        self.wait_output_time = 0.0
+
+    # 该阶段单独运行时能达到的吞吐量（帧/秒）
+    def capacity(self):
+        return self.count / self.busy_time if self.busy_time > 0 else float('inf')
+
+    def __str__(self):
+        return (f"{self.name}: {self.count} 帧，处理 {self.busy_time:.2f} s（最高 {self.capacity():.1f} 帧/秒），"
+                f"等待输入 {self.wait_input_time:.2f} s，等待输出 {self.wait_output_time:.2f} s")
+
+
+class Video_Pipeline:
+    def __init__(self, queue_size: int=8):
+        self.queue_size = queue_size
+        self.stages = []
+        self.stats = []
+        self.elapsed = 0.0
+
+        self._stop = threading.Event()
+        self._error = None
+
+    # 添加一个阶段：func 接收上一个阶段的输出，返回交给下一个阶段的数据（最后一个阶段的返回值被忽略）
+    def add_stage(self, name: str, func):
+        self.stages.append((name, func))
+        return self
+
+    # 放入队列，队列满时阻塞（流水线出错停止时放弃）
+    def _put(self, output_queue, item, stats: Stage_Stats):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.wait_output_time += time.perf_counter() - start
+
+    # 从队列取出数据，队列空时阻塞（流水线出错停止时返回结束标记）
+    def _get(self, input_queue, stats: Stage_Stats):
+        start = time.perf_counter()
+        item = _END
+        while not self._stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stats.wait_input_time += time.perf_counter() - start
+        return item
+
+    # 数据源阶段：依次取出 source 中的数据放入第一个队列
+    def _run_source(self, source, output_queue, stats: Stage_Stats):
+        try:
+            iterator = iter(source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                if item is _END:
+                    break
+                stats.busy_time += time.perf_counter() - start
+                stats.count += 1
+                self._put(output_queue, item, stats)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(output_queue, _END, stats)
+
+    # 普通阶段：从上游队列取数据，处理后放入下游队列（最后一个阶段没有下游队列）
+    def _run_stage(self, func, input_queue, output_queue, stats: Stage_Stats):
+        try:
+            while True:
+                item = self._get(input_queue, stats)
+                if item is _END:
+                    break
+
+                start = time.perf_counter()
+                result = func(item)
+                stats.busy_time += time.perf_counter() - start
+                stats.count += 1
+
+                if output_queue is not None:
+                    self._put(output_queue, result, stats)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if output_queue is not None:
+                self._put(output_queue, _END, stats)
+
+    # 某个阶段出错时记录异常，并让所有阶段停止
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    # 运行流水线直到 source 中的数据全部处理完，任何阶段出错时重新抛出该异常
+    def run(self, source_name: str, source):
+        assert len(self.stages) > 0, 'Error: 流水线至少要有一个处理阶段！'
+        self._stop.clear()
+        self._error = None
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self.stats = [Stage_Stats(source_name)] + [Stage_Stats(name) for name, _ in self.stages]
+
+        threads = [threading.Thread(target=self._run_source, args=(source, queues[0], self.stats[0]), daemon=True)]
+        for i, (name, func) in enumerate(self.stages):
+            output_queue = queues[i + 1] if i + 1 < len(self.stages) else None
+            threads.append(threading.Thread(target=self._run_stage,
+                                            args=(func, queues[i], output_queue, self.stats[i + 1]),
+                                            daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+
+    # 各阶段的统计信息，处理耗时最长的阶段即为瓶颈
+    def report(self):
+        if not self.stats:
+            return "流水线还没有运行"
+
+        frames = self.stats[-1].count
+        bottleneck = max(self.stats, key=lambda stats: stats.busy_time)
+        lines = [f"流水线共处理 {frames} 帧，耗时 {self.elapsed:.2f} s（{frames / max(self.elapsed, 1e-9):.1f} 帧/秒）"]
+        lines += [f"  {stats}" for stats in self.stats]
+        lines.append(f"  瓶颈阶段：{bottleneck.name}")
+        return "\n".join(lines)
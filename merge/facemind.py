@@ -6,12 +6,20 @@ import os
 from insightface.app import FaceAnalysis
 from merge.mode import User_Mode
 from camera.video_capture import get_video
-from face_process.init_InsightFace import Init_model
+from face_process.model_pool import Model_Pool
+from face_process.micro_batch import Micro_Batcher
+from face_process.analysis_cache import Face_Analysis_Cache
 from face_process.face_recognize import process_frame
-from SQL.database_operate import create_database
+from face_process.face_tracker import Face_Tracker
+from face_process.detect_policy import Detection_Policy
+from face_process.motion_gate import Motion_Gate
+from face_process.video_parallel import Video_Worker_Pool
+from face_process.ort_session import split_session_options
+from SQL.database_operate import create_database, migrate_database, check_embedding_metadata
 from face_process.faces_enroll import enroll_from_camera_local
-from SQL.database_operate import load_known_faces
+from SQL.face_gallery import Face_Gallery
 from UI.front_end import web_interface
+from API.http_service import serve_api
 
 '''
     主函数：
@@ -25,7 +33,29 @@ def main(mode: User_Mode=User_Mode.WEB,
          arcface_model_path: str='.insightface/models/ArcFace_iResNet50_CASIA_FaceV5.onnx',
          database_path: str='databases/known_faces.db', 
          gradio_temp_dir: str='gradio_temp/',
-         threshold: float=0.5):
+         threshold: float=0.5,
+         use_ann_index: bool=False,
+         ann_nprobe: int=16,
+         encoding_dtype: str='float32',
+         use_sidecar: bool=False,
+         match_mode: str='faces',
+         video_workers: int=1,
+         session_options: dict=None,
+         max_batch_size: int=32,
+         min_face_size: int=0,
+         stream_every: float=0.1,
+         model_replicas: int=1,
+         video_concurrency: int=1,
+         queue_size: int=64,
+         api_host: str='127.0.0.1',
+         api_port: int=8000,
+         micro_batch_size: int=0,
+         micro_batch_wait_ms: float=5.0,
+         face_image_format: str='.jpg',
+         analysis_cache_size: int=256,
+         analysis_cache_ttl: float=300.0,
+         motion_min_area: float=0.002,
+         motion_pixel_threshold: int=25):
     
     # 将相对路径转换为绝对路径（这样就可以通过使用相对路径而兼容不同环境）
     if retinaface_model_path:
@@ -41,52 +71,136 @@ def main(mode: User_Mode=User_Mode.WEB,
     # 检查数据库文件是否存在，如果不存在则初始化数据库
     if not os.path.exists(database_path):
         create_database(database_path)
-        
+
+    # 迁移旧版本的数据库（特征向量的存储格式不会自动转换，需要时手动运行 python -m SQL.encoding_convert）
+    migrate_database(database_path, face_image_format)
     
     # 通过环境变量设置gradio的临时文件夹路径
     os.environ["GRADIO_TEMP_DIR"] = os.path.abspath(gradio_temp_dir)
     
     
+    # Web 模式和 API 模式按 model_replicas 初始化多份模型，供多个用户同时使用，本地模式只需要一份
+    num_replicas = model_replicas if mode in (User_Mode.WEB, User_Mode.API) else 1
+
+    # Web 模式上传的视频用多个工作进程分段处理（工作进程在第一次处理视频时才启动）
+    # 只在人脸周围检测依赖上一帧的跟踪结果，无法分段进行，设置了 min_face_size 时上传的视频只能串行处理
+    num_video_workers = video_workers if mode == User_Mode.WEB and video_workers > 1 else 0
+    if num_video_workers > 0 and min_face_size > 0:
+        print("Warning: 设置了 min_face_size 时上传的视频只能串行处理，video_workers 不起作用")
+        num_video_workers = 0
+
+    # 模型副本和视频工作进程可能同时推理：没有指定线程数时，把 CPU 核平均分给所有的会话（而不是每个池各分一份），
+    # 各个池拿到的线程数已经确定，不会再按自己的会话数重新划分
+    session_options = split_session_options(session_options, num_replicas + num_video_workers)
+
     # 初始化InsightFace模型
-    app = Init_model(retinaface_model_path, arcface_model_path)
+    model_pool = Model_Pool(num_replicas,
+                            retinaface_model_path, 
+                            arcface_model_path, 
+                            session_options=session_options, 
+                            max_batch_size=max_batch_size)
+    app = model_pool.replicas[0]
+
+    # 检查数据库中的特征向量是否由当前的识别模型提取（第一次运行时记录模型和特征向量维度）
+    recognition_model = app.models['recognition']
+    embedding_dim = recognition_model.output_shape[-1]
+    for warning in check_embedding_metadata(embedding_dim if isinstance(embedding_dim, int) else None,
+                                            os.path.basename(recognition_model.model_file),
+                                            database_path):
+        print(warning)
+
+    # 创建常驻内存的已知人脸库（只在这里完整加载一次，之后增量同步）
+    gallery = Face_Gallery(database_path, 
+                           use_ann_index, 
+                           ann_nprobe, 
+                           encoding_dtype=encoding_dtype, 
+                           use_sidecar=use_sidecar,
+                           match_mode=match_mode,
+                           image_format=face_image_format)
+
+    # 微批处理：同一时间到达的多个识别请求合并成一个批次（micro_batch_size 不大于 1 时不使用）
+    micro_batcher = None
+    if micro_batch_size > 1 and mode in (User_Mode.WEB, User_Mode.API):
+        micro_batcher = Micro_Batcher(model_pool, gallery, micro_batch_size, micro_batch_wait_ms)
+
+    # 检测结果缓存：Web 界面中重复提交的同一张照片直接使用缓存的检测和特征提取结果（analysis_cache_size 为 0 时不使用）
+    analysis_cache = None
+    if analysis_cache_size > 0 and mode == User_Mode.WEB:
+        analysis_cache = Face_Analysis_Cache(analysis_cache_size, ttl=analysis_cache_ttl)
 
     
     # web界面模式：可进行视频人脸识别和照片人脸录入
     if mode == User_Mode.WEB:
+        # 上传的视频用多个工作进程分段处理
+        video_pool = None
+        if num_video_workers > 0:
+            video_pool = Video_Worker_Pool(num_video_workers, 
+                                           retinaface_model_path, 
+                                           arcface_model_path, 
+                                           session_options=session_options,
+                                           max_batch_size=max_batch_size)
+
         # 启动Web界面来实现人脸识别和人脸录入
-        demo = web_interface(app,
-                            database_path, 
-                            threshold)
+        demo = web_interface(model_pool,
+                            gallery, 
+                            threshold,
+                            video_pool,
+                            min_face_size,
+                            stream_every,
+                            video_concurrency,
+                            queue_size,
+                            micro_batcher,
+                            analysis_cache)
         demo.launch()
     
+    # API 模式：不启动网页界面，通过 HTTP 接口识别和录入人脸（模型和人脸库常驻内存）
+    elif mode == User_Mode.API:
+        serve_api(model_pool,
+                  gallery,
+                  api_host,
+                  api_port,
+                  threshold,
+                  micro_batcher)
+    
     # 本地录入模式：可进行本地摄像头的人脸录入
     elif mode == User_Mode.LOCAL_ENROLL:
         # 通过本地摄像头进行人脸录入
-        enroll_from_camera_local(app, database_path)
+        enroll_from_camera_local(app, gallery)
     
     # 本地识别模式：可进行本地摄像头实时人脸识别
     elif mode == User_Mode.LOCAL_RECOGNIZE:
         # 调用本地摄像头进行人脸识别
         recognize_faces_by_local(app,
-                                 database_path,
-                                 threshold)
+                                 gallery,
+                                 threshold,
+                                 min_face_size=min_face_size,
+                                 motion_min_area=motion_min_area,
+                                 motion_pixel_threshold=motion_pixel_threshold)
 
 
 # 通过OpenCV调用摄像头进行人脸识别（不使用网页UI界面）
 def recognize_faces_by_local(app: FaceAnalysis,
-                             database_path: str,
-                             threshold: float=0.5):
-    # 从指定的数据库文件中加载已知人脸的特征向量和姓名
-    known_face_encodings, known_face_names = load_known_faces(database_path)
+                             gallery: Face_Gallery,
+                             threshold: float=0.5,
+                             use_tracker: bool=True,
+                             min_face_size: int=0,
+                             motion_min_area: float=0.002,
+                             motion_pixel_threshold: int=25):
+    # 跟踪画面中的人脸，已跟踪的人脸不用每帧都提取特征向量
+    # min_face_size 大于 0 时按画面尺寸和最小人脸尺寸选择检测的输入尺寸，并只在人脸周围的区域内检测
+    detection_policy = Detection_Policy(min_face_size) if min_face_size > 0 else None
+    # motion_min_area 大于 0 时，画面没有变化的帧不做推理（运动门控需要跟踪器来沿用上一帧的结果）
+    motion_gate = Motion_Gate(motion_min_area, motion_pixel_threshold) if motion_min_area > 0 and use_tracker else None
+    tracker = Face_Tracker(detection_policy=detection_policy, motion_gate=motion_gate) if use_tracker else None
 
-    # 通过OpenCV调用本地摄像头实时获取视频帧
-    for frame in get_video():
+    # 通过OpenCV调用本地摄像头实时获取视频帧（后台线程采集，每次只处理最新的一帧，延迟不会累积）
+    for frame in get_video(latest_only=True):
         # 处理视频帧，进行人脸识别
         frame, _ , _= process_frame(app, 
                               frame, 
-                              known_face_encodings,
-                              known_face_names, 
-                              threshold)
+                              gallery, 
+                              threshold,
+                              tracker)
         
         cv2.imshow('FaceMind: Recognize (Esc To Exit)', frame)
         
@@ -96,3 +210,15 @@ def recognize_faces_by_local(app: FaceAnalysis,
             break
         
     cv2.destroyAllWindows()
+
+    if tracker is not None:
+        print(f"\n跟踪统计：{tracker.stats['frames']} 帧，检测到 {tracker.stats['detections']} 个人脸，"
+              f"实际提取特征向量 {tracker.stats['embeddings']} 次\n")
+
+    if detection_policy is not None:
+        print(f"检测统计：全图检测 {detection_policy.stats['full_scans']} 次，ROI 检测 {detection_policy.stats['roi_scans']} 次，"
+              f"检测模型输入共 {detection_policy.stats['input_pixels'] / 1e6:.1f} M 像素\n")
+
+    if motion_gate is not None:
+        print(f"运动门控：{motion_gate.stats['frames']} 帧，画面没有变化跳过推理 {motion_gate.stats['skipped']} 帧，"
+              f"因画面变化推理 {motion_gate.stats['motion_frames']} 帧，强制推理 {motion_gate.stats['forced']} 帧\n")
@@ -12,3 +12,4 @@ class User_Mode(Enum):
     WEB = 0  # web界面模式
     LOCAL_ENROLL = 1  # 本地录入mos
     LOCAL_RECOGNIZE = 2  # 本地识别模式
+    API = 3  # 无界面的 HTTP 识别 / 录入服务模式
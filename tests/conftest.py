@@ -0,0 +1,40 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import os
+import sys
+import numpy as np
+import pytest
+
+'''
+    测试的公共配置：
+    1.把项目根目录加入模块搜索路径，和在项目根目录下用 python -m 运行脚本时一样导入 SQL、face_process 等模块
+      （在项目根目录下运行：python -m pytest tests）
+    2.公共的 fixture：临时目录中新建的空数据库（database_path），以及生成录入用的人脸（make_faces）
+'''
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加入模块搜索路径之后才能导入项目中的模块
+from SQL.database_operate import create_database
+
+
+# 临时目录中新建的空数据库，返回数据库文件路径
+@pytest.fixture
+def database_path(tmp_path):
+    database_path = str(tmp_path / 'faces.db')
+    create_database(database_path)
+    return database_path
+
+
+# 生成录入用的人脸：make_faces(特征向量, start) 返回 (人脸图像, 姓名, 特征向量) 的列表，
+# 姓名依次为 face_{start}、face_{start + 1}……，人脸图像都是 8x8 的黑色图像（测试只关心特征向量）
+@pytest.fixture
+def make_faces():
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+
+    def make(encodings, start: int=0) -> list:
+        return [(image, f'face_{start + i}', encoding) for i, encoding in enumerate(encodings)]
+
+    return make
@@ -0,0 +1,99 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import numpy as np
+import face_process.analysis_cache as analysis_cache
+from insightface.app.common import Face
+from face_process.analysis_cache import Face_Analysis_Cache
+
+'''
+    检测结果缓存的测试：过期（ttl）、按最近最少使用淘汰（条目数和内存上限），以及命中和未命中的统计
+'''
+
+
+# 可以手动拨动的时钟，代替 time.monotonic
+class Fake_Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_faces(num_faces: int=1, value: float=1.0):
+    return [Face(bbox=np.array([0, 0, 10, 10], dtype=np.float32),
+                 kps=np.zeros((5, 2), dtype=np.float32),
+                 det_score=0.9,
+                 embedding=np.full(512, value, dtype=np.float32))
+            for _ in range(num_faces)]
+
+
+# 超过 ttl 秒的条目视为过期：算作一次未命中并从缓存中移除
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Fake_Clock()
+    monkeypatch.setattr(analysis_cache.time, 'monotonic', clock)
+    cache = Face_Analysis_Cache(ttl=10.0)
+
+    cache.put('a', make_faces(2, 3.0))
+    clock.now = 10.0
+    faces = cache.get('a')
+    assert len(faces) == 2 and np.all(faces[0].embedding == 3.0)
+
+    clock.now = 10.5
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired'], stats['entries'], stats['size_bytes']) == (1, 1, 1, 0, 0)
+
+
+# ttl 为 None 时条目不过期
+def test_no_ttl(monkeypatch):
+    clock = Fake_Clock()
+    monkeypatch.setattr(analysis_cache.time, 'monotonic', clock)
+    cache = Face_Analysis_Cache(ttl=None)
+
+    cache.put('a', make_faces())
+    clock.now = 1e9
+    assert cache.get('a') is not None
+
+
+# 超过条目数上限时淘汰最久没有使用的条目（读取会刷新使用顺序）
+def test_lru_eviction_by_entries():
+    cache = Face_Analysis_Cache(max_entries=2)
+    cache.put('a', make_faces())
+    cache.put('b', make_faces())
+    assert cache.get('a') is not None
+
+    cache.put('c', make_faces())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+# 超过内存上限时淘汰最久没有使用的条目，但至少保留刚写入的条目
+def test_lru_eviction_by_bytes():
+    cache = Face_Analysis_Cache(max_bytes=5000)
+    cache.put('a', make_faces())
+    cache.put('b', make_faces())
+    assert cache.stats()['entries'] == 2 and cache.size_bytes <= 5000
+
+    cache.put('c', make_faces())
+    assert cache.get('a') is None and cache.get('b') is not None
+
+    cache.put('big', make_faces(4))
+    stats = cache.stats()
+    assert stats['entries'] == 1 and cache.get('big') is not None
+    assert stats['evictions'] == 3
+
+
+# 返回的人脸是副本，修改它不会影响缓存中的结果；同一个键重复写入时覆盖旧的结果
+def test_returned_faces_are_copies():
+    cache = Face_Analysis_Cache()
+    cache.put('a', make_faces())
+    cache.get('a')[0].embedding[:] = 0
+    assert np.all(cache.get('a')[0].embedding == 1.0)
+
+    size = cache.size_bytes
+    cache.put('a', make_faces(value=2.0))
+    assert cache.size_bytes == size and cache.stats()['entries'] == 1
+    assert np.all(cache.get('a')[0].embedding == 2.0)
+    assert cache.stats()['hit_rate'] == 1.0
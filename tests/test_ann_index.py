@@ -0,0 +1,122 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import os
+import numpy as np
+from SQL.ann_index import IVF_Index
+from SQL.face_gallery import Face_Gallery, normalize_embeddings, search_known_faces
+
+'''
+    IVF 索引的测试：和暴力搜索比较召回率，增量加入人脸、保存和加载，以及人脸库在后台线程中构建、保存索引
+'''
+
+
+# 生成聚成若干簇的人脸库（模拟同一个人的多张照片），以及在库中人脸附近的查询向量
+def make_gallery(num_faces: int=6000, dim: int=128, num_people: int=300, num_queries: int=200, seed: int=0):
+    rng = np.random.default_rng(seed)
+    people = rng.standard_normal((num_people, dim), dtype=np.float32)
+    encodings = normalize_embeddings(people[rng.integers(0, num_people, num_faces)] +
+                                     0.6 * rng.standard_normal((num_faces, dim), dtype=np.float32))
+    queries = normalize_embeddings(encodings[rng.choice(num_faces, num_queries, replace=False)] +
+                                   0.3 * rng.standard_normal((num_queries, dim), dtype=np.float32))
+    return encodings, queries
+
+
+def build_index(encodings, nprobe: int):
+    index = IVF_Index(IVF_Index.suggest_nlist(len(encodings)), nprobe)
+    index.build(encodings, np.arange(1, len(encodings) + 1))
+    return index
+
+
+# nprobe 足够大时，IVF 索引找到的最相似人脸和暴力搜索基本一致
+def test_recall_against_brute_force():
+    encodings, queries = make_gallery()
+    expected, _ = search_known_faces(queries, encodings)
+
+    index = build_index(encodings, nprobe=32)
+    indices, similarities = index.search(queries, encodings)
+
+    recall = np.mean(indices[:, 0] == expected)
+    assert recall >= 0.95
+    # 找到的人脸的相似度就是精确的cos相似度
+    assert np.allclose(similarities[:, 0], np.sum(queries * encodings[indices[:, 0]], axis=1), atol=1e-5)
+
+
+# 搜索所有簇时等价于暴力搜索
+def test_probe_all_lists_equals_brute_force():
+    encodings, queries = make_gallery(num_faces=2000)
+    expected, expected_similarities = search_known_faces(queries, encodings)
+
+    index = build_index(encodings, nprobe=1)
+    indices, similarities = index.search(queries, encodings, nprobe=index.nlist)
+
+    assert np.array_equal(indices[:, 0], expected)
+    assert np.allclose(similarities[:, 0], expected_similarities, atol=1e-5)
+
+
+# top_k 个结果按相似度从高到低排列，候选不足时用 -1 / -inf 补齐
+def test_top_k_is_sorted_and_padded():
+    encodings, queries = make_gallery(num_faces=500)
+    index = build_index(encodings, nprobe=4)
+
+    indices, similarities = index.search(queries, encodings, top_k=8)
+    assert indices.shape == similarities.shape == (len(queries), 8)
+    assert np.all(np.diff(similarities, axis=1) <= 0)
+
+    indices, similarities = index.search(queries[:1], encodings[:3], nprobe=index.nlist, top_k=8)
+    assert np.all(indices[0, 3:] == -1) and np.all(np.isneginf(similarities[0, 3:]))
+
+
+# 逐个加入的新人脸能被搜索到，且和一次性构建的索引内容一致
+def test_add_then_search():
+    encodings, _ = make_gallery(num_faces=3000)
+    index = build_index(encodings[:2000], nprobe=8)
+    for start_idx in range(2000, 3000, 7):
+        index.add(encodings[start_idx:start_idx + 7], np.arange(start_idx + 1, min(start_idx + 7, 3000) + 1))
+
+    assert len(index) == 3000
+    assert np.array_equal(index.rowids, np.arange(1, 3001))
+    assert index.list_sizes.sum() == 3000
+    members = np.sort(np.concatenate([index.lists[c][:index.list_sizes[c]] for c in range(index.nlist)]))
+    assert np.array_equal(members, np.arange(3000))
+
+    # 新加入的人脸用自己作为查询向量时一定能找到自己
+    indices, _ = index.search(encodings[2500:2510], encodings)
+    assert np.array_equal(indices[:, 0], np.arange(2500, 2510))
+
+
+# 保存后加载的索引和原来的索引搜索结果一致
+def test_save_and_load(tmp_path):
+    encodings, queries = make_gallery(num_faces=2000)
+    index = build_index(encodings[:1500], nprobe=8)
+    index.add(encodings[1500:], np.arange(1501, 2001))
+
+    index_path = str(tmp_path / 'faces_ivf.npz')
+    index.save(index_path)
+    loaded = IVF_Index.load(index_path)
+
+    assert len(loaded) == len(index) and loaded.trained_size == 1500
+    assert np.array_equal(loaded.search(queries, encodings)[0], index.search(queries, encodings)[0])
+
+
+# 人脸库在后台线程中构建索引，录入时只把新人脸加入内存中的索引，关闭人脸库时才保存
+def test_gallery_builds_index_in_background(database_path, make_faces):
+    encodings, queries = make_gallery(num_faces=1200)
+    Face_Gallery(database_path).add_faces(make_faces(encodings[:1000]))
+
+    gallery = Face_Gallery(database_path, use_ann_index=True, ann_min_size=500, nprobe=64)
+    gallery._index_thread.join()
+    assert len(gallery.index) == 1000 and os.path.exists(gallery.index_path)
+    saved_time = os.path.getmtime(gallery.index_path)
+
+    for face in make_faces(encodings[1000:], start=1000):
+        gallery.add_face(*face)
+    assert len(gallery.index) == 1200
+    assert os.path.getmtime(gallery.index_path) == saved_time
+
+    expected, _ = search_known_faces(queries, encodings)
+    names, _ = gallery.search(queries)
+    assert np.mean([name == f'face_{i}' for name, i in zip(names, expected)]) >= 0.95
+
+    gallery.close()
+    assert len(IVF_Index.load(gallery.index_path)) == 1200
@@ -0,0 +1,90 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import sqlite3
+import numpy as np
+import pytest
+from SQL.embedding_quantize import quantize_embeddings
+from SQL.encoding_convert import convert_encodings
+from SQL.face_gallery import Face_Gallery, normalize_embeddings, search_known_faces, search_compact_faces
+
+'''
+    紧凑格式（float16 / int8）人脸库的测试：粗筛的候选人脸包含 float32 的最相似人脸，
+    用 float32 原始特征向量重排序后的结果和 float32 人脸库完全一致，以及数据库存储格式的转换保留原始特征向量
+'''
+
+
+def make_embeddings(num_faces: int, dim: int=128, num_queries: int=40, seed: int=0):
+    rng = np.random.default_rng(seed)
+    # 录入的特征向量没有归一化（和 ArcFace 的输出一样，模长约为 20）
+    encodings = 20 * rng.standard_normal((num_faces, dim), dtype=np.float32)
+    queries = encodings[rng.choice(num_faces, num_queries, replace=False)] + 10 * rng.standard_normal((num_queries, dim), dtype=np.float32)
+    return encodings, queries
+
+
+# 紧凑格式粗筛出的候选人脸中包含 float32 暴力搜索的最相似人脸，候选人脸按近似相似度从高到低排列
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+@pytest.mark.parametrize('batch_size', [7, 256, 4096])
+def test_candidates_contain_float32_best(dtype, batch_size):
+    encodings, queries = make_embeddings(3000)
+    encodings, queries = normalize_embeddings(encodings), normalize_embeddings(queries)
+    expected, _ = search_known_faces(queries, encodings)
+
+    codes, scales = quantize_embeddings(encodings, dtype)
+    candidate_indices, candidate_scores = search_compact_faces(queries, codes, scales, batch_size, top_k=8)
+
+    assert candidate_indices.shape == (len(queries), 8)
+    assert all(expected[i] in candidate_indices[i] for i in range(len(queries)))
+    assert np.all(np.diff(candidate_scores, axis=1) <= 0)
+    # 近似相似度和精确值的误差很小
+    exact = np.take_along_axis(queries @ encodings.T, candidate_indices, axis=1)
+    assert np.abs(candidate_scores - exact).max() < 0.02
+
+
+# 人脸数比 top_k 少时，每个人脸都是候选人脸
+def test_fewer_faces_than_top_k():
+    encodings, queries = make_embeddings(5, num_queries=3)
+    codes, scales = quantize_embeddings(normalize_embeddings(encodings), 'int8')
+    candidate_indices, _ = search_compact_faces(normalize_embeddings(queries), codes, scales, top_k=8)
+    assert candidate_indices.shape == (len(queries), 5)
+    assert all(sorted(row) == list(range(5)) for row in candidate_indices)
+
+
+# 紧凑格式的人脸库（暴力搜索和 IVF 索引）重排序后，姓名和相似度都和 float32 人脸库一致
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+@pytest.mark.parametrize('use_ann_index', [False, True])
+def test_rerank_matches_float32_gallery(database_path, make_faces, dtype, use_ann_index):
+    encodings, queries = make_embeddings(2000)
+    Face_Gallery(database_path).add_faces(make_faces(encodings))
+    expected_names, expected_similarities = Face_Gallery(database_path).search(queries)
+
+    gallery = Face_Gallery(database_path, encoding_dtype=dtype, use_ann_index=use_ann_index, ann_min_size=1000, nprobe=1000)
+    if use_ann_index:
+        gallery._index_thread.join()
+        assert gallery.index is not None
+    names, similarities = gallery.search(queries)
+
+    assert names == expected_names
+    assert np.allclose(similarities, expected_similarities, atol=1e-6)
+
+
+# 转换数据库的存储格式时保留 float32 原始特征向量：重排序仍然精确，转换回 float32 是无损的
+def test_convert_keeps_originals(database_path, make_faces):
+    encodings, queries = make_embeddings(500)
+    Face_Gallery(database_path).add_faces(make_faces(encodings))
+    expected_names, expected_similarities = Face_Gallery(database_path).search(queries)
+
+    assert convert_encodings('int8', database_path) == 500
+    with sqlite3.connect(database_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM face_encodings_original").fetchone()[0] == 500
+        assert connection.execute("SELECT COUNT(*) FROM faces WHERE encoding_dtype = 'int8'").fetchone()[0] == 500
+
+    names, similarities = Face_Gallery(database_path, encoding_dtype='int8').search(queries)
+    assert names == expected_names
+    assert np.allclose(similarities, expected_similarities, atol=1e-6)
+
+    assert convert_encodings('float32', database_path) == 500
+    with sqlite3.connect(database_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM face_encodings_original").fetchone()[0] == 0
+        blobs = [row[0] for row in connection.execute("SELECT encoding FROM faces ORDER BY id")]
+    assert np.array_equal(np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(500, -1), encodings)
@@ -0,0 +1,65 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import sqlite3
+import numpy as np
+import pytest
+from SQL.face_gallery import Face_Gallery
+from SQL.database_operate import add_faces_to_database, get_enroll_checkpoint, get_faces_state
+
+'''
+    批量录入断点的测试：断点和人脸在同一个事务中提交，出错时一起回滚，重新运行时从断点继续
+'''
+
+
+def random_encodings(num_faces: int, seed: int=0):
+    return np.random.default_rng(seed).standard_normal((num_faces, 512), dtype=np.float32)
+
+
+# 没有断点时从 0 开始；断点和人脸一起提交，后一批覆盖前一批的断点
+def test_checkpoint_committed_with_faces(database_path, make_faces):
+    assert get_enroll_checkpoint('job', database_path) == 0
+
+    rowids = add_faces_to_database(make_faces(random_encodings(3)), database_path, checkpoint=('job', 3))
+    assert rowids == [1, 2, 3]
+    assert get_enroll_checkpoint('job', database_path) == 3
+
+    add_faces_to_database(make_faces(random_encodings(2, seed=3), start=3), database_path, checkpoint=('job', 5))
+    assert get_enroll_checkpoint('job', database_path) == 5
+    assert get_enroll_checkpoint('other_job', database_path) == 0
+    assert get_faces_state(database_path) == (5, 5)
+
+
+# 写入失败时（姓名为空违反 NOT NULL 约束）人脸和断点一起回滚，重新运行时仍从上一个断点继续
+def test_failed_batch_rolls_back_checkpoint(database_path, make_faces):
+    add_faces_to_database(make_faces(random_encodings(2)), database_path, checkpoint=('job', 2))
+
+    faces = make_faces(random_encodings(3, seed=2), start=2)
+    faces[1] = (faces[1][0], None, faces[1][2])
+    with pytest.raises(sqlite3.IntegrityError):
+        add_faces_to_database(faces, database_path, checkpoint=('job', 5))
+
+    assert get_enroll_checkpoint('job', database_path) == 2
+    assert get_faces_state(database_path) == (2, 2)
+
+    # 从断点继续：修正后的这一批成功写入，断点前进
+    rowids = add_faces_to_database(make_faces(random_encodings(3, seed=2), start=2), database_path, checkpoint=('job', 5))
+    assert rowids == [3, 4, 5]
+    assert get_enroll_checkpoint('job', database_path) == 5
+
+
+# 人脸库的批量录入把断点传给数据库；失败时内存中的人脸库也不会加入这一批
+def test_gallery_add_faces_checkpoint(database_path, make_faces):
+    gallery = Face_Gallery(database_path)
+    gallery.add_faces(make_faces(random_encodings(4)), checkpoint=('job', 4))
+    assert get_enroll_checkpoint('job', database_path) == 4
+    assert len(gallery.get_known_faces()[0]) == 4
+
+    faces = make_faces(random_encodings(2, seed=4), start=4)
+    faces[0] = (faces[0][0], None, faces[0][2])
+    with pytest.raises(sqlite3.IntegrityError):
+        gallery.add_faces(faces, checkpoint=('job', 6))
+
+    assert get_enroll_checkpoint('job', database_path) == 4
+    encodings, names = gallery.get_known_faces()
+    assert len(encodings) == 4 and names[:4] == [f'face_{i}' for i in range(4)]
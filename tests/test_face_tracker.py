@@ -0,0 +1,80 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import numpy as np
+from insightface.app.common import Face
+from face_process.face_tracker import Face_Tracker
+
+'''
+    人脸跟踪器的测试：重新提取特征向量的时机（刷新间隔、置信度衰减、两次识别之间的最小间隔）
+'''
+
+
+# 按顺序轮流返回给定姓名的假人脸库，用来模拟投票一致或有分歧的跟踪目标
+class Fake_Gallery:
+    def __init__(self, names: list, similarity: float=0.9):
+        self.names = names
+        self.similarity = similarity
+        self.calls = 0
+
+    def search(self, embeddings):
+        name = self.names[self.calls % len(self.names)]
+        self.calls += 1
+        return [name] * len(embeddings), np.full(len(embeddings), self.similarity, dtype=np.float32)
+
+
+def make_face(x: float=10.0):
+    return Face(bbox=np.array([x, 10, x + 80, 90], dtype=np.float32), embedding=np.ones(8, dtype=np.float32))
+
+
+# 同一个静止的人脸跟踪 num_frames 帧，返回提取了特征向量的帧（从 0 开始）
+def embedded_frames(tracker: Face_Tracker, gallery: Fake_Gallery, num_frames: int):
+    frames = []
+    for frame_index in range(num_frames):
+        embeddings = tracker.stats['embeddings']
+        tracker.update_with_faces([make_face()], gallery, threshold=0.5)
+        if tracker.stats['embeddings'] > embeddings:
+            frames.append(frame_index)
+    return frames
+
+
+# 默认的衰减系数让投票一致的目标恰好在刷新间隔时衰减到阈值
+def test_default_decay_matches_refresh_interval():
+    tracker = Face_Tracker(refresh_interval=30, min_confidence=0.5)
+    assert np.isclose(tracker.confidence_decay ** 30, 0.5)
+    assert tracker.confidence_decay ** 29 > 0.5
+
+
+# 投票一致的目标只在刷新间隔时重新识别（衰减不会让它提前重新识别）
+def test_confident_track_refreshes_at_interval():
+    tracker = Face_Tracker(refresh_interval=30)
+    assert embedded_frames(tracker, Fake_Gallery(['alice']), 100) == [0, 30, 60, 90]
+
+
+# 投票有分歧的目标会更早重新识别，但两次识别之间至少间隔 min_embed_interval 帧
+def test_split_votes_are_rate_limited():
+    tracker = Face_Tracker(refresh_interval=30, min_embed_interval=3)
+    frames = embedded_frames(tracker, Fake_Gallery(['alice', 'bob', 'carol']), 100)
+
+    assert frames[:2] == [0, 30]
+    assert np.all(np.diff(frames) >= 3)
+    assert np.all(np.diff(frames[1:]) == 3)
+
+
+# 显式指定的衰减系数仍然有效：衰减更快时在刷新间隔之前就重新识别
+def test_explicit_decay():
+    tracker = Face_Tracker(refresh_interval=30, confidence_decay=0.9, min_confidence=0.5)
+    # 0.9 ** 7 < 0.5，第 7 帧时置信度低于阈值
+    assert embedded_frames(tracker, Fake_Gallery(['alice']), 20) == [0, 7, 14]
+
+
+# 新出现的人脸立即识别，不受最小间隔的限制；已跟踪的人脸沿用身份
+def test_new_faces_are_embedded_immediately():
+    tracker = Face_Tracker(min_embed_interval=10)
+    gallery = Fake_Gallery(['alice'])
+
+    tracker.update_with_faces([make_face(10)], gallery)
+    face_names, _ = tracker.update_with_faces([make_face(12), make_face(300)], gallery)
+
+    assert tracker.stats['embeddings'] == 2
+    assert [name for _, name in face_names] == ['alice', 'alice']
@@ -0,0 +1,76 @@
+# @Author        : Justin Lee
+# @Time          : 2025-4-30
+
+import threading
+import contextlib
+import numpy as np
+import pytest
+
+# 微批处理依赖模型池（需要 modelscope 下载模型），没有安装时跳过
+pytest.importorskip('modelscope')
+import face_process.micro_batch as micro_batch
+from face_process.micro_batch import Micro_Batcher
+
+'''
+    识别请求微批处理的测试：同一批中阈值不同的请求按各自的阈值判断是否为已知人脸，以及批大小的统计
+'''
+
+
+# 只有一份“模型副本”的假模型池
+class Fake_Model_Pool:
+    num_replicas = 1
+
+    @contextlib.contextmanager
+    def acquire(self):
+        yield 'app'
+
+
+# 记录每批的图像，每张“图像”就是该图像中唯一人脸和 alice 的相似度
+def make_fake_recognize(batches: list):
+    def fake_recognize_faces_batch(app, frames, gallery, threshold):
+        assert threshold == -1.0
+        batches.append(list(frames))
+        return [([([0, 0, 10, 10], 'alice')], np.array([frame], dtype=np.float32)) for frame in frames]
+    return fake_recognize_faces_batch
+
+
+# 同一批中的请求按各自的阈值判断，相似度不变
+def test_per_request_thresholds(monkeypatch):
+    batches = []
+    monkeypatch.setattr(micro_batch, 'recognize_faces_batch', make_fake_recognize(batches))
+    # 等待时间足够长，3 个请求一定凑成同一批（凑满 max_batch_size 后立即处理）
+    batcher = Micro_Batcher(Fake_Model_Pool(), gallery=None, max_batch_size=3, max_wait_ms=5000)
+
+    futures = [batcher.submit(0.6, threshold=0.5), batcher.submit(0.6, threshold=0.7), batcher.submit(0.3, threshold=0.2)]
+    results = [future.result(timeout=10) for future in futures]
+    batcher.close()
+
+    assert batches == [[0.6, 0.6, 0.3]]
+    assert [face_names[0][1] for face_names, _ in results] == ['alice', 'Unknown', 'alice']
+    assert [float(similarities[0]) for _, similarities in results] == pytest.approx([0.6, 0.6, 0.3])
+
+    stats = batcher.stats()
+    assert (stats['batches'], stats['requests'], stats['batch_sizes']) == (1, 3, {3: 1})
+    assert stats['latency']['count'] == 3
+
+
+# 批处理出错时，这一批的每个请求都拿到异常，批处理线程继续处理之后的请求
+def test_batch_errors_are_delivered(monkeypatch):
+    failed = threading.Event()
+
+    def flaky_recognize_faces_batch(app, frames, gallery, threshold):
+        if not failed.is_set():
+            failed.set()
+            raise RuntimeError('推理失败')
+        return [([], np.zeros(0, dtype=np.float32)) for _ in frames]
+
+    monkeypatch.setattr(micro_batch, 'recognize_faces_batch', flaky_recognize_faces_batch)
+    batcher = Micro_Batcher(Fake_Model_Pool(), gallery=None, max_batch_size=1, max_wait_ms=0)
+
+    with pytest.raises(RuntimeError):
+        batcher.recognize(0.5)
+    face_names, similarities = batcher.recognize(0.5)
+    batcher.close()
+
+    assert face_names == [] and len(similarities) == 0
+    assert batcher.stats()['batches'] == 1